@@ -1,11 +1,19 @@
+import time
+_import_started = time.perf_counter()
+
+import atexit
 import os
 import threading
 import asyncio
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, send_file, abort
 from config import Config
-from database import SupabaseClient
-from instagram_client import InstagramClient
-from telegram_bot import TelegramBot
+from components import components
+from health import HealthMonitor
+from http_session import get_session
+from metrics import QUEUE_DEPTH, registry as metrics_registry
+from pages import Pages
+
+components.record('imports', time.perf_counter() - _import_started)
 
 # Validate configuration
 try:
@@ -17,124 +25,162 @@ except ValueError as e:
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
+_pages_started = time.perf_counter()
+pages = Pages(app.jinja_env)
+components.record('pages', time.perf_counter() - _pages_started)
+
+# Clients (Supabase, Instagram, queue, ...) come from the shared registry and
+# are built on first use; start_background_services() warms them up
+
+# Queue depth is read from the shared queue whenever /metrics is scraped
+QUEUE_DEPTH.set_function(lambda: components.job_queue.depth())
+
+def create_telegram_app():
+    """Create the Telegram application sharing this process's components"""
+    from telegram_bot import TelegramBot
+    telegram_bot = TelegramBot(
+        components.database,
+        components.instagram_client,
+        media_store=components.media_store,
+        oauth_states=components.oauth_states,
+        sessions=components.sessions,
+        token_manager=components.token_manager,
+        run_workers=Config.ROLE == 'all'
+    )
+    return telegram_bot.create_application()
+
+# In webhook mode each web worker process feeds updates to its own Application
+telegram_webhook = None
+if Config.TELEGRAM_MODE == 'webhook' and Config.ROLE in ('all', 'web'):
+    from webhook import TelegramWebhook
+    telegram_webhook = TelegramWebhook(
+        create_telegram_app,
+        redis_client=components.redis if Config.WEBHOOK_DEDUP == 'redis' else None
+    )
+
+bot_thread = None
+
+def check_supabase():
+    """Supabase answers a trivial query"""
+    components.database.check_connection()
+
+def check_graph_api():
+    """Graph API reachable (any non-5xx answer, no token needed)"""
+    response = get_session().get(Config.INSTAGRAM_GRAPH_URL, name='health_graph', timeout=Config.HEALTH_PROBE_TIMEOUT)
+    if response.status_code >= 500:
+        raise RuntimeError(f"HTTP {response.status_code}")
+
+def check_telegram():
+    """Bot API reachable and this process's update ingress running"""
+    if telegram_webhook is not None and not telegram_webhook.is_running():
+        raise RuntimeError("webhook application is not running")
+    if bot_thread is not None and not bot_thread.is_alive():
+        raise RuntimeError("polling thread has stopped")
+    response = get_session().get(
+        f"{Config.TELEGRAM_API_URL}{Config.TELEGRAM_BOT_TOKEN}/getMe",
+        name='health_telegram',
+        timeout=Config.HEALTH_PROBE_TIMEOUT
+    )
+    response.raise_for_status()
 
-# Initialize components
-print("Connecting to Supabase...")
-database = SupabaseClient(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-print("Supabase connected successfully!")
+def check_workers():
+    """Publish workers are draining the queue"""
+    stalled = components.job_queue.stalled(Config.HEALTH_WORKER_STALL)
+    if stalled:
+        raise RuntimeError(f"{stalled} due jobs untouched for {Config.HEALTH_WORKER_STALL:.0f}s")
 
-instagram_client = InstagramClient()
-telegram_bot = TelegramBot(database, instagram_client)
+# Probes run in the background so /health and /ready never wait on a
+# dependency; only critical ones take this instance out of rotation
+health_monitor = HealthMonitor()
+health_monitor.add_probe('supabase', check_supabase)
+health_monitor.add_probe('telegram', check_telegram)
+health_monitor.add_probe('graph_api', check_graph_api, critical=False)
+health_monitor.add_probe('workers', check_workers, critical=False)
+health_monitor.start()
 
-# Create Telegram application
-telegram_app = telegram_bot.create_application()
+def start_background_services():
+    """Build the shared clients and start background jobs.
+
+    Runs in a thread so importing the app (and binding the port) doesn't
+    wait on Supabase or the webhook Application; /ready stays 503 until
+    the probes pass, and requests arriving earlier simply build what they
+    need through the registry.
+    """
+    try:
+        if Config.METRICS_DIR:
+            metrics_registry.start_snapshots(Config.METRICS_DIR, Config.METRICS_SNAPSHOT_INTERVAL)
+        oauth_states, token_manager = components.oauth_states, components.token_manager
+        if Config.ROLE == 'all':
+            # Split deployments run these in worker.py, not in every web process
+            oauth_states.start_sweeper()
+            token_manager.start()
+        if telegram_webhook is not None:
+            started = time.perf_counter()
+            telegram_webhook.start()
+            components.record('telegram_webhook', time.perf_counter() - started)
+    except Exception as e:
+        print(f"Startup error: {e}")
+    if Config.STARTUP_PROFILE:
+        print(components.profile())
+
+threading.Thread(target=start_background_services, name='startup', daemon=True).start()
+
+def stop_background_services():
+    """Shut the webhook Application down when the worker process exits.
+
+    Gunicorn workers leave through sys.exit, so atexit runs this and the
+    bot's post_shutdown hands publish leases back and flushes its state.
+    """
+    health_monitor.stop()
+    if telegram_webhook is not None:
+        try:
+            telegram_webhook.stop()
+        except Exception as e:
+            print(f"Shutdown error: {e}")
+    if Config.METRICS_DIR:
+        try:
+            metrics_registry.stop_snapshots(Config.METRICS_DIR)
+        except Exception as e:
+            print(f"Shutdown error: {e}")
+
+atexit.register(stop_background_services)
 
 def run_telegram_bot():
-    """Run Telegram bot in a separate thread"""
+    """Run Telegram bot in a separate thread (ROLE=all only)"""
     print("Starting Telegram bot...")
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    telegram_app.run_polling(drop_pending_updates=True)
+    telegram_app = create_telegram_app()
+    # Signal handlers can only be installed from the main thread
+    telegram_app.run_polling(drop_pending_updates=True, stop_signals=None)
 
 @app.route('/')
 def home():
     """Home page - shows bot status"""
-    return render_template_string("""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Instagram Reels Bot</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            body { 
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                margin: 0; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh; color: #333;
-            }
-            .container { 
-                max-width: 600px; margin: 0 auto; background: white; 
-                padding: 40px; border-radius: 20px; box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            }
-            .header { text-align: center; margin-bottom: 30px; }
-            .status { 
-                padding: 15px 20px; border-radius: 10px; margin: 20px 0; 
-                border: none; font-weight: 500;
-            }
-            .success { background: #d4edda; color: #155724; }
-            .info { background: #e3f2fd; color: #0d47a1; }
-            .feature { 
-                background: #f8f9fa; padding: 15px; margin: 10px 0; 
-                border-radius: 8px; border-left: 4px solid #667eea;
-            }
-            .code { 
-                background: #f1f3f4; padding: 10px; border-radius: 6px; 
-                font-family: 'Courier New', monospace; margin: 10px 0;
-            }
-            h1 { color: #667eea; margin: 0; }
-            h2 { color: #555; border-bottom: 2px solid #eee; padding-bottom: 10px; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🎬 Instagram Reels Bot</h1>
-                <p>Post videos to Instagram Reels directly from Telegram</p>
-            </div>
-            
-            <div class="status success">
-                ✅ Bot is running successfully!
-            </div>
-            
-            <h2>📱 How to use:</h2>
-            <div class="feature">
-                <strong>1.</strong> Find the bot on Telegram and start a chat
-            </div>
-            <div class="feature">
-                <strong>2.</strong> Use <code>/connect</code> to link your Instagram account
-            </div>
-            <div class="feature">
-                <strong>3.</strong> Send a video file (3-90 seconds, MP4 format)
-            </div>
-            <div class="feature">
-                <strong>4.</strong> Use <code>/post</code> to publish as Instagram Reel
-            </div>
-            
-            <h2>🤖 Bot Commands:</h2>
-            <div class="code">
-/start - Get started<br>
-/connect - Connect Instagram<br>
-/status - Check connection<br>
-/post - Post your video<br>
-/help - Get help
-            </div>
-            
-            <div class="status info">
-                <strong>🌐 Callback URL:</strong> {{ request.url_root }}oauth/callback<br>
-                <strong>⚡ Status:</strong> Online<br>
-                <strong>🏗️ Platform:</strong> Supabase<br>
-                <strong>📊 Storage:</strong> Supabase Storage
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
+    return pages.home.response()
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    try:
-        # Test Supabase connection by fetching a user
-        database.check_connection()
-        return jsonify({
-            "status": "healthy",
-            "database": "connected",
-            "telegram_bot": "running"
-        })
-    except Exception as e:
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e)
-        }), 500
+    """Liveness: cached dependency status, 503 only if probing has stopped"""
+    _, payload = health_monitor.snapshot()
+    return jsonify(payload), 200 if payload['monitor_alive'] else 503
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness: 503 while a critical dependency is failing or unchecked"""
+    ready, payload = health_monitor.snapshot()
+    return jsonify(payload), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this process, or for all web processes with METRICS_DIR"""
+    if Config.METRICS_DIR:
+        body = metrics_registry.render_snapshots(
+            Config.METRICS_DIR, stale_after=3 * Config.METRICS_SNAPSHOT_INTERVAL
+        )
+    else:
+        body = metrics_registry.render()
+    return Response(body, content_type=metrics_registry.CONTENT_TYPE)
 
 @app.route('/oauth/callback')
 def oauth_callback():
@@ -144,116 +190,111 @@ def oauth_callback():
     error = request.args.get('error')
     
     if error:
-        return render_template_string("""
-        <html>
-        <head><title>Connection Error</title></head>
-        <body style="font-family: Arial; text-align: center; margin: 50px;">
-            <h1 style="color: #dc3545;">❌ Connection Failed</h1>
-            <p>Error: {{ error }}</p>
-            <p>Please try connecting again in the Telegram bot.</p>
-        </body>
-        </html>
-        """, error=error), 400
+        return pages.connect_failed.render(error=error), 400
     
     if not code or not state:
-        return render_template_string("""
-        <html>
-        <head><title>Invalid Request</title></head>
-        <body style="font-family: Arial; text-align: center; margin: 50px;">
-            <h1 style="color: #dc3545;">❌ Invalid Request</h1>
-            <p>Missing required parameters.</p>
-        </body>
-        </html>
-        """), 400
+        return pages.invalid_request.response()
     
-    # Verify state from Supabase
-    oauth_state = database.get_oauth_state(state)
+    # Verify and consume the state (single use, expires after OAUTH_STATE_TTL)
+    oauth_state = components.oauth_states.consume(state)
     if not oauth_state:
-        return render_template_string("""
-        <html>
-        <head><title>Invalid State</title></head>
-        <body style="font-family: Arial; text-align: center; margin: 50px;">
-            <h1 style="color: #dc3545;">❌ Invalid State</h1>
-            <p>This authorization link has expired or is invalid.</p>
-            <p>Please try connecting again in the Telegram bot.</p>
-        </body>
-        </html>
-        """), 400
+        return pages.invalid_state.response()
     
     telegram_user_id = oauth_state['telegram_user_id']
     
     try:
         # Exchange code for access token
-        token_data = instagram_client.exchange_code_for_token(code)
+        token_data = components.instagram_client.exchange_code_for_token(code)
         if not token_data or 'access_token' not in token_data:
             raise Exception("Failed to get access token")
         
-        access_token = token_data['access_token']
+        # Keep the long-lived token and its expiry for the refresher
+        access_token, token_expires_at = components.token_manager.exchange(token_data['access_token'])
         
         # Get Instagram user info
-        user_info = instagram_client.get_user_info(access_token)
+        user_info = components.instagram_client.get_user_info(access_token)
         if not user_info:
             raise Exception("Failed to get user info")
         
-        # Update user in Supabase
-        database.update_user_instagram(
+        # Link the account; the first one connected becomes the primary
+        components.database.upsert_instagram_account(
             telegram_user_id,
             user_info['id'],
             user_info['username'],
-            access_token
+            access_token,
+            token_expires_at
         )
+        db_user = components.database.get_user(telegram_user_id)
+        if not db_user or not db_user.get('is_connected') or db_user.get('instagram_id') == user_info['id']:
+            components.database.update_user_instagram(
+                telegram_user_id,
+                user_info['id'],
+                user_info['username'],
+                access_token,
+                token_expires_at
+            )
         
-        # Clean up OAuth state
-        database.delete_oauth_state(state)
-        
-        return render_template_string("""
-        <html>
-        <head>
-            <title>Connected Successfully</title>
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <style>
-                body { font-family: Arial, sans-serif; text-align: center; margin: 20px; background: #f0f2f5; }
-                .container { max-width: 400px; margin: 50px auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
-                .success { color: #28a745; margin-bottom: 20px; }
-                .username { background: #e3f2fd; padding: 10px; border-radius: 8px; margin: 15px 0; }
-                .instruction { background: #fff3cd; padding: 15px; border-radius: 8px; margin-top: 20px; color: #856404; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1 class="success">✅ Connected!</h1>
-                <p>Your Instagram account has been successfully connected.</p>
-                
-                <div class="username">
-                    <strong>@{{ username }}</strong>
-                </div>
-                
-                <div class="instruction">
-                    <strong>🔄 Next Steps:</strong><br>
-                    Go back to the Telegram bot and send a video to start posting reels!
-                </div>
-                
-                <p style="margin-top: 30px; color: #666; font-size: 14px;">
-                    You can safely close this window.
-                </p>
-            </div>
-        </body>
-        </html>
-        """, username=user_info['username'])
+        return pages.connected.render(username=user_info['username'])
         
     except Exception as e:
         print(f"OAuth callback error: {e}")
-        return render_template_string("""
-        <html>
-        <head><title>Connection Error</title></head>
-        <body style="font-family: Arial; text-align: center; margin: 50px;">
-            <h1 style="color: #dc3545;">❌ Connection Error</h1>
-            <p>Failed to complete the connection process.</p>
-            <p>Please try again in the Telegram bot.</p>
-            <p style="color: #666; font-size: 12px;">Error: {{ error }}</p>
-        </body>
-        </html>
-        """, error=str(e)), 500
+        return pages.connection_error.render(error=str(e)), 500
+
+@app.route('/video/<media_id>')
+def serve_video(media_id):
+    """Serve a hosted reel to Instagram's fetcher via a signed URL"""
+    if not components.media_store.verify(media_id, request.args.get('expires'), request.args.get('sig')):
+        abort(403)
+    
+    try:
+        path = components.media_store.path_for(media_id)
+    except ValueError:
+        abort(404)
+    if not os.path.exists(path):
+        abort(404)
+    
+    # send_file streams the file in blocks and, with conditional=True,
+    # answers Range requests with 206 and honours ETag/Last-Modified
+    return send_file(
+        path,
+        mimetype='video/mp4',
+        conditional=True,
+        etag=True,
+        max_age=Config.MEDIA_URL_TTL
+    )
+
+@app.route('/cover/<media_id>')
+def serve_cover(media_id):
+    """Serve a reel's generated cover image via a signed URL"""
+    if not components.media_store.verify(media_id, request.args.get('expires'), request.args.get('sig')):
+        abort(403)
+    
+    try:
+        path = components.media_store.cover_path_for(media_id)
+    except ValueError:
+        abort(404)
+    if not os.path.exists(path):
+        abort(404)
+    
+    return send_file(path, mimetype='image/jpeg', conditional=True, max_age=Config.MEDIA_URL_TTL)
+
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook_update():
+    """Receive Telegram updates; acknowledged before they are processed"""
+    if telegram_webhook is None:
+        abort(404)
+    if not telegram_webhook.verify(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        abort(403)
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        abort(400)
+    # Still starting up: Telegram redelivers on 5xx
+    if not telegram_webhook.is_running():
+        abort(503)
+    
+    telegram_webhook.submit(payload)
+    return jsonify({"ok": True})
 
 @app.route('/deauth', methods=['POST'])
 def deauth_callback():
@@ -265,19 +306,13 @@ def delete_callback():
     """Handle data deletion request"""
     return jsonify({"status": "ok"})
 
-# ... rest of imports remain same ...
-
-# Initialize components
-print("Connecting to Supabase...")
-database = Database(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-print("Supabase connected successfully!")
-
-# ... rest of the file remains same ...
-
 if __name__ == '__main__':
-    # Start Telegram bot in background thread
-    bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
-    bot_thread.start()
+    # Single-process mode: Telegram bot in a background thread. With
+    # ROLE=web the web tier runs under gunicorn (see render.yaml) and the
+    # bot/publishers run as separate telegram_bot.py / worker.py processes.
+    if Config.ROLE == 'all' and Config.TELEGRAM_MODE == 'polling':
+        bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
+        bot_thread.start()
     
     # Start Flask app
     port = Config.PORT
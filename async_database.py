@@ -0,0 +1,106 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from history_buffer import HistoryBuffer
+
+
+class AsyncDatabase:
+    """Async facade over Database for use from event-loop code.
+
+    supabase-py is synchronous, so every call is offloaded to a bounded
+    thread pool instead of blocking the loop for a network round trip.
+    User rows cached in this process are returned without leaving the loop.
+    """
+
+    def __init__(self, db, max_workers=None, history_buffer=None):
+        self.db = db
+        self.history_buffer = history_buffer or HistoryBuffer(db)
+        self.max_workers = max_workers or Config.DB_MAX_WORKERS
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='db'
+        )
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking call in the database thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    async def get_user(self, telegram_id):
+        """Get user by Telegram ID"""
+        user = self.db.user_cache.get_local(telegram_id)
+        if user is not None:
+            return user
+        return await self.run(self._load_user, telegram_id)
+
+    def _load_user(self, telegram_id):
+        # Local copy already missed: shared cache (a network call), then the database
+        user = self.db.user_cache.get_shared(telegram_id)
+        return user if user is not None else self.db.fetch_user(telegram_id)
+
+    async def create_user(self, telegram_id, telegram_username):
+        """Create new user"""
+        return await self.run(self.db.create_user, telegram_id, telegram_username)
+
+    async def upsert_user(self, telegram_id, telegram_username):
+        """Create user or refresh their username; returns the row"""
+        return await self.run(self.db.upsert_user, telegram_id, telegram_username)
+
+    async def upsert_users(self, users, chunk_size=500):
+        """Bulk upsert (telegram_id, telegram_username) pairs"""
+        return await self.run(self.db.upsert_users, users, chunk_size)
+
+    async def update_user_instagram(self, telegram_id, instagram_id, instagram_username, access_token,
+                                    token_expires_at=None):
+        """Update user's Instagram information"""
+        return await self.run(
+            self.db.update_user_instagram,
+            telegram_id, instagram_id, instagram_username, access_token, token_expires_at
+        )
+
+    async def upsert_instagram_account(self, telegram_id, instagram_id, instagram_username, access_token,
+                                       token_expires_at=None):
+        """Link an Instagram account to a user, or refresh its token"""
+        return await self.run(
+            self.db.upsert_instagram_account,
+            telegram_id, instagram_id, instagram_username, access_token, token_expires_at
+        )
+
+    async def get_instagram_accounts(self, telegram_id):
+        """Get all Instagram accounts linked to a user"""
+        return await self.run(self.db.get_instagram_accounts, telegram_id)
+
+    async def delete_instagram_accounts(self, telegram_id):
+        """Unlink every Instagram account of a user"""
+        return await self.run(self.db.delete_instagram_accounts, telegram_id)
+
+    async def store_oauth_state(self, state, telegram_user_id, expires_at=None):
+        """Store OAuth state"""
+        return await self.run(self.db.store_oauth_state, state, telegram_user_id, expires_at)
+
+    async def get_oauth_state(self, state):
+        """Get OAuth state"""
+        return await self.run(self.db.get_oauth_state, state)
+
+    async def delete_oauth_state(self, state):
+        """Delete OAuth state"""
+        return await self.run(self.db.delete_oauth_state, state)
+
+    async def consume_oauth_state(self, state):
+        """Delete an unexpired OAuth state and return it"""
+        return await self.run(self.db.consume_oauth_state, state)
+
+    async def add_post_history(self, telegram_user_id, media_id, caption, success=True, error_message=None):
+        """Queue a post history row for the next bulk insert"""
+        self.history_buffer.add(self.db.post_history_row(
+            telegram_user_id, media_id, caption, success, error_message
+        ))
+
+    def shutdown(self):
+        """Flush buffered history and stop the worker threads"""
+        self.history_buffer.close()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,401 @@
+"""Local stand-ins for the Graph API, Supabase (PostgREST) and the Telegram Bot API.
+
+Each server runs a ThreadingHTTPServer on a free localhost port in a daemon
+thread and counts the calls it serves, so a benchmark can report how many
+round trips each component made.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, parse_qsl, urlsplit
+
+
+def _now_iso(offset=0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset)).isoformat()
+
+
+class FakeServer:
+    """Base class: subclasses implement handle(method, path, query, body, headers)"""
+
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _dispatch(self):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = fake.handle(
+                    self.command, parts.path, parts.query, body, self.headers
+                )
+                if isinstance(payload, (dict, list)) or payload is True:
+                    payload = json.dumps(payload).encode()
+                    headers = {'Content-Type': 'application/json', **headers}
+                payload = payload or b''
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = do_HEAD = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @staticmethod
+    def form(body, headers):
+        """Decode a JSON or form-encoded request body"""
+        if not body:
+            return {}
+        if 'json' in (headers.get('Content-Type') or ''):
+            return json.loads(body)
+        return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+
+
+class FakeGraphAPI(FakeServer):
+    """Instagram Graph API with configurable processing delay and error rate.
+
+    Containers report IN_PROGRESS until processing_delay (+/- jitter)
+    seconds have passed. A fraction error_rate of create/publish calls
+    fail with a transient 500, as the real API does under load.
+    """
+
+    name = 'fake-graph'
+
+    def __init__(self, processing_delay=5.0, jitter=0.3, error_rate=0.0, seed=None):
+        super().__init__()
+        self.processing_delay = processing_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.containers = {}
+        self.media = {}
+        self._ids = itertools.count(17_000_000_000)
+
+    def _error(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    @staticmethod
+    def _account(token):
+        return token.rsplit('-', 1)[-1]
+
+    def handle(self, method, path, query, body, headers):
+        params = dict(parse_qsl(query))
+        params.update(self.form(body, headers))
+        token = params.get('access_token', '')
+
+        if path == '/oauth/access_token':
+            self.count('oauth_access_token')
+            return 200, {}, {'access_token': f"short-{params.get('code')}", 'user_id': params.get('code')}
+        if path == '/access_token':
+            self.count('exchange_long_lived_token')
+            return 200, {}, {'access_token': f"long-{self._account(token)}", 'token_type': 'bearer', 'expires_in': 5184000}
+        if path == '/refresh_access_token':
+            self.count('refresh_access_token')
+            return 200, {}, {'access_token': token, 'token_type': 'bearer', 'expires_in': 5184000}
+        if path == '/me' and method == 'GET':
+            self.count('me')
+            account = self._account(token)
+            return 200, {}, {'id': f"ig{account}", 'username': f"bench_{account}"}
+
+        if path == '/me/media' and method == 'POST':
+            self.count('create_media_container')
+            if self._error():
+                return 500, {}, {'error': {'message': 'Fake transient error', 'code': 2, 'is_transient': True}}
+            container_id = str(next(self._ids))
+            delay = self.processing_delay * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            with self._lock:
+                self.containers[container_id] = {
+                    'account': self._account(token),
+                    'caption': params.get('caption', ''),
+                    'ready_at': time.monotonic() + delay,
+                    'published': False
+                }
+            return 200, {}, {'id': container_id}
+
+        if path == '/me/media' and method == 'GET':
+            self.count('get_recent_media')
+            account = self._account(token)
+            with self._lock:
+                media = [item for item in self.media.values() if item['account'] == account]
+            media.sort(key=lambda item: item['timestamp'], reverse=True)
+            data = [
+                {'id': item['id'], 'caption': item['caption'], 'timestamp': item['timestamp']}
+                for item in media[:int(params.get('limit', 25))]
+            ]
+            return 200, {}, {'data': data}
+
+        if path == '/me/media_publish':
+            self.count('publish_media')
+            if self._error():
+                return 500, {}, {'error': {'message': 'Fake transient error', 'code': 1, 'is_transient': True}}
+            with self._lock:
+                container = self.containers.get(params.get('creation_id'))
+                if container is None or container['ready_at'] > time.monotonic():
+                    return 400, {}, {'error': {'message': 'Media is not ready', 'code': 9007}}
+                media_id = str(next(self._ids))
+                container['published'] = True
+                self.media[media_id] = {
+                    'id': media_id,
+                    'account': container['account'],
+                    'caption': container['caption'],
+                    'timestamp': _now_iso()
+                }
+            return 200, {}, {'id': media_id}
+
+        match = re.fullmatch(r'/(\d+)', path)
+        if match and method == 'GET':
+            self.count('check_media_status')
+            with self._lock:
+                container = self.containers.get(match.group(1))
+            if container is None:
+                return 400, {}, {'error': {'message': 'Unknown container', 'code': 100}}
+            if container['published']:
+                status = 'PUBLISHED'
+            elif container['ready_at'] <= time.monotonic():
+                status = 'FINISHED'
+            else:
+                status = 'IN_PROGRESS'
+            return 200, {}, {'status_code': status, 'id': match.group(1)}
+
+        self.count('unknown')
+        return 404, {}, {'error': {'message': f'Unknown endpoint {method} {path}', 'code': 100}}
+
+
+class FakePostgREST(FakeServer):
+    """In-memory PostgREST serving the tables supabase-py talks to.
+
+    Supports the filters, ordering, upserts and returned representations
+    used by Database; enough for users, oauth_states, post_history and
+    instagram_accounts.
+    """
+
+    name = 'fake-postgrest'
+
+    RESERVED = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+    SERIAL_TABLES = ('post_history', 'instagram_accounts', 'oauth_states')
+
+    def __init__(self):
+        super().__init__()
+        self.tables = {}
+        self._serials = Counter()
+
+    def _defaults(self, table):
+        row = {'created_at': _now_iso()}
+        if table in self.SERIAL_TABLES:
+            self._serials[table] += 1
+            row['id'] = self._serials[table]
+        if table == 'users':
+            row.update(is_connected=False, last_used=_now_iso())
+        if table == 'oauth_states':
+            row['expires_at'] = _now_iso(600)
+        return row
+
+    @staticmethod
+    def _compare(value, op, target):
+        if op == 'is':
+            return value is None if target == 'null' else str(value).lower() == target
+        if value is None:
+            return False
+        if op == 'eq':
+            return str(value) == target
+        if op == 'neq':
+            return str(value) != target
+        if op == 'in':
+            return str(value) in [item.strip('"') for item in target.strip('()').split(',')]
+        if op == 'like':
+            return re.fullmatch(re.escape(target).replace('%', '.*'), str(value)) is not None
+        try:
+            left, right = float(value), float(target)
+        except (TypeError, ValueError):
+            # ISO timestamps compare correctly as strings to the second
+            left, right = str(value)[:19], target[:19]
+        return {'gt': left > right, 'gte': left >= right, 'lt': left < right, 'lte': left <= right}[op]
+
+    def _filter(self, rows, params):
+        for column, expression in params:
+            if column in self.RESERVED:
+                continue
+            op, _, target = expression.partition('.')
+            rows = [row for row in rows if self._compare(row.get(column), op, target)]
+        return rows
+
+    def handle(self, method, path, query, body, headers):
+        match = re.fullmatch(r'/rest/v1/(\w+)', path)
+        if not match:
+            self.count('unknown')
+            return 404, {}, {'message': f'Unknown path {path}'}
+        table = match.group(1)
+        self.count(f"{method} {table}")
+        params = parse_qsl(query, keep_blank_values=True)
+        options = dict(params)
+        prefer = headers.get('Prefer') or ''
+
+        with self._lock:
+            rows = self.tables.setdefault(table, [])
+
+            if method == 'POST':
+                payload = json.loads(body or b'[]')
+                payload = payload if isinstance(payload, list) else [payload]
+                conflict = options.get('on_conflict')
+                merge = 'merge-duplicates' in prefer
+                result = []
+                for data in payload:
+                    existing = None
+                    if conflict and merge:
+                        existing = next((row for row in rows if str(row.get(conflict)) == str(data.get(conflict))), None)
+                    if existing is not None:
+                        existing.update(data)
+                        result.append(dict(existing))
+                    else:
+                        row = {**self._defaults(table), **data}
+                        rows.append(row)
+                        result.append(dict(row))
+                return 201, {}, result
+
+            matched = self._filter(rows, params)
+
+            if method == 'PATCH':
+                data = json.loads(body or b'{}')
+                for row in matched:
+                    row.update(data)
+                return 200, {}, [dict(row) for row in matched]
+
+            if method == 'DELETE':
+                ids = {id(row) for row in matched}
+                self.tables[table] = [row for row in rows if id(row) not in ids]
+                return 200, {}, [dict(row) for row in matched]
+
+            for column_order in reversed([item for item in options.get('order', '').split(',') if item]):
+                column, _, direction = column_order.partition('.')
+                matched.sort(key=lambda row: (row.get(column) is None, str(row.get(column))),
+                             reverse=direction.startswith('desc'))
+            total = len(matched)
+            offset = int(options.get('offset') or 0)
+            limit = options.get('limit')
+            matched = matched[offset:offset + int(limit)] if limit else matched[offset:]
+            response_headers = {}
+            if 'count=' in prefer:
+                response_headers['Content-Range'] = f"{offset}-{offset + max(len(matched) - 1, 0)}/{total}"
+            return 200, response_headers, [dict(row) for row in matched]
+
+
+class FakeTelegram(FakeServer):
+    """Telegram Bot API recording what the bot sends to each chat.
+
+    Files requested through getFile are served from /file/bot<token>/;
+    their content is video_bytes when given, otherwise file_size
+    placeholder bytes unique to the file id.
+    """
+
+    name = 'fake-telegram'
+
+    def __init__(self, file_size=2 * 1024 * 1024, video_bytes=None):
+        super().__init__()
+        self.file_size = file_size
+        self.video_bytes = video_bytes
+        self.messages = {}
+        self.events = {}
+        self._message_ids = itertools.count(1)
+        self.bot_user = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+    def _message(self, chat_id, text, reply_markup=None, message_id=None):
+        chat_id = int(chat_id)
+        message = {
+            'message_id': message_id or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': self.bot_user,
+            'text': text
+        }
+        with self._lock:
+            self.messages[(chat_id, message['message_id'])] = dict(message, reply_markup=reply_markup)
+            self.events.setdefault(chat_id, []).append(dict(message, reply_markup=reply_markup))
+        return message
+
+    def chat_events(self, chat_id):
+        with self._lock:
+            return list(self.events.get(chat_id, []))
+
+    def file_content(self, file_id):
+        if self.video_bytes is not None:
+            return self.video_bytes
+        header = file_id.encode()
+        return header + bytes(max(self.file_size - len(header), 0))
+
+    def handle(self, method, path, query, body, headers):
+        file_match = re.fullmatch(r'/file/bot[^/]+/videos/(.+)\.mp4', path)
+        if file_match:
+            self.count('download_file')
+            return 200, {'Content-Type': 'video/mp4'}, self.file_content(file_match.group(1))
+
+        match = re.fullmatch(r'/bot[^/]+/(\w+)', path)
+        if not match:
+            self.count('unknown')
+            return 404, {}, {'ok': False, 'description': 'Not Found'}
+        api_method = match.group(1)
+        self.count(api_method)
+        params = self.form(body, headers)
+
+        if api_method == 'getMe':
+            return 200, {}, {'ok': True, 'result': self.bot_user}
+        if api_method == 'sendMessage':
+            return 200, {}, {'ok': True, 'result': self._message(
+                params['chat_id'], params.get('text', ''), params.get('reply_markup')
+            )}
+        if api_method == 'editMessageText':
+            return 200, {}, {'ok': True, 'result': self._message(
+                params['chat_id'], params.get('text', ''), params.get('reply_markup'),
+                message_id=int(params['message_id'])
+            )}
+        if api_method == 'answerCallbackQuery':
+            return 200, {}, {'ok': True, 'result': True}
+        if api_method == 'getFile':
+            file_id = params['file_id']
+            return 200, {}, {'ok': True, 'result': {
+                'file_id': file_id,
+                'file_unique_id': f"u{file_id}",
+                'file_size': len(self.file_content(file_id)),
+                'file_path': f"videos/{file_id}.mp4"
+            }}
+        return 200, {}, {'ok': True, 'result': True}
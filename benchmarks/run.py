@@ -0,0 +1,304 @@
+"""Offline end-to-end benchmark.
+
+Starts local stand-ins for the Graph API, Supabase (PostgREST) and the
+Telegram Bot API, points the app at them and drives simulated users
+through /connect -> OAuth callback -> video -> /post -> caption -> confirm,
+with the real TelegramBot, InstagramClient, publisher and database code in
+between. Reports posts/minute, p50/p99 end-to-end latency (video sent to
+"posted" message) and how many calls each component received.
+
+    python -m benchmarks.run --users 50 --concurrency 25
+    python -m benchmarks.run --users 50 --processing-delay 8 --error-rate 0.05
+    python -m benchmarks.run --users 50 --output baseline.json
+    python -m benchmarks.run --users 50 --baseline baseline.json
+
+benchmarks/baseline.json is a recorded run with the defaults
+(python -m benchmarks.run --seed 1 --output benchmarks/baseline.json,
+Python 3.11, one CPU): 20/20 posted, ~65 posts/minute, p50 4.6s,
+p99 9.1s. Compare with --seed 1 --baseline benchmarks/baseline.json and
+re-record it when the flow itself changes.
+
+Videos are placeholder bytes and local preprocessing is skipped unless
+--video points at a real clip (which needs ffmpeg). Any setting in
+config.py can still be overridden through the environment, e.g.
+POLL_MIN_INTERVAL=0.5.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_servers import FakeGraphAPI, FakePostgREST, FakeTelegram
+
+BOT_TOKEN = '123456:BENCHMARK'
+FIRST_USER_ID = 100_000
+
+
+def configure_environment(graph, postgrest, telegram, workdir, preprocess):
+    """Point Config at the fake servers; must run before config is imported"""
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': BOT_TOKEN,
+        'TELEGRAM_MODE': 'polling',
+        'TELEGRAM_API_URL': f"{telegram.url}/bot",
+        'TELEGRAM_FILE_URL': f"{telegram.url}/file/bot",
+        'INSTAGRAM_APP_ID': 'benchmark',
+        'INSTAGRAM_APP_SECRET': 'benchmark',
+        'INSTAGRAM_TOKEN_URL': f"{graph.url}/oauth/access_token",
+        'INSTAGRAM_GRAPH_URL': graph.url,
+        'REDIRECT_URI': 'http://benchmark.local/oauth/callback',
+        'SUPABASE_URL': postgrest.url,
+        # supabase-py only accepts JWT-shaped keys
+        'SUPABASE_KEY': 'benchmark.benchmark.benchmark',
+        'ROLE': 'all',
+        'JOB_QUEUE_BACKEND': 'sqlite',
+        'JOB_QUEUE_PATH': os.path.join(workdir, 'publish_jobs.db'),
+        'MEDIA_DIR': os.path.join(workdir, 'media'),
+        'MEDIA_CACHE_PATH': os.path.join(workdir, 'media_cache.db'),
+        'HISTORY_SPOOL_DIR': os.path.join(workdir, 'history_spool'),
+        'PREPROCESS_ENABLED': 'true' if preprocess else 'false'
+    })
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p * (len(ordered) - 1)))]
+
+
+class SimulatedUsers:
+    """Plays Telegram users against an initialized Application"""
+
+    def __init__(self, application, telegram, flask_app, timeout):
+        from telegram import Update
+        self.Update = Update
+        self.application = application
+        self.telegram = telegram
+        self.flask_app = flask_app
+        self.timeout = timeout
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'username': f"user{user_id}"}
+
+    def _message(self, user_id, **fields):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            **fields
+        }
+
+    async def _send(self, payload):
+        payload['update_id'] = next(self._update_ids)
+        update = self.Update.de_json(payload, self.application.bot)
+        await self.application.process_update(update)
+
+    async def text(self, user_id, text):
+        fields = {'text': text}
+        if text.startswith('/'):
+            command = text.split()[0]
+            fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        await self._send({'message': self._message(user_id, **fields)})
+
+    async def video(self, user_id):
+        file_id = f"video{user_id}"
+        await self._send({'message': self._message(user_id, video={
+            'file_id': file_id,
+            'file_unique_id': f"u{file_id}",
+            'width': 1080,
+            'height': 1920,
+            'duration': 15,
+            'mime_type': 'video/mp4',
+            'file_size': len(self.telegram.file_content(file_id))
+        })})
+
+    async def callback(self, user_id, data, message_id):
+        await self._send({'callback_query': {
+            'id': str(next(self._update_ids)),
+            'from': self._user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'Ready to post!'
+            }
+        }})
+
+    async def wait_for(self, user_id, pattern, since=0):
+        """Wait for a bot message (sent or edited) matching pattern"""
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            for event in self.telegram.chat_events(user_id)[since:]:
+                if re.search(pattern, event['text'] or '') or re.search(pattern, event['reply_markup'] or ''):
+                    return event
+            await asyncio.sleep(0.02)
+        raise TimeoutError(f"user {user_id}: no message matching {pattern!r}")
+
+    def _oauth_callback(self, code, state):
+        response = self.flask_app.test_client().get(f"/oauth/callback?code={code}&state={state}")
+        if response.status_code != 200:
+            raise RuntimeError(f"OAuth callback failed with HTTP {response.status_code}")
+
+    async def run(self, index):
+        """One user's full flow; returns (ok, latency seconds)"""
+        user_id = FIRST_USER_ID + index
+        await self.text(user_id, '/start')
+        await self.text(user_id, '/connect')
+        event = await self.wait_for(user_id, r'state=')
+        state = re.search(r'state=([\w-]+)', event['reply_markup']).group(1)
+        await asyncio.to_thread(self._oauth_callback, f"c{index}", state)
+
+        started = time.perf_counter()
+        await self.video(user_id)
+        await self.text(user_id, '/post')
+        mark = len(self.telegram.chat_events(user_id))
+        await self.text(user_id, f"Benchmark reel {index} #bench")
+        preview = await self.wait_for(user_id, r'post_confirm', since=mark)
+        mark = len(self.telegram.chat_events(user_id))
+        await self.callback(user_id, 'post_confirm', preview['message_id'])
+        result = await self.wait_for(user_id, r'Successfully posted|Failed to post|error occurred', since=mark)
+        return 'Successfully posted' in result['text'], time.perf_counter() - started
+
+
+async def run_load(args, telegram):
+    import app as web
+    from metrics import HTTP_CALL_SECONDS
+    from telegram_bot import TelegramBot
+
+    bot = TelegramBot(
+        web.components.database,
+        web.components.instagram_client,
+        media_store=web.components.media_store,
+        oauth_states=web.components.oauth_states,
+        token_manager=web.components.token_manager,
+        run_workers=True
+    )
+    application = bot.create_application()
+    await application.initialize()
+    await bot.startup(application)
+
+    users = SimulatedUsers(application, telegram, web.app, args.timeout)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index):
+        async with semaphore:
+            try:
+                return await users.run(index)
+            except Exception as e:
+                print(f"User {index} failed: {e}", file=sys.stderr)
+                return False, None
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(one(index) for index in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    await bot.shutdown(application)
+    await application.shutdown()
+    return outcomes, elapsed, HTTP_CALL_SECONDS.totals()
+
+
+def report(args, outcomes, elapsed, graph, postgrest, telegram, client_latency):
+    latencies = [latency for ok, latency in outcomes if ok]
+    posted = len(latencies)
+    return {
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'processing_delay': args.processing_delay,
+        'error_rate': args.error_rate,
+        'posted': posted,
+        'failed': len(outcomes) - posted,
+        'elapsed_seconds': round(elapsed, 3),
+        'posts_per_minute': round(posted / elapsed * 60, 2) if elapsed else 0,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p99': percentile(latencies, 0.99),
+        'calls': {
+            'graph': dict(graph.calls),
+            'postgrest': dict(postgrest.calls),
+            'telegram': dict(telegram.calls)
+        },
+        'graph_client_latency': {
+            f"{name} {result}": {'count': count, 'avg': round(total / count, 4)}
+            for (name, result), (count, total) in sorted(client_latency.items())
+        }
+    }
+
+
+def print_report(result, baseline=None):
+    def line(label, key, fmt='{:.2f}'):
+        value = result.get(key)
+        text = fmt.format(value) if value is not None else '-'
+        if baseline and baseline.get(key) and value is not None:
+            change = (value - baseline[key]) / baseline[key] * 100
+            text += f"   (baseline {fmt.format(baseline[key])}, {change:+.1f}%)"
+        print(f"  {label:<22}{text}")
+
+    print(f"\nBenchmark: {result['users']} users, concurrency {result['concurrency']}, "
+          f"processing delay {result['processing_delay']}s, error rate {result['error_rate']}")
+    line('posted', 'posted', '{}')
+    line('failed', 'failed', '{}')
+    line('elapsed (s)', 'elapsed_seconds')
+    line('posts/minute', 'posts_per_minute')
+    line('latency p50 (s)', 'latency_p50', '{:.3f}')
+    line('latency p99 (s)', 'latency_p99', '{:.3f}')
+    for component, calls in result['calls'].items():
+        print(f"\n  {component} calls")
+        previous = (baseline or {}).get('calls', {}).get(component, {})
+        for route, count in sorted(calls.items()):
+            suffix = f"   (baseline {previous[route]})" if route in previous else ''
+            print(f"    {route:<32}{count}{suffix}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='simulated users, one post each')
+    parser.add_argument('--concurrency', type=int, default=10, help='users active at once')
+    parser.add_argument('--processing-delay', type=float, default=3.0, help='seconds until a container is FINISHED')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of create/publish calls that fail')
+    parser.add_argument('--file-size', type=int, default=2 * 1024 * 1024, help='placeholder video size in bytes')
+    parser.add_argument('--video', help='serve this clip instead of placeholder bytes (enables preprocessing)')
+    parser.add_argument('--timeout', type=float, default=300, help='per-step timeout in seconds')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help='write results as JSON (e.g. a baseline)')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    args = parser.parse_args(argv)
+
+    video_bytes = None
+    if args.video:
+        with open(args.video, 'rb') as f:
+            video_bytes = f.read()
+
+    graph = FakeGraphAPI(args.processing_delay, error_rate=args.error_rate, seed=args.seed).start()
+    postgrest = FakePostgREST().start()
+    telegram = FakeTelegram(args.file_size, video_bytes).start()
+
+    with tempfile.TemporaryDirectory(prefix='instaposter-bench-') as workdir:
+        configure_environment(graph, postgrest, telegram, workdir, preprocess=bool(args.video))
+        outcomes, elapsed, client_latency = asyncio.run(run_load(args, telegram))
+
+    result = report(args, outcomes, elapsed, graph, postgrest, telegram, client_latency)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    for server in (graph, postgrest, telegram):
+        server.stop()
+    return 0 if result['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
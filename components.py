@@ -0,0 +1,141 @@
+import threading
+import time
+from config import Config
+from metrics import STARTUP_SECONDS
+
+
+class ComponentRegistry:
+    """Process-wide shared clients, each built on first use and only once.
+
+    Factories import their own modules, so a process only loads the
+    libraries behind the components it actually touches (the web tier never
+    imports python-telegram-bot in polling mode, a worker never builds the
+    session store). Construction is serialized by a re-entrant lock so
+    factories can depend on other components. Build times are recorded per
+    component, excluding dependencies built inside them; profile() prints
+    the breakdown and /metrics exports it as instaposter_startup_seconds.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+        # [name, seconds spent building dependencies] per factory running
+        self._building = []
+        self.timings = {}
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def get(self, name):
+        """The named component, built now if this is its first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"Unknown component: {name}")
+            if any(building == name for building, _ in self._building):
+                raise RuntimeError(f"Circular dependency on component {name}")
+
+            self._building.append([name, 0.0])
+            started = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            finally:
+                elapsed = time.perf_counter() - started
+                _, dependencies = self._building.pop()
+                if self._building:
+                    self._building[-1][1] += elapsed
+            self.record(name, elapsed - dependencies)
+            self._instances[name] = instance
+            return instance
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError as e:
+            raise AttributeError(name) from e
+
+    def is_built(self, name):
+        return name in self._instances
+
+    def record(self, phase, seconds):
+        """Add a startup phase (e.g. module imports) to the profile"""
+        self.timings[phase] = seconds
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    def profile(self):
+        """Startup time breakdown, slowest first"""
+        lines = [
+            f"  {phase:<20}{seconds * 1000:9.1f} ms"
+            for phase, seconds in sorted(self.timings.items(), key=lambda item: -item[1])
+        ]
+        total = sum(self.timings.values())
+        return '\n'.join(['Startup profile:', *lines, f"  {'total':<20}{total * 1000:9.1f} ms"])
+
+
+components = ComponentRegistry()
+
+
+def _redis():
+    # Optional dependency, only needed for the shared user cache and sessions
+    import redis
+    return redis.Redis.from_url(Config.REDIS_URL)
+
+
+def _database():
+    from database import Database
+    from user_cache import create_user_cache
+    redis_client = components.redis if Config.USER_CACHE_BACKEND == 'redis' else None
+    print("Connecting to Supabase...")
+    database = Database(Config.SUPABASE_URL, Config.SUPABASE_KEY, user_cache=create_user_cache(redis_client))
+    print("Supabase connected successfully!")
+    return database
+
+
+def _sessions():
+    from session_store import create_session_store
+    redis_client = components.redis if Config.SESSION_STORE == 'redis' else None
+    return create_session_store(redis_client)
+
+
+def _instagram_client():
+    from instagram_client import InstagramClient
+    return InstagramClient()
+
+
+def _media_store():
+    from media_store import MediaStore
+    return MediaStore()
+
+
+def _oauth_states():
+    from oauth_states import OAuthStateStore
+    return OAuthStateStore(components.database)
+
+
+def _token_manager():
+    from token_manager import TokenManager
+    return TokenManager(components.database, components.instagram_client)
+
+
+def _job_queue():
+    from job_queue import create_job_queue
+    # The SQLite backend doesn't need a Supabase client
+    supabase = components.database.supabase if Config.JOB_QUEUE_BACKEND == 'supabase' else None
+    return create_job_queue(supabase)
+
+
+components.register('redis', _redis)
+components.register('database', _database)
+components.register('sessions', _sessions)
+components.register('instagram_client', _instagram_client)
+components.register('media_store', _media_store)
+components.register('oauth_states', _oauth_states)
+components.register('token_manager', _token_manager)
+components.register('job_queue', _job_queue)
@@ -6,6 +6,19 @@ load_dotenv()
 class Config:
     # Telegram
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+    # 'polling' or 'webhook' (updates posted to /telegram/webhook)
+    TELEGRAM_MODE = os.getenv('TELEGRAM_MODE', 'polling')
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+    # Required in webhook mode: requests without it are rejected
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+    # 'memory' or 'redis' to drop redelivered updates whichever process gets them
+    WEBHOOK_DEDUP = os.getenv('WEBHOOK_DEDUP', 'memory')
+    WEBHOOK_DEDUP_SIZE = int(os.getenv('WEBHOOK_DEDUP_SIZE', 10000))
+    # Telegram gives up redelivering an update after 24 hours
+    WEBHOOK_DEDUP_TTL = int(os.getenv('WEBHOOK_DEDUP_TTL', 24 * 60 * 60))
+    # Bot API endpoints; overridden for a local Bot API server or the benchmark's stand-in
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+    TELEGRAM_FILE_URL = os.getenv('TELEGRAM_FILE_URL', 'https://api.telegram.org/file/bot')
     
     # Instagram
     INSTAGRAM_APP_ID = os.getenv('INSTAGRAM_APP_ID')
@@ -15,17 +28,129 @@ class Config:
     # Supabase
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+    DB_MAX_WORKERS = int(os.getenv('DB_MAX_WORKERS', 16))
+    
+    # Post history write buffer
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', 50))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', 5))
+    HISTORY_SPOOL_DIR = os.getenv('HISTORY_SPOOL_DIR', 'history_spool')
+    # Failed retries before a spooled batch is moved to the spool's failed/ dir
+    HISTORY_SPOOL_MAX_ATTEMPTS = int(os.getenv('HISTORY_SPOOL_MAX_ATTEMPTS', 8))
+    
+    # User cache
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+    # 'memory' or 'redis' to share rows (and invalidations) between processes
+    USER_CACHE_BACKEND = os.getenv('USER_CACHE_BACKEND', 'memory')
+    # With a shared backend, how long a process may reuse its own copy of a row
+    USER_CACHE_LOCAL_TTL = float(os.getenv('USER_CACHE_LOCAL_TTL', 5))
+    
+    # OAuth states
+    OAUTH_STATE_TTL = int(os.getenv('OAUTH_STATE_TTL', 600))
+    OAUTH_STATE_CACHE_SIZE = int(os.getenv('OAUTH_STATE_CACHE_SIZE', 10000))
+    OAUTH_SWEEP_INTERVAL = float(os.getenv('OAUTH_SWEEP_INTERVAL', 300))
+    OAUTH_SWEEP_BATCH = int(os.getenv('OAUTH_SWEEP_BATCH', 500))
+    
+    # Conversation sessions ('memory' or 'redis' to share between bot processes)
+    SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 60 * 60))
+    SESSION_MAX_SIZE = int(os.getenv('SESSION_MAX_SIZE', 10000))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     
     # Security
     SECRET_KEY = os.getenv('SECRET_KEY', 'fallback-secret-key')
     
     # Server
     PORT = int(os.getenv('PORT', 10000))
+    # Process role: 'all' (single process), 'web', 'ingress' or 'worker'
+    ROLE = os.getenv('ROLE', 'all')
+    # Browser/CDN cache lifetime of pre-rendered pages (revalidated by ETag)
+    PAGE_MAX_AGE = int(os.getenv('PAGE_MAX_AGE', 600))
+    # Metrics: worker.py serves /metrics on METRICS_PORT (0 disables it).
+    # With several web processes on one port, set METRICS_DIR to a directory
+    # they share so /metrics reports the sum of all of them
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 10))
+    # Print a startup time breakdown once background services are up
+    STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() == 'true'
     
     # Instagram API URLs
-    INSTAGRAM_AUTH_URL = "https://api.instagram.com/oauth/authorize"
-    INSTAGRAM_TOKEN_URL = "https://api.instagram.com/oauth/access_token"
-    INSTAGRAM_GRAPH_URL = "https://graph.instagram.com"
+    INSTAGRAM_AUTH_URL = os.getenv('INSTAGRAM_AUTH_URL', "https://api.instagram.com/oauth/authorize")
+    INSTAGRAM_TOKEN_URL = os.getenv('INSTAGRAM_TOKEN_URL', "https://api.instagram.com/oauth/access_token")
+    INSTAGRAM_GRAPH_URL = os.getenv('INSTAGRAM_GRAPH_URL', "https://graph.instagram.com")
+    INSTAGRAM_LONG_LIVED_TOKEN_URL = f"{INSTAGRAM_GRAPH_URL}/access_token"
+    INSTAGRAM_REFRESH_TOKEN_URL = f"{INSTAGRAM_GRAPH_URL}/refresh_access_token"
+    
+    # Access token lifecycle (long-lived tokens last 60 days)
+    TOKEN_REFRESH_INTERVAL = float(os.getenv('TOKEN_REFRESH_INTERVAL', 6 * 60 * 60))
+    TOKEN_REFRESH_BEFORE = int(os.getenv('TOKEN_REFRESH_BEFORE', 7 * 24 * 60 * 60))
+    TOKEN_WARN_BEFORE = int(os.getenv('TOKEN_WARN_BEFORE', 3 * 24 * 60 * 60))
+    TOKEN_REFRESH_BATCH = int(os.getenv('TOKEN_REFRESH_BATCH', 200))
+    TOKEN_REFRESH_CONCURRENCY = int(os.getenv('TOKEN_REFRESH_CONCURRENCY', 4))
+    
+    # HTTP connection pool
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 60))
+    
+    # Graph API rate limits
+    RATE_LIMIT_GLOBAL_PER_SEC = float(os.getenv('RATE_LIMIT_GLOBAL_PER_SEC', 20))
+    RATE_LIMIT_GLOBAL_BURST = int(os.getenv('RATE_LIMIT_GLOBAL_BURST', 40))
+    RATE_LIMIT_TOKEN_PER_SEC = float(os.getenv('RATE_LIMIT_TOKEN_PER_SEC', 2))
+    RATE_LIMIT_TOKEN_BURST = int(os.getenv('RATE_LIMIT_TOKEN_BURST', 5))
+    # Enforced per account across all workers from the shared job queue
+    PUBLISH_LIMIT_PER_DAY = int(os.getenv('PUBLISH_LIMIT_PER_DAY', 50))
+    # How long a job over its account's daily budget waits before trying again
+    PUBLISH_BUDGET_DEFER = float(os.getenv('PUBLISH_BUDGET_DEFER', 900))
+    
+    # Publishing
+    PUBLISH_CONCURRENCY = int(os.getenv('PUBLISH_CONCURRENCY', 10))
+    PUBLISH_MAX_WAIT = float(os.getenv('PUBLISH_MAX_WAIT', 300))
+    POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', 2))
+    POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', 30))
+    POLL_BACKOFF = float(os.getenv('POLL_BACKOFF', 1.5))
+    POLL_JITTER = float(os.getenv('POLL_JITTER', 0.2))
+    
+    # Batch and scheduled posting
+    BATCH_MAX_VIDEOS = int(os.getenv('BATCH_MAX_VIDEOS', 10))
+    SCHEDULE_MAX_DAYS = int(os.getenv('SCHEDULE_MAX_DAYS', 30))
+    
+    # Media hosting
+    PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', (REDIRECT_URI or '').replace('/oauth/callback', ''))
+    MEDIA_DIR = os.getenv('MEDIA_DIR', 'media')
+    MEDIA_URL_TTL = int(os.getenv('MEDIA_URL_TTL', 6 * 60 * 60))
+    INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 1024 * 1024))
+    MEDIA_CACHE_PATH = os.getenv('MEDIA_CACHE_PATH', 'media_cache.db')
+    MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+    # How often the ingesting host releases media of finished jobs and stale prefetches
+    MEDIA_REAP_INTERVAL = float(os.getenv('MEDIA_REAP_INTERVAL', 60))
+    
+    # Retries
+    RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 4))
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 2))
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 60))
+    
+    # Local video preprocessing
+    PREPROCESS_ENABLED = os.getenv('PREPROCESS_ENABLED', 'true').lower() == 'true'
+    PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', 2))
+    PREPROCESS_TRANSCODE = os.getenv('PREPROCESS_TRANSCODE', 'true').lower() == 'true'
+    PREPROCESS_TARGET_BITRATE = int(os.getenv('PREPROCESS_TARGET_BITRATE', 5_000_000))
+    PREPROCESS_MAX_BITRATE = int(os.getenv('PREPROCESS_MAX_BITRATE', 25_000_000))
+    PREPROCESS_TIMEOUT = int(os.getenv('PREPROCESS_TIMEOUT', 300))
+    
+    # Job queue ('sqlite' for a single host, 'supabase' to share it between hosts)
+    JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 5))
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'publish_jobs.db')
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+
+    # Health checks (probed in the background; /health and /ready read the cache)
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', 15))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 5))
+    HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 60))
+    # A due job nobody has touched for this long means no worker is running
+    HEALTH_WORKER_STALL = float(os.getenv('HEALTH_WORKER_STALL', 300))
     
     @classmethod
     def validate(cls):
@@ -47,4 +172,8 @@ class Config:
         if missing:
             raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
         
+        # Without the secret anyone could post updates to /telegram/webhook
+        if cls.TELEGRAM_MODE == 'webhook' and cls.ROLE in ('all', 'web') and not cls.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required when TELEGRAM_MODE=webhook")
+        
         return True
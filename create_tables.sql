@@ -6,6 +6,7 @@ CREATE TABLE users (
     instagram_user_id TEXT,
     instagram_username TEXT,
     instagram_access_token TEXT,
+    instagram_token_expires_at TIMESTAMP WITH TIME ZONE,
     is_connected BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()),
     last_used TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
@@ -16,9 +17,29 @@ CREATE TABLE oauth_states (
     id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
     state TEXT UNIQUE NOT NULL,
     telegram_user_id TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()),
+    expires_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) + INTERVAL '10 minutes'
+);
+
+CREATE INDEX oauth_states_expires_at_idx ON oauth_states (expires_at);
+
+-- Create instagram_accounts table (every account a Telegram user has linked;
+-- users.instagram_* holds the primary one)
+CREATE TABLE instagram_accounts (
+    id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    telegram_user_id TEXT NOT NULL,
+    instagram_id TEXT UNIQUE NOT NULL,
+    instagram_username TEXT,
+    access_token TEXT NOT NULL,
+    token_expires_at TIMESTAMP WITH TIME ZONE,
+    token_warned_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
 );
 
+CREATE INDEX instagram_accounts_telegram_user_id_idx ON instagram_accounts (telegram_user_id);
+-- Lets the token refresher find tokens nearing expiry without a scan
+CREATE INDEX instagram_accounts_token_expires_at_idx ON instagram_accounts (token_expires_at);
+
 -- Create post_history table
 CREATE TABLE post_history (
     id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
@@ -31,12 +52,68 @@ CREATE TABLE post_history (
     posted_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
 );
 
+-- Create publish_jobs table
+CREATE TABLE publish_jobs (
+    id TEXT PRIMARY KEY,
+    telegram_user_id TEXT NOT NULL,
+    chat_id BIGINT,
+    message_id BIGINT,
+    instagram_username TEXT,
+    access_token TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    video_path TEXT,
+    caption TEXT,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'container_created', 'processing', 'published', 'failed')),
+    container_id TEXT,
+    media_id TEXT,
+    error_message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    duration REAL,
+    size BIGINT,
+    cover_url TEXT,
+    scheduled_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
+);
+
+CREATE INDEX publish_jobs_status_idx ON publish_jobs (status, lease_expires_at);
+CREATE INDEX publish_jobs_scheduled_at_idx ON publish_jobs (scheduled_at) WHERE status = 'queued';
+CREATE INDEX publish_jobs_published_idx ON publish_jobs (instagram_username, updated_at) WHERE status = 'published';
+
+-- Lease the oldest runnable job that is due to a worker; SKIP LOCKED keeps
+-- concurrent workers from claiming the same row
+CREATE OR REPLACE FUNCTION claim_publish_job(p_worker_id TEXT, p_lease_seconds INTEGER)
+RETURNS SETOF publish_jobs AS $$
+    UPDATE publish_jobs
+    SET lease_owner = p_worker_id,
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = attempts + 1,
+        updated_at = NOW()
+    WHERE id = (
+        SELECT id FROM publish_jobs
+        WHERE status IN ('queued', 'container_created', 'processing')
+          AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+          AND (scheduled_at IS NULL OR scheduled_at <= NOW())
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
 -- Create RLS policies
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE oauth_states ENABLE ROW LEVEL SECURITY;
 ALTER TABLE post_history ENABLE ROW LEVEL SECURITY;
+ALTER TABLE instagram_accounts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE publish_jobs ENABLE ROW LEVEL SECURITY;
 
 -- Create policy to allow all operations for service role
 CREATE POLICY "Enable all for service role" ON users FOR ALL USING (auth.role() = 'service_role');
 CREATE POLICY "Enable all for service role" ON oauth_states FOR ALL USING (auth.role() = 'service_role');
 CREATE POLICY "Enable all for service role" ON post_history FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Enable all for service role" ON instagram_accounts FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Enable all for service role" ON publish_jobs FOR ALL USING (auth.role() = 'service_role');
\ No newline at end of file
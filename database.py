@@ -1,10 +1,13 @@
 from supabase import create_client
 from datetime import datetime
+from user_cache import create_user_cache
+from metrics import timed_db_call
 
 class Database:
-    def __init__(self, url, key):
+    def __init__(self, url, key, user_cache=None):
         """Initialize database connection"""
         self.supabase = create_client(url, key)
+        self.user_cache = user_cache or create_user_cache()
         self.setup_tables()
     
     def setup_tables(self):
@@ -18,6 +21,7 @@ class Database:
             instagram_id text,
             instagram_username text,
             instagram_access_token text,
+            instagram_token_expires_at timestamp with time zone,
             is_connected boolean default false,
             last_used timestamp with time zone default now(),
             created_at timestamp with time zone default now()
@@ -29,8 +33,26 @@ class Database:
         create table public.oauth_states (
             state text primary key,
             telegram_user_id bigint references public.users(telegram_id),
+            created_at timestamp with time zone default now(),
+            expires_at timestamp with time zone default now() + interval '10 minutes'
+        );
+        create index oauth_states_expires_at_idx on public.oauth_states (expires_at);
+        """
+        
+        # instagram_accounts table
+        """
+        create table public.instagram_accounts (
+            id serial primary key,
+            telegram_user_id bigint references public.users(telegram_id),
+            instagram_id text unique not null,
+            instagram_username text,
+            access_token text not null,
+            token_expires_at timestamp with time zone,
+            token_warned_at timestamp with time zone,
             created_at timestamp with time zone default now()
         );
+        create index instagram_accounts_telegram_user_id_idx on public.instagram_accounts (telegram_user_id);
+        create index instagram_accounts_token_expires_at_idx on public.instagram_accounts (token_expires_at);
         """
         
         # post_history table
@@ -46,11 +68,36 @@ class Database:
         );
         """
 
+    @timed_db_call
+    def check_connection(self):
+        """Cheapest round trip to Supabase (bypasses the user cache)"""
+        self.supabase.table('users').select('telegram_id').limit(1).execute()
+        return True
+
     def get_user(self, telegram_id):
         """Get user by Telegram ID"""
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            return user
+        return self.fetch_user(telegram_id)
+
+    @timed_db_call
+    def fetch_user(self, telegram_id):
+        """Query a user row, bypassing the cache, and cache the result"""
         response = self.supabase.table('users').select('*').eq('telegram_id', telegram_id).execute()
-        return response.data[0] if response.data else None
+        user = response.data[0] if response.data else None
+        if user is not None:
+            self.user_cache.set(telegram_id, user)
+        return user
+
+    def _cache_user_response(self, telegram_id, response):
+        """Write a returned row through to the cache, or invalidate it"""
+        if response.data:
+            self.user_cache.set(telegram_id, response.data[0])
+        else:
+            self.user_cache.invalidate(telegram_id)
 
+    @timed_db_call
     def create_user(self, telegram_id, telegram_username):
         """Create new user"""
         data = {
@@ -58,43 +105,221 @@ class Database:
             'telegram_username': telegram_username,
             'is_connected': False
         }
-        return self.supabase.table('users').insert(data).execute()
+        response = self.supabase.table('users').insert(data).execute()
+        self._cache_user_response(telegram_id, response)
+        return response
 
-    def update_user_instagram(self, telegram_id, instagram_id, instagram_username, access_token):
+    @timed_db_call
+    def upsert_user(self, telegram_id, telegram_username):
+        """Create user or refresh their username in one idempotent round trip"""
+        data = {
+            'telegram_id': telegram_id,
+            'telegram_username': telegram_username
+        }
+        response = self.supabase.table('users').upsert(data, on_conflict='telegram_id').execute()
+        self._cache_user_response(telegram_id, response)
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    def upsert_users(self, users, chunk_size=500):
+        """Bulk upsert (telegram_id, telegram_username) pairs, chunk_size rows per request"""
+        users = list(users)
+        count = 0
+        for start in range(0, len(users), chunk_size):
+            rows = [
+                {'telegram_id': telegram_id, 'telegram_username': telegram_username}
+                for telegram_id, telegram_username in users[start:start + chunk_size]
+            ]
+            response = self.supabase.table('users').upsert(rows, on_conflict='telegram_id').execute()
+            for row in response.data or []:
+                self.user_cache.set(row['telegram_id'], row)
+            count += len(rows)
+        return count
+
+    @timed_db_call
+    def update_user_instagram(self, telegram_id, instagram_id, instagram_username, access_token,
+                              token_expires_at=None):
         """Update user's Instagram information"""
         data = {
             'instagram_id': instagram_id,
             'instagram_username': instagram_username,
             'instagram_access_token': access_token,
+            'instagram_token_expires_at': token_expires_at,
             'is_connected': bool(instagram_id and access_token),
             'last_used': datetime.utcnow().isoformat()
         }
-        return self.supabase.table('users').update(data).eq('telegram_id', telegram_id).execute()
+        self.user_cache.invalidate(telegram_id)
+        response = self.supabase.table('users').update(data).eq('telegram_id', telegram_id).execute()
+        self._cache_user_response(telegram_id, response)
+        return response
 
-    def store_oauth_state(self, state, telegram_user_id):
+    @timed_db_call
+    def upsert_instagram_account(self, telegram_id, instagram_id, instagram_username, access_token,
+                                 token_expires_at=None):
+        """Link an Instagram account to a user, or refresh its token"""
+        data = {
+            'telegram_user_id': telegram_id,
+            'instagram_id': instagram_id,
+            'instagram_username': instagram_username,
+            'access_token': access_token,
+            'token_expires_at': token_expires_at,
+            'token_warned_at': None
+        }
+        response = (
+            self.supabase.table('instagram_accounts')
+            .upsert(data, on_conflict='instagram_id')
+            .execute()
+        )
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    def get_instagram_accounts(self, telegram_id):
+        """Get all Instagram accounts linked to a user, oldest first"""
+        response = (
+            self.supabase.table('instagram_accounts')
+            .select('*')
+            .eq('telegram_user_id', telegram_id)
+            .order('created_at')
+            .execute()
+        )
+        return response.data or []
+
+    @timed_db_call
+    def delete_instagram_accounts(self, telegram_id):
+        """Unlink every Instagram account of a user"""
+        return self.supabase.table('instagram_accounts').delete().eq('telegram_user_id', telegram_id).execute()
+
+    @timed_db_call
+    def get_expiring_accounts(self, before, limit, after_id=0):
+        """Get up to limit accounts whose token expires before a time, by id after after_id"""
+        response = (
+            self.supabase.table('instagram_accounts')
+            .select('*')
+            .lt('token_expires_at', before)
+            .gt('id', after_id)
+            .order('id')
+            .limit(limit)
+            .execute()
+        )
+        return response.data or []
+
+    @timed_db_call
+    def update_account_token(self, telegram_id, instagram_id, access_token, token_expires_at):
+        """Store a refreshed token on the account and, if it is the primary, on the user"""
+        (
+            self.supabase.table('instagram_accounts')
+            .update({
+                'access_token': access_token,
+                'token_expires_at': token_expires_at,
+                'token_warned_at': None
+            })
+            .eq('instagram_id', instagram_id)
+            .execute()
+        )
+        response = (
+            self.supabase.table('users')
+            .update({'instagram_access_token': access_token, 'instagram_token_expires_at': token_expires_at})
+            .eq('telegram_id', telegram_id)
+            .eq('instagram_id', instagram_id)
+            .execute()
+        )
+        if response.data:
+            self.user_cache.set(telegram_id, response.data[0])
+
+    @timed_db_call
+    def claim_token_warning(self, instagram_id):
+        """Mark an account as warned about its expiring token; False if it already was.
+
+        The check and the update are one statement, so when several
+        processes find the same expiring account only one sends the warning.
+        """
+        response = (
+            self.supabase.table('instagram_accounts')
+            .update({'token_warned_at': datetime.utcnow().isoformat()})
+            .eq('instagram_id', instagram_id)
+            .is_('token_warned_at', 'null')
+            .execute()
+        )
+        return bool(response.data)
+
+    @timed_db_call
+    def clear_token_warning(self, instagram_id):
+        """Give back a warning claim whose message couldn't be sent"""
+        return (
+            self.supabase.table('instagram_accounts')
+            .update({'token_warned_at': None})
+            .eq('instagram_id', instagram_id)
+            .execute()
+        )
+
+    @timed_db_call
+    def store_oauth_state(self, state, telegram_user_id, expires_at=None):
         """Store OAuth state"""
         data = {
             'state': state,
             'telegram_user_id': telegram_user_id
         }
+        if expires_at:
+            data['expires_at'] = expires_at
         return self.supabase.table('oauth_states').insert(data).execute()
 
+    @timed_db_call
     def get_oauth_state(self, state):
         """Get OAuth state"""
         response = self.supabase.table('oauth_states').select('*').eq('state', state).execute()
         return response.data[0] if response.data else None
 
+    @timed_db_call
     def delete_oauth_state(self, state):
         """Delete OAuth state"""
         return self.supabase.table('oauth_states').delete().eq('state', state).execute()
 
-    def add_post_history(self, telegram_user_id, media_id, caption, success=True, error_message=None):
-        """Add post to history"""
-        data = {
+    @timed_db_call
+    def consume_oauth_state(self, state):
+        """Delete an unexpired OAuth state and return it, in one round trip"""
+        response = (
+            self.supabase.table('oauth_states')
+            .delete()
+            .eq('state', state)
+            .gt('expires_at', datetime.utcnow().isoformat())
+            .execute()
+        )
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    def delete_expired_oauth_states(self, limit):
+        """Delete up to limit expired OAuth states; returns how many were removed"""
+        response = (
+            self.supabase.table('oauth_states')
+            .select('state')
+            .lt('expires_at', datetime.utcnow().isoformat())
+            .limit(limit)
+            .execute()
+        )
+        states = [row['state'] for row in response.data or []]
+        if states:
+            self.supabase.table('oauth_states').delete().in_('state', states).execute()
+        return len(states)
+
+    @staticmethod
+    def post_history_row(telegram_user_id, media_id, caption, success=True, error_message=None):
+        """Build a post_history row"""
+        return {
             'telegram_user_id': telegram_user_id,
             'media_id': media_id,
             'caption': caption,
             'success': success,
-            'error_message': error_message
+            'error_message': error_message,
+            'created_at': datetime.utcnow().isoformat()
         }
+
+    @timed_db_call
+    def add_post_history(self, telegram_user_id, media_id, caption, success=True, error_message=None):
+        """Add post to history"""
+        data = self.post_history_row(telegram_user_id, media_id, caption, success, error_message)
         return self.supabase.table('post_history').insert(data).execute()
+
+    @timed_db_call
+    def add_post_history_batch(self, rows):
+        """Insert many post_history rows in one request"""
+        return self.supabase.table('post_history').insert(rows).execute()
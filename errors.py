@@ -0,0 +1,83 @@
+import httpx
+
+# Graph API error codes (https://developers.facebook.com/docs/graph-api/guides/error-handling)
+RATE_LIMIT_CODES = {4, 17, 32, 613, 80001, 80002}
+AUTH_CODES = {102, 190}
+TRANSIENT_CODES = {1, 2}
+
+
+class GraphAPIError(Exception):
+    """Base class for classified Instagram Graph API failures.
+
+    safe_to_retry is True when the request is known not to have been acted
+    on (e.g. the connection was never established), so even non-idempotent
+    calls such as container creation can be repeated.
+    """
+
+    retryable = False
+
+    def __init__(self, message, status_code=None, code=None, safe_to_retry=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.safe_to_retry = safe_to_retry
+
+
+class RetryableError(GraphAPIError):
+    """Transient failure: timeouts, connection errors, 5xx"""
+    retryable = True
+
+
+class RateLimitedError(GraphAPIError):
+    """Throttled by Instagram; retry after retry_after seconds"""
+    retryable = True
+
+    def __init__(self, message, retry_after=60, **kwargs):
+        kwargs.setdefault('safe_to_retry', True)
+        super().__init__(message, **kwargs)
+        self.retry_after = retry_after
+
+
+class AuthExpiredError(GraphAPIError):
+    """Access token expired or revoked; the user has to reconnect"""
+
+
+class PermanentError(GraphAPIError):
+    """Request rejected (bad media, bad parameters); retrying won't help"""
+
+
+def classify_response(response):
+    """Build the right GraphAPIError for a failed httpx response"""
+    try:
+        error = response.json().get('error', {})
+    except ValueError:
+        error = {}
+    if not isinstance(error, dict):
+        error = {}
+    code = error.get('code')
+    message = error.get('message') or f"HTTP {response.status_code}"
+    kwargs = {'status_code': response.status_code, 'code': code}
+
+    if response.status_code == 429 or code in RATE_LIMIT_CODES:
+        try:
+            retry_after = float(response.headers.get('retry-after', 60))
+        except ValueError:
+            retry_after = 60
+        return RateLimitedError(message, retry_after=retry_after, **kwargs)
+    if response.status_code == 401 or code in AUTH_CODES:
+        return AuthExpiredError(message, **kwargs)
+    if response.status_code >= 500 or error.get('is_transient') or code in TRANSIENT_CODES:
+        return RetryableError(message, **kwargs)
+    return PermanentError(message, **kwargs)
+
+
+def classify_exception(exc):
+    """Map an httpx transport exception to a GraphAPIError"""
+    if isinstance(exc, GraphAPIError):
+        return exc
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        # The request never reached Instagram
+        return RetryableError(str(exc) or type(exc).__name__, safe_to_retry=True)
+    if isinstance(exc, httpx.TransportError):
+        return RetryableError(str(exc) or type(exc).__name__)
+    return PermanentError(str(exc))
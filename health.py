@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import Config
+
+
+class HealthMonitor:
+    """Dependency probes run in the background; endpoints read cached results.
+
+    Every probe is a callable that raises (or returns False) when its
+    dependency is unhealthy. Probes run concurrently every probe interval,
+    each bounded by the probe timeout, and only their last result is kept,
+    so /health and /ready never touch a dependency themselves no matter how
+    often they are polled. A result older than the stale threshold counts
+    as failed.
+    """
+
+    def __init__(self, interval=None, timeout=None, stale_after=None):
+        self.interval = interval or Config.HEALTH_PROBE_INTERVAL
+        self.timeout = timeout or Config.HEALTH_PROBE_TIMEOUT
+        self.stale_after = stale_after or Config.HEALTH_STALE_AFTER
+        self.started_at = time.time()
+        self._probes = {}
+        self._results = {}
+        self._running = {}
+        self._thread = None
+        self._stopped = threading.Event()
+        self._executor = None
+
+    def add_probe(self, name, probe, critical=True):
+        """Register a probe; only critical ones decide readiness"""
+        self._probes[name] = (probe, critical)
+
+    def _run_probe(self, probe):
+        started = time.perf_counter()
+        result = probe()
+        if result is False:
+            raise RuntimeError("probe reported unhealthy")
+        return time.perf_counter() - started
+
+    def check(self):
+        """Run every probe once and cache the results"""
+        futures = {}
+        for name, (probe, critical) in self._probes.items():
+            # A probe still hung from an earlier round isn't started again
+            future = self._running.get(name)
+            if future is None or future.done():
+                future = self._running[name] = self._executor.submit(self._run_probe, probe)
+            futures[name] = (future, critical)
+        for name, (future, critical) in futures.items():
+            started = time.perf_counter()
+            try:
+                latency = future.result(timeout=self.timeout)
+                result = {'ok': True, 'latency_ms': round(latency * 1000, 2), 'error': None}
+            except FutureTimeoutError:
+                result = {'ok': False, 'latency_ms': None, 'error': f"timed out after {self.timeout}s"}
+            except Exception as e:
+                latency = time.perf_counter() - started
+                result = {'ok': False, 'latency_ms': round(latency * 1000, 2), 'error': str(e) or type(e).__name__}
+            result.update(critical=critical, checked_at=time.time())
+            self._results[name] = result
+
+    def start(self):
+        """Probe in a daemon thread every probe interval"""
+        if self._thread is not None:
+            return
+        # Spare workers so a hung probe doesn't hold up the next round
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(len(self._probes), 1) * 2,
+            thread_name_prefix='health-probe'
+        )
+        self._thread = threading.Thread(target=self._loop, name='health-monitor', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Health check error: {e}")
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def snapshot(self):
+        """Cached probe results with staleness; returns (ready, payload)"""
+        now = time.time()
+        checks = {}
+        ready = True
+        for name, (_, critical) in self._probes.items():
+            result = self._results.get(name)
+            if result is None:
+                check = {'ok': False, 'latency_ms': None, 'error': 'not checked yet',
+                         'critical': critical, 'age_s': None}
+            else:
+                age = now - result['checked_at']
+                stale = age > self.stale_after
+                check = {
+                    'ok': result['ok'] and not stale,
+                    'latency_ms': result['latency_ms'],
+                    'error': 'stale result' if stale else result['error'],
+                    'critical': critical,
+                    'age_s': round(age, 2)
+                }
+            checks[name] = check
+            if critical and not check['ok']:
+                ready = False
+
+        if ready:
+            status = 'healthy' if all(check['ok'] for check in checks.values()) else 'degraded'
+        else:
+            status = 'unhealthy'
+        return ready, {
+            'status': status,
+            'checks': checks,
+            'uptime_s': round(now - self.started_at, 1),
+            'monitor_alive': self._thread is not None and self._thread.is_alive()
+        }
@@ -0,0 +1,167 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from config import Config
+
+
+# Longest wait between retries of a spooled batch
+SPOOL_MAX_DELAY = 60 * 60
+# A claim older than this was left by a process that died mid-retry
+SPOOL_CLAIM_TIMEOUT = 10 * 60
+
+
+class HistoryBuffer:
+    """Write-behind buffer that bulk-inserts post_history rows.
+
+    Rows are flushed when the batch is full or every flush interval, and on
+    shutdown. A batch that fails to insert is spooled to a JSON file named
+    after its next retry time and retried ahead of new rows on later
+    flushes, backing off after each failure. The spool directory may be
+    shared by every process on the host: a batch is claimed by renaming its
+    file before it is retried, so only one process inserts it. After
+    HISTORY_SPOOL_MAX_ATTEMPTS failures a batch is moved to failed/ and no
+    longer holds up the others.
+    """
+
+    def __init__(self, db, batch_size=None, flush_interval=None, spool_dir=None):
+        self.db = db
+        self.batch_size = batch_size or Config.HISTORY_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.HISTORY_FLUSH_INTERVAL
+        self.spool_dir = spool_dir or Config.HISTORY_SPOOL_DIR
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='history-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        """Queue a post_history row; never blocks on the database"""
+        self.start()
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert spooled batches, then everything currently buffered"""
+        with self._flush_lock:
+            self._retry_spooled()
+
+            while True:
+                with self._lock:
+                    batch = self._rows[:self.batch_size]
+                    del self._rows[:self.batch_size]
+                if not batch:
+                    return
+                try:
+                    self.db.add_post_history_batch(batch)
+                except Exception as e:
+                    print(f"Post history flush error: {e}")
+                    self._spool(batch)
+
+    def _spool(self, batch, attempts=0, retry_at=None, source=None):
+        """Write a batch to the spool (atomically, from source if given)"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        retry_at = time.time() if retry_at is None else retry_at
+        path = os.path.join(self.spool_dir, f"{retry_at:.6f}-{uuid.uuid4().hex[:8]}.json")
+        # Written under a name the retry glob doesn't match, then renamed into place
+        temp = source or f"{path}.tmp"
+        with open(temp, 'w') as f:
+            json.dump({'attempts': attempts, 'rows': batch}, f)
+        os.replace(temp, path)
+
+    def _claim(self, path):
+        """Take a spooled batch by renaming it; None if another process got it first"""
+        claimed = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.claimed"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        # The claim's age is measured from now, not from when it was spooled
+        os.utime(claimed)
+        return claimed
+
+    def _recover_stale_claims(self):
+        for claimed in glob.glob(os.path.join(self.spool_dir, '*.json.*.claimed')):
+            try:
+                if os.path.getmtime(claimed) < time.time() - SPOOL_CLAIM_TIMEOUT:
+                    os.rename(claimed, claimed.split('.json.')[0] + '.json')
+            except FileNotFoundError:
+                pass
+
+    def _quarantine(self, claimed):
+        failed_dir = os.path.join(self.spool_dir, 'failed')
+        os.makedirs(failed_dir, exist_ok=True)
+        os.replace(claimed, os.path.join(failed_dir, os.path.basename(claimed).split('.json.')[0] + '.json'))
+
+    def _retry_spooled(self):
+        """Insert spooled batches whose retry time has come"""
+        self._recover_stale_claims()
+        now = time.time()
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, '*.json'))):
+            try:
+                if float(os.path.basename(path).split('-')[0]) > now:
+                    break
+            except ValueError:
+                pass
+            claimed = self._claim(path)
+            if claimed is None:
+                continue
+
+            try:
+                with open(claimed) as f:
+                    spooled = json.load(f)
+            except ValueError as e:
+                print(f"Post history spool unreadable ({os.path.basename(path)}): {e}")
+                self._quarantine(claimed)
+                continue
+            if isinstance(spooled, list):
+                # Spooled before attempts were recorded
+                spooled = {'attempts': 0, 'rows': spooled}
+
+            try:
+                self.db.add_post_history_batch(spooled['rows'])
+            except Exception as e:
+                attempts = spooled['attempts'] + 1
+                print(f"Post history retry error ({os.path.basename(path)}, attempt {attempts}): {e}")
+                if attempts >= Config.HISTORY_SPOOL_MAX_ATTEMPTS:
+                    print(f"Giving up on post history batch {os.path.basename(path)}")
+                    self._quarantine(claimed)
+                else:
+                    delay = min(self.flush_interval * 2 ** attempts, SPOOL_MAX_DELAY)
+                    self._spool(spooled['rows'], attempts, now + delay, source=claimed)
+                continue
+            os.unlink(claimed)
+
+    def pending(self):
+        """Number of buffered rows not yet flushed"""
+        with self._lock:
+            return len(self._rows)
+
+    def close(self):
+        """Stop the flush thread and write out remaining rows"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
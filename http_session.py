@@ -0,0 +1,110 @@
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+from metrics import HTTP_CALL_SECONDS
+
+
+class GraphSession:
+    """Pooled keep-alive session for Instagram Graph calls.
+
+    One requests.Session is shared by every InstagramClient so TLS
+    connections to graph.instagram.com are reused across calls and threads.
+    """
+
+    def __init__(self, pool_size=None, timeout=None):
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.timeout = timeout or Config.HTTP_TIMEOUT
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def request(self, method, url, name=None, **kwargs):
+        """Send a request and record its latency in the metrics registry under name"""
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self._session.request(method, url, **kwargs)
+            ok = response.ok
+            return response
+        finally:
+            HTTP_CALL_SECONDS.observe(
+                time.perf_counter() - started,
+                call=name or method,
+                result='ok' if ok else 'error'
+            )
+
+    def get(self, url, name=None, **kwargs):
+        return self.request('GET', url, name=name, **kwargs)
+
+    def post(self, url, name=None, **kwargs):
+        return self.request('POST', url, name=name, **kwargs)
+
+    def close(self):
+        self._session.close()
+
+
+class AsyncGraphSession:
+    """Asyncio counterpart of GraphSession with the same API"""
+
+    def __init__(self, pool_size=None, timeout=None):
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.timeout = timeout or Config.HTTP_TIMEOUT
+        self._client = None
+
+    def _get_client(self):
+        # Created lazily so the client binds to the loop that uses it
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._client
+
+    async def request(self, method, url, name=None, **kwargs):
+        """Send a request and record its latency in the metrics registry under name"""
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await self._get_client().request(method, url, **kwargs)
+            ok = response.is_success
+            return response
+        finally:
+            HTTP_CALL_SECONDS.observe(
+                time.perf_counter() - started,
+                call=name or method,
+                result='ok' if ok else 'error'
+            )
+
+    async def get(self, url, name=None, **kwargs):
+        return await self.request('GET', url, name=name, **kwargs)
+
+    async def post(self, url, name=None, **kwargs):
+        return await self.request('POST', url, name=name, **kwargs)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_shared_session = None
+_shared_lock = threading.Lock()
+
+
+def get_session():
+    """Get the process-wide GraphSession"""
+    global _shared_session
+    if _shared_session is None:
+        with _shared_lock:
+            if _shared_session is None:
+                _shared_session = GraphSession()
+    return _shared_session
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+import httpx
+from config import Config
+from metrics import STAGE_SECONDS
+
+
+class IngestedMedia:
+    def __init__(self, media_id, path, sha256, size):
+        self.media_id = media_id
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+
+class VideoIngest:
+    """Streams Telegram videos straight into the media store.
+
+    Downloads start as soon as a video arrives (prefetch) and run in the
+    background while the user writes a caption. Bytes are written in
+    fixed-size chunks while a SHA-256 of the content is computed on the fly,
+    and the finished file is renamed into place under a fresh media id.
+    With a MediaCache, clips already on disk are reused without downloading.
+    File writes, hashing and cache index calls run in worker threads so a
+    100 MB clip never stalls the event loop.
+    """
+
+    def __init__(self, media_store, media_cache=None, chunk_size=None, timeout=None):
+        self.media_store = media_store
+        self.media_cache = media_cache
+        self.chunk_size = chunk_size or Config.INGEST_CHUNK_SIZE
+        self.timeout = timeout or Config.HTTP_TIMEOUT
+        self._client = None
+        self._pending = {}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True)
+        return self._client
+
+    def prefetch(self, user_id, bot, session):
+        """Start downloading a user's video in the background"""
+        self.discard(user_id)
+        task = asyncio.get_running_loop().create_task(self._download(bot, session))
+        self._pending[user_id] = (task, time.monotonic())
+        return task
+
+    async def fetch(self, user_id, bot, session):
+        """Get the ingested media for a user, waiting on a prefetch if one is running"""
+        task, _ = self._pending.pop(user_id, (None, None))
+        if task is None:
+            # Prefetched by another process, or not at all
+            return await self._download(bot, session)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return await self._download(bot, session)
+
+    def discard(self, user_id):
+        """Cancel a pending download and remove anything it stored"""
+        task, _ = self._pending.pop(user_id, (None, None))
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            # Releasing may evict (unlink) files; keep it off the loop
+            asyncio.get_running_loop().run_in_executor(None, self.release, task.result())
+
+    def discard_stale(self, max_age):
+        """Drop prefetches older than max_age, e.g. of sessions that expired; returns how many"""
+        cutoff = time.monotonic() - max_age
+        stale = [user_id for user_id, (_, started) in self._pending.items() if started < cutoff]
+        for user_id in stale:
+            self.discard(user_id)
+        return len(stale)
+
+    def release(self, media):
+        """Give up an ingested file that won't be published"""
+        if self.media_cache is not None:
+            self.media_cache.release(media.media_id)
+        else:
+            self.media_store.remove(media.media_id)
+
+    def replace(self, media, media_id, sha256, size):
+        """Swap an ingested file for one derived from it (e.g. a transcode) stored under media_id.
+
+        The derived file is new content, so it gets its own cache entry and
+        takes over this ingest's reference; the original keeps its entry.
+        """
+        if self.media_cache is not None:
+            media_id = self.media_cache.add(media_id, sha256, size)
+        self.release(media)
+        return IngestedMedia(media_id, self.media_store.path_for(media_id), sha256, size)
+
+    @staticmethod
+    def _write_chunk(out, digest, chunk):
+        digest.update(chunk)
+        out.write(chunk)
+
+    def _copy_local(self, src_path, part_path, digest):
+        """Copy a file already on disk (local Bot API server); returns its size"""
+        size = 0
+        with open(src_path, 'rb') as src, open(part_path, 'wb') as out:
+            while chunk := src.read(self.chunk_size):
+                self._write_chunk(out, digest, chunk)
+                size += len(chunk)
+        return size
+
+    @staticmethod
+    def _remove_part(part_path):
+        try:
+            os.unlink(part_path)
+        except FileNotFoundError:
+            pass
+
+    async def _download(self, bot, session):
+        """Stream a Telegram file into the media store"""
+        file_unique_id = session.file_unique_id
+        if self.media_cache is not None:
+            cached = await asyncio.to_thread(self.media_cache.lookup, file_unique_id)
+            if cached is not None:
+                media_id, sha256, size = cached
+                return IngestedMedia(media_id, self.media_store.path_for(media_id), sha256, size)
+
+        media_id = uuid.uuid4().hex
+        path = self.media_store.path_for(media_id)
+        part_path = f"{path}.part"
+        digest = hashlib.sha256()
+        size = 0
+
+        started = time.perf_counter()
+        telegram_file = await bot.get_file(session.file_id)
+        try:
+            if os.path.isabs(telegram_file.file_path) and os.path.exists(telegram_file.file_path):
+                size = await asyncio.to_thread(self._copy_local, telegram_file.file_path, part_path, digest)
+            else:
+                out = await asyncio.to_thread(open, part_path, 'wb')
+                try:
+                    async with self._get_client().stream('GET', telegram_file.file_path) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(self.chunk_size):
+                            await asyncio.to_thread(self._write_chunk, out, digest, chunk)
+                            size += len(chunk)
+                finally:
+                    await asyncio.to_thread(out.close)
+            await asyncio.to_thread(os.replace, part_path, path)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='telegram_download')
+        except BaseException:
+            # Also on cancellation, so done synchronously
+            self._remove_part(part_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        if self.media_cache is not None:
+            # Identical content may already be cached under another media id
+            media_id = await asyncio.to_thread(self.media_cache.add, media_id, sha256, size, file_unique_id)
+            path = self.media_store.path_for(media_id)
+        return IngestedMedia(media_id, path, sha256, size)
+
+    async def close(self):
+        for user_id in list(self._pending):
+            self.discard(user_id)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,13 +1,18 @@
+import httpx
 import requests
 import secrets
-import time
 from config import Config
+from http_session import AsyncGraphSession, get_session
+from rate_limiter import RateLimiter
+from errors import classify_exception, classify_response
+from metrics import GRAPH_CALLS
 
 class InstagramClient:
-    def __init__(self):
+    def __init__(self, session=None):
         self.app_id = Config.INSTAGRAM_APP_ID
         self.app_secret = Config.INSTAGRAM_APP_SECRET
         self.redirect_uri = Config.REDIRECT_URI
+        self.session = session or get_session()
     
     def generate_auth_url(self, state):
         """Generate Instagram OAuth URL"""
@@ -33,13 +38,44 @@ class InstagramClient:
         }
         
         try:
-            response = requests.post(Config.INSTAGRAM_TOKEN_URL, data=data)
+            response = self.session.post(Config.INSTAGRAM_TOKEN_URL, name='exchange_code_for_token', data=data)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"Token exchange error: {e}")
             return None
     
+    def exchange_long_lived_token(self, access_token):
+        """Exchange a short-lived token for a 60-day one"""
+        params = {
+            'grant_type': 'ig_exchange_token',
+            'client_secret': self.app_secret,
+            'access_token': access_token
+        }
+        
+        try:
+            response = self.session.get(Config.INSTAGRAM_LONG_LIVED_TOKEN_URL, name='exchange_long_lived_token', params=params)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            print(f"Long-lived token exchange error: {e}")
+            return None
+    
+    def refresh_access_token(self, access_token):
+        """Refresh a long-lived token for another 60 days"""
+        params = {
+            'grant_type': 'ig_refresh_token',
+            'access_token': access_token
+        }
+        
+        try:
+            response = self.session.get(Config.INSTAGRAM_REFRESH_TOKEN_URL, name='refresh_access_token', params=params)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            print(f"Token refresh error: {e}")
+            return None
+    
     def get_user_info(self, access_token):
         """Get Instagram user profile information"""
         url = f"{Config.INSTAGRAM_GRAPH_URL}/me"
@@ -49,14 +85,50 @@ class InstagramClient:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self.session.get(url, name='get_user_info', params=params)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"User info error: {e}")
             return None
-    
-    def create_media_container(self, access_token, video_url, caption):
+
+
+class AsyncInstagramClient:
+    """Asyncio Graph API client for the publish pipeline.
+
+    Publishing only happens here (InstagramClient keeps the OAuth and
+    profile calls). Calls never block the event loop, so many
+    containers can be processing at once while Telegram updates keep flowing.
+    Failures raise a classified GraphAPIError (see errors.py) instead of
+    returning None, so callers can decide whether a retry is safe.
+    """
+
+    def __init__(self, session=None, rate_limiter=None):
+        self.session = session or AsyncGraphSession()
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+    async def close(self):
+        """Close the underlying HTTP session"""
+        await self.session.close()
+
+    async def _request(self, method, url, access_token, name, publish=False, **kwargs):
+        """Send a Graph call once the rate limiter allows it; returns the JSON body"""
+        await self.rate_limiter.acquire(access_token, publish=publish)
+        try:
+            response = await self.session.request(method, url, name=name, **kwargs)
+        except httpx.HTTPError as e:
+            error = classify_exception(e)
+            GRAPH_CALLS.inc(call=name, result=type(error).__name__)
+            raise error from e
+        self.rate_limiter.observe(access_token, response.status_code, response.headers)
+        if not response.is_success:
+            error = classify_response(response)
+            GRAPH_CALLS.inc(call=name, result=type(error).__name__)
+            raise error
+        GRAPH_CALLS.inc(call=name, result='ok')
+        return response.json()
+
+    async def create_media_container(self, access_token, video_url, caption, cover_url=None):
         """Create media container for reel"""
         url = f"{Config.INSTAGRAM_GRAPH_URL}/me/media"
         
@@ -66,16 +138,12 @@ class InstagramClient:
             'caption': caption,
             'access_token': access_token
         }
+        if cover_url:
+            data['cover_url'] = cover_url
         
-        try:
-            response = requests.post(url, data=data)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Media container creation error: {e}")
-            return None
-    
-    def publish_media(self, access_token, creation_id):
+        return await self._request('POST', url, access_token, 'create_media_container', data=data)
+
+    async def publish_media(self, access_token, creation_id):
         """Publish the media container"""
         url = f"{Config.INSTAGRAM_GRAPH_URL}/me/media_publish"
         
@@ -84,56 +152,27 @@ class InstagramClient:
             'access_token': access_token
         }
         
-        try:
-            response = requests.post(url, data=data)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"Media publish error: {e}")
-            return None
-    
-    def check_media_status(self, access_token, container_id):
-        """Check if media container is ready for publishing"""
+        return await self._request('POST', url, access_token, 'publish_media', publish=True, data=data)
+
+    async def get_media_status(self, access_token, container_id):
+        """Get the processing status code of a media container"""
         url = f"{Config.INSTAGRAM_GRAPH_URL}/{container_id}"
         params = {
             'fields': 'status_code',
             'access_token': access_token
         }
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            result = response.json()
-            return result.get('status_code') == 'FINISHED'
-        except requests.RequestException as e:
-            print(f"Media status check error: {e}")
-            return False
-    
-    def post_reel(self, access_token, video_url, caption):
-        """Complete reel posting workflow"""
-        # Create media container
-        container_result = self.create_media_container(access_token, video_url, caption)
-        if not container_result or 'id' not in container_result:
-            return {'success': False, 'error': 'Failed to create media container'}
-        
-        container_id = container_result['id']
-        
-        # Wait for processing (Instagram needs time to process video)
-        max_attempts = 30
-        for attempt in range(max_attempts):
-            if self.check_media_status(access_token, container_id):
-                break
-            time.sleep(10)  # Wait 10 seconds between checks
-        else:
-            return {'success': False, 'error': 'Media processing timeout'}
-        
-        # Publish media
-        publish_result = self.publish_media(access_token, container_id)
-        if not publish_result or 'id' not in publish_result:
-            return {'success': False, 'error': 'Failed to publish media'}
+        result = await self._request('GET', url, access_token, 'check_media_status', params=params)
+        return result.get('status_code')
+
+    async def get_recent_media(self, access_token, limit=10):
+        """Get the account's most recently published media, newest first"""
+        url = f"{Config.INSTAGRAM_GRAPH_URL}/me/media"
+        params = {
+            'fields': 'id,caption,timestamp',
+            'limit': limit,
+            'access_token': access_token
+        }
         
-        return {
-            'success': True, 
-            'media_id': publish_result['id'],
-            'message': 'Reel posted successfully!'
-          }
+        result = await self._request('GET', url, access_token, 'get_recent_media', params=params)
+        return result.get('data') or []
@@ -0,0 +1,459 @@
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from config import Config
+
+# Job states
+QUEUED = 'queued'
+CONTAINER_CREATED = 'container_created'
+PROCESSING = 'processing'
+PUBLISHED = 'published'
+FAILED = 'failed'
+
+ACTIVE_STATES = (QUEUED, CONTAINER_CREATED, PROCESSING)
+
+
+class LeaseLostError(Exception):
+    """The job's lease expired and another worker may own it now"""
+
+JOB_FIELDS = (
+    'id', 'telegram_user_id', 'chat_id', 'message_id', 'instagram_username',
+    'access_token', 'video_url', 'video_path', 'caption', 'status',
+    'container_id', 'media_id', 'error_message', 'attempts',
+    'lease_owner', 'lease_expires_at', 'created_at', 'updated_at',
+    'duration', 'size', 'cover_url', 'scheduled_at'
+)
+
+
+class PublishJob:
+    def __init__(self, telegram_user_id, access_token, video_url, caption,
+                 video_path=None, chat_id=None, message_id=None, instagram_username=None,
+                 id=None, status=QUEUED, container_id=None, media_id=None,
+                 error_message=None, attempts=0, lease_owner=None,
+                 lease_expires_at=None, created_at=None, updated_at=None,
+                 duration=None, size=None, cover_url=None, scheduled_at=None):
+        self.id = id
+        self.telegram_user_id = telegram_user_id
+        self.access_token = access_token
+        self.video_url = video_url
+        self.caption = caption
+        self.video_path = video_path
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.instagram_username = instagram_username
+        self.status = status
+        self.container_id = container_id
+        self.media_id = media_id
+        self.error_message = error_message
+        self.attempts = attempts
+        self.lease_owner = lease_owner
+        self.lease_expires_at = lease_expires_at
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.duration = duration
+        self.size = size
+        self.cover_url = cover_url
+        # Not claimable before this time (epoch seconds); None runs immediately
+        self.scheduled_at = scheduled_at
+        self.result = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**dict(zip(JOB_FIELDS, row)))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in JOB_FIELDS})
+
+
+class BaseJobQueue:
+    """State transitions shared by the queue backends.
+
+    Transitions made by a worker pass its worker_id and only apply while it
+    still holds the lease; otherwise LeaseLostError is raised, so a worker
+    whose lease expired can't overwrite the progress of the one that took
+    the job over.
+    """
+
+    lease_seconds = None
+
+    def update(self, job_id, worker_id=None, **fields):
+        raise NotImplementedError
+
+    def _transition(self, job_id, worker_id, **fields):
+        if not self.update(job_id, worker_id, **fields) and worker_id is not None:
+            raise LeaseLostError(f"Lost lease on publish job {job_id}")
+
+    def mark_container_created(self, job_id, container_id, worker_id=None):
+        self._transition(job_id, worker_id, status=CONTAINER_CREATED, container_id=container_id)
+
+    def mark_processing(self, job_id, worker_id=None):
+        self._transition(job_id, worker_id, status=PROCESSING)
+
+    def mark_published(self, job_id, media_id, worker_id=None):
+        self._transition(job_id, worker_id, status=PUBLISHED, media_id=media_id,
+                         lease_owner=None, lease_expires_at=None)
+
+    def mark_failed(self, job_id, error_message, worker_id=None):
+        self._transition(job_id, worker_id, status=FAILED, error_message=error_message,
+                         lease_owner=None, lease_expires_at=None)
+
+    def release(self, job_id):
+        """Drop a lease so another worker can pick the job up immediately"""
+        self.update(job_id, lease_owner=None, lease_expires_at=None)
+
+    def defer(self, job_id, until, worker_id=None):
+        """Drop a lease and keep the job unclaimable until an epoch time"""
+        self._transition(job_id, worker_id, scheduled_at=until, lease_owner=None, lease_expires_at=None)
+
+
+class JobQueue(BaseJobQueue):
+    """Persistent publish job queue backed by a local SQLite database.
+
+    Mirrors the publish_jobs table in create_tables.sql. Workers claim jobs
+    under a lease that they renew with heartbeats; a job whose lease expires
+    (e.g. the process died) becomes claimable again and resumes from the
+    last recorded state, so an existing container is polled rather than
+    created a second time. Jobs with a scheduled_at stay queued until that
+    time, which makes the queue the persistent scheduler for timed posts.
+    """
+
+    def __init__(self, path=None, lease_seconds=None):
+        self.path = path or Config.JOB_QUEUE_PATH
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self.setup_tables()
+
+    def setup_tables(self):
+        """Create the jobs table if it doesn't exist"""
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS publish_jobs (
+                    id TEXT PRIMARY KEY,
+                    telegram_user_id INTEGER NOT NULL,
+                    chat_id INTEGER,
+                    message_id INTEGER,
+                    instagram_username TEXT,
+                    access_token TEXT NOT NULL,
+                    video_url TEXT NOT NULL,
+                    video_path TEXT,
+                    caption TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    container_id TEXT,
+                    media_id TEXT,
+                    error_message TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    duration REAL,
+                    size INTEGER,
+                    cover_url TEXT,
+                    scheduled_at REAL
+                )
+            """)
+            # Columns added after the table was first created
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(publish_jobs)")}
+            added = (('duration', 'REAL'), ('size', 'INTEGER'), ('cover_url', 'TEXT'), ('scheduled_at', 'REAL'))
+            for name, column_type in added:
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE publish_jobs ADD COLUMN {name} {column_type}")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS publish_jobs_status_idx "
+                "ON publish_jobs (status, lease_expires_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS publish_jobs_scheduled_at_idx "
+                "ON publish_jobs (scheduled_at) WHERE status = 'queued'"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS publish_jobs_published_idx "
+                "ON publish_jobs (instagram_username, updated_at) WHERE status = 'published'"
+            )
+
+    def enqueue(self, job):
+        """Persist a new job and return its id"""
+        now = time.time()
+        job.id = job.id or uuid.uuid4().hex
+        job.status = QUEUED
+        job.created_at = job.updated_at = now
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO publish_jobs ({', '.join(JOB_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                [getattr(job, field) for field in JOB_FIELDS]
+            )
+        return job.id
+
+    def claim(self, worker_id):
+        """Lease the oldest runnable job that is due to a worker, or return None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(JOB_FIELDS)} FROM publish_jobs "
+                    f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATES)}) "
+                    "AND (lease_expires_at IS NULL OR lease_expires_at < ?) "
+                    "AND (scheduled_at IS NULL OR scheduled_at <= ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (*ACTIVE_STATES, now, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+
+                job = PublishJob.from_row(row)
+                job.lease_owner = worker_id
+                job.lease_expires_at = now + self.lease_seconds
+                job.attempts += 1
+                self._conn.execute(
+                    "UPDATE publish_jobs SET lease_owner = ?, lease_expires_at = ?, "
+                    "attempts = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, job.lease_expires_at, job.attempts, now, job.id)
+                )
+                self._conn.execute('COMMIT')
+                return job
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend a lease; returns False if the worker no longer owns the job"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE publish_jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (now + self.lease_seconds, now, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def update(self, job_id, worker_id=None, **fields):
+        """Update job columns, if given only while worker_id holds the lease; True if a row changed"""
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        query = f"UPDATE publish_jobs SET {assignments} WHERE id = ?"
+        params = (*fields.values(), job_id)
+        if worker_id is not None:
+            query += " AND lease_owner = ?"
+            params += (worker_id,)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        return cursor.rowcount == 1
+
+    def release_owned_by(self, worker_prefix):
+        """Release leases held by workers of a process that is shutting down"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE publish_jobs SET lease_owner = NULL, lease_expires_at = NULL "
+                "WHERE lease_owner LIKE ?",
+                (f"{worker_prefix}%",)
+            )
+
+    def get(self, job_id):
+        """Get job by id"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM publish_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return PublishJob.from_row(row) if row else None
+
+    def depth(self):
+        """Number of jobs that are not yet published or failed"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM publish_jobs "
+                f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATES)})",
+                ACTIVE_STATES
+            ).fetchone()
+        return row[0]
+
+    def active(self, job_ids):
+        """The subset of job_ids that are not yet published or failed"""
+        if not job_ids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM publish_jobs WHERE id IN ({', '.join('?' for _ in job_ids)}) "
+                f"AND status IN ({', '.join('?' for _ in ACTIVE_STATES)})",
+                (*job_ids, *ACTIVE_STATES)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def published_since(self, instagram_username, since):
+        """Number of jobs published to an account since an epoch time"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM publish_jobs "
+                "WHERE status = ? AND instagram_username = ? AND updated_at >= ?",
+                (PUBLISHED, instagram_username, since)
+            ).fetchone()
+        return row[0]
+
+    def stalled(self, older_than):
+        """Number of due jobs no worker has touched for older_than seconds"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM publish_jobs "
+                f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATES)}) "
+                "AND updated_at < ? AND (scheduled_at IS NULL OR scheduled_at < ?)",
+                (*ACTIVE_STATES, cutoff, cutoff)
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class SupabaseJobQueue(BaseJobQueue):
+    """Publish job queue on the shared publish_jobs table.
+
+    Lets ingress and publish-worker processes on different hosts share one
+    queue. Jobs are claimed through the claim_publish_job function in
+    create_tables.sql, which uses FOR UPDATE SKIP LOCKED so concurrent
+    workers never lease the same job.
+    """
+
+    def __init__(self, supabase, lease_seconds=None):
+        self.supabase = supabase
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+
+    @staticmethod
+    def _now(offset=0):
+        return datetime.fromtimestamp(time.time() + offset, timezone.utc).isoformat()
+
+    @staticmethod
+    def _timestamp(value):
+        return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+    def enqueue(self, job):
+        """Persist a new job and return its id"""
+        job.id = job.id or uuid.uuid4().hex
+        job.status = QUEUED
+        data = {field: getattr(job, field) for field in JOB_FIELDS}
+        for field in ('lease_owner', 'lease_expires_at', 'created_at', 'updated_at'):
+            data.pop(field)
+        data['scheduled_at'] = self._timestamp(job.scheduled_at)
+        self.supabase.table('publish_jobs').insert(data).execute()
+        return job.id
+
+    def claim(self, worker_id):
+        """Lease the oldest runnable job that is due to a worker, or return None"""
+        response = self.supabase.rpc('claim_publish_job', {
+            'p_worker_id': worker_id,
+            'p_lease_seconds': self.lease_seconds
+        }).execute()
+        return PublishJob.from_dict(response.data[0]) if response.data else None
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend a lease; returns False if the worker no longer owns the job"""
+        response = (
+            self.supabase.table('publish_jobs')
+            .update({'lease_expires_at': self._now(self.lease_seconds), 'updated_at': self._now()})
+            .eq('id', job_id)
+            .eq('lease_owner', worker_id)
+            .execute()
+        )
+        return bool(response.data)
+
+    def update(self, job_id, worker_id=None, **fields):
+        """Update job columns, if given only while worker_id holds the lease; True if a row changed"""
+        fields['updated_at'] = self._now()
+        query = self.supabase.table('publish_jobs').update(fields).eq('id', job_id)
+        if worker_id is not None:
+            query = query.eq('lease_owner', worker_id)
+        return bool(query.execute().data)
+
+    def defer(self, job_id, until, worker_id=None):
+        """Drop a lease and keep the job unclaimable until an epoch time"""
+        self._transition(job_id, worker_id, scheduled_at=self._timestamp(until),
+                         lease_owner=None, lease_expires_at=None)
+
+    def release_owned_by(self, worker_prefix):
+        """Release leases held by workers of a process that is shutting down"""
+        (
+            self.supabase.table('publish_jobs')
+            .update({'lease_owner': None, 'lease_expires_at': None})
+            .like('lease_owner', f"{worker_prefix}%")
+            .execute()
+        )
+
+    def get(self, job_id):
+        """Get job by id"""
+        response = self.supabase.table('publish_jobs').select('*').eq('id', job_id).execute()
+        return PublishJob.from_dict(response.data[0]) if response.data else None
+
+    def depth(self):
+        """Number of jobs that are not yet published or failed"""
+        response = (
+            self.supabase.table('publish_jobs')
+            .select('id', count='exact')
+            .in_('status', list(ACTIVE_STATES))
+            .limit(1)
+            .execute()
+        )
+        return response.count or 0
+
+    def active(self, job_ids):
+        """The subset of job_ids that are not yet published or failed"""
+        if not job_ids:
+            return set()
+        response = (
+            self.supabase.table('publish_jobs')
+            .select('id')
+            .in_('id', list(job_ids))
+            .in_('status', list(ACTIVE_STATES))
+            .execute()
+        )
+        return {row['id'] for row in response.data or []}
+
+    def published_since(self, instagram_username, since):
+        """Number of jobs published to an account since an epoch time"""
+        response = (
+            self.supabase.table('publish_jobs')
+            .select('id', count='exact')
+            .eq('status', PUBLISHED)
+            .eq('instagram_username', instagram_username)
+            .gte('updated_at', self._timestamp(since))
+            .limit(1)
+            .execute()
+        )
+        return response.count or 0
+
+    def stalled(self, older_than):
+        """Number of due jobs no worker has touched for older_than seconds"""
+        cutoff = self._now(-older_than)
+        response = (
+            self.supabase.table('publish_jobs')
+            .select('id', count='exact')
+            .in_('status', list(ACTIVE_STATES))
+            .lt('updated_at', cutoff)
+            .or_(f"scheduled_at.is.null,scheduled_at.lt.{cutoff}")
+            .limit(1)
+            .execute()
+        )
+        return response.count or 0
+
+    def close(self):
+        pass
+
+
+def create_job_queue(supabase=None):
+    """Build the queue backend selected by JOB_QUEUE_BACKEND.
+
+    The Supabase backend reuses the database's client (see components.py)
+    rather than opening a second connection pool.
+    """
+    if Config.JOB_QUEUE_BACKEND == 'supabase':
+        if supabase is None:
+            raise ValueError("JOB_QUEUE_BACKEND=supabase needs the database's Supabase client")
+        return SupabaseJobQueue(supabase)
+    return JobQueue()
@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+from config import Config
+
+
+class MediaCache:
+    """Content-addressed index over the media store.
+
+    Videos are keyed by Telegram's file_unique_id and by the SHA-256 of
+    their content, so a resent clip or a retry after a failed post reuses
+    the file already on disk (and its hosting URL) instead of downloading
+    it again. Entries are reference counted while a job or pending post
+    uses them; unreferenced entries are evicted least-recently-used first
+    once the store exceeds MEDIA_CACHE_MAX_BYTES.
+
+    Publish jobs hold their reference by job id (media_refs), on the host
+    that ingested the file. A publisher on another host can't release it, so
+    reap() periodically checks the shared queue and drops the references of
+    jobs that were published, failed or never enqueued. release_job() is
+    idempotent, so a publisher on the same host may release early.
+    """
+
+    def __init__(self, media_store, path=None, max_bytes=None):
+        self.media_store = media_store
+        self.path = path or Config.MEDIA_CACHE_PATH
+        self.max_bytes = max_bytes or Config.MEDIA_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.setup_tables()
+
+    def setup_tables(self):
+        """Create the cache index if it doesn't exist"""
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_cache (
+                    media_id TEXT PRIMARY KEY,
+                    sha256 TEXT UNIQUE NOT NULL,
+                    file_unique_id TEXT,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS media_cache_file_unique_id_idx "
+                "ON media_cache (file_unique_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS media_cache_lru_idx "
+                "ON media_cache (refcount, last_used)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_refs (
+                    job_id TEXT PRIMARY KEY,
+                    media_id TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS media_refs_created_at_idx ON media_refs (created_at)"
+            )
+
+    def lookup(self, file_unique_id):
+        """Acquire a cached entry by Telegram file_unique_id; returns (media_id, sha256, size) or None"""
+        if not file_unique_id:
+            return None
+        with self._lock:
+            # One transaction, so another process can't evict the entry
+            # between the check and taking the reference
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT media_id, sha256, size FROM media_cache WHERE file_unique_id = ?",
+                    (file_unique_id,)
+                ).fetchone()
+                if row is not None and not self.media_store.exists(row[0]):
+                    self._conn.execute("DELETE FROM media_cache WHERE media_id = ?", (row[0],))
+                    row = None
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE media_cache SET refcount = refcount + 1, last_used = ? WHERE media_id = ?",
+                        (time.time(), row[0])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return row
+
+    def add(self, media_id, sha256, size, file_unique_id=None):
+        """Register a freshly stored file and acquire it.
+
+        If identical content is already cached, the new file is deleted and
+        the existing media id is returned instead.
+        """
+        now = time.time()
+        with self._lock:
+            # One transaction, so two processes adding the same content
+            # can't both miss the other's row and replace it
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT media_id FROM media_cache WHERE sha256 = ?", (sha256,)
+                ).fetchone()
+                if row is not None and self.media_store.exists(row[0]):
+                    if row[0] != media_id:
+                        self.media_store.remove(media_id)
+                    self._conn.execute(
+                        "UPDATE media_cache SET refcount = refcount + 1, last_used = ?, "
+                        "file_unique_id = COALESCE(?, file_unique_id) WHERE media_id = ?",
+                        (now, file_unique_id, row[0])
+                    )
+                    self._conn.execute('COMMIT')
+                    return row[0]
+
+                self._conn.execute("DELETE FROM media_cache WHERE sha256 = ?", (sha256,))
+                self._conn.execute(
+                    "INSERT INTO media_cache (media_id, sha256, file_unique_id, size, refcount, last_used) "
+                    "VALUES (?, ?, ?, ?, 1, ?)",
+                    (media_id, sha256, file_unique_id, size, now)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        self.evict()
+        return media_id
+
+    def hold(self, media_id, job_ids):
+        """Take one reference per publish job, released by release_job() or reap()"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    "INSERT INTO media_refs (job_id, media_id, created_at) VALUES (?, ?, ?)",
+                    [(job_id, media_id, now) for job_id in job_ids]
+                )
+                self._conn.execute(
+                    "UPDATE media_cache SET refcount = refcount + ?, last_used = ? WHERE media_id = ?",
+                    (len(job_ids), now, media_id)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def release_job(self, job_id):
+        """Drop a job's reference; returns False if it holds none (already released)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT media_id FROM media_refs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM media_refs WHERE job_id = ?", (job_id,))
+                    self._conn.execute(
+                        "UPDATE media_cache SET refcount = MAX(refcount - 1, 0), last_used = ? "
+                        "WHERE media_id = ?",
+                        (time.time(), row[0])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        if row is not None:
+            self.evict()
+        return row is not None
+
+    def reap(self, queue, grace=60, batch_size=200):
+        """Release references of jobs that are no longer active in the queue.
+
+        References younger than grace seconds are left alone, since their
+        job may not have been enqueued yet. Returns the number released.
+        """
+        with self._lock:
+            job_ids = [row[0] for row in self._conn.execute(
+                "SELECT job_id FROM media_refs WHERE created_at < ? ORDER BY created_at",
+                (time.time() - grace,)
+            )]
+        released = 0
+        for start in range(0, len(job_ids), batch_size):
+            batch = job_ids[start:start + batch_size]
+            active = queue.active(batch)
+            for job_id in batch:
+                if job_id not in active and self.release_job(job_id):
+                    released += 1
+        return released
+
+    def release(self, media_id):
+        """Drop a reference; the file stays cached until evicted"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE media_cache SET refcount = MAX(refcount - 1, 0), last_used = ? "
+                "WHERE media_id = ?",
+                (time.time(), media_id)
+            )
+        self.evict()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_cache").fetchone()[0]
+
+    def evict(self):
+        """Delete unreferenced files, oldest first, until under the size budget"""
+        evicted = 0
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            candidates = self._conn.execute(
+                "SELECT media_id, size FROM media_cache WHERE refcount = 0 ORDER BY last_used"
+            ).fetchall()
+            for media_id, size in candidates:
+                if total <= self.max_bytes:
+                    break
+                self.media_store.remove(media_id)
+                self._conn.execute("DELETE FROM media_cache WHERE media_id = ?", (media_id,))
+                total -= size
+                evicted += 1
+        return evicted
+
+    def close(self):
+        self._conn.close()
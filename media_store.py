@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import os
+import re
+import time
+from urllib.parse import urlencode
+from config import Config
+
+MEDIA_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class MediaStore:
+    """Local directory of videos served to Instagram's fetcher.
+
+    Files are addressed by a random media id assigned at ingest, and one
+    file can be shared by several jobs and accounts (deduplicated through
+    MediaCache). URLs handed to Instagram are signed with SECRET_KEY and
+    expire, so links can't be enumerated or forged and stop working after
+    MEDIA_URL_TTL; anyone holding an unexpired link can fetch the file.
+    """
+
+    def __init__(self, root=None, secret=None, url_ttl=None):
+        self.root = root or Config.MEDIA_DIR
+        self.secret = (secret or Config.SECRET_KEY).encode()
+        self.url_ttl = url_ttl or Config.MEDIA_URL_TTL
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, media_id):
+        """Get the local file path for a media id"""
+        if not MEDIA_ID_PATTERN.match(str(media_id)):
+            raise ValueError(f"Invalid media id: {media_id}")
+        return os.path.join(self.root, f"{media_id}.mp4")
+
+    def cover_path_for(self, media_id):
+        """Get the local path of a media id's cover image"""
+        return os.path.splitext(self.path_for(media_id))[0] + '.jpg'
+
+    def exists(self, media_id):
+        return os.path.exists(self.path_for(media_id))
+
+    def remove(self, media_id):
+        """Delete a stored video and its cover if present"""
+        for path in (self.path_for(media_id), self.cover_path_for(media_id)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _signature(self, media_id, expires):
+        message = f"{media_id}:{expires}".encode()
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def signed_url(self, media_id, base_url=None, kind='video', not_before=None):
+        """Build a public, expiring URL for a stored video (or its cover).
+
+        For scheduled posts, not_before moves the validity window so the
+        link still works when the job runs.
+        """
+        base_url = (base_url or Config.PUBLIC_BASE_URL).rstrip('/')
+        expires = int(max(time.time(), not_before or 0)) + self.url_ttl
+        query = urlencode({'expires': expires, 'sig': self._signature(media_id, expires)})
+        return f"{base_url}/{kind}/{media_id}?{query}"
+
+    def verify(self, media_id, expires, signature):
+        """Check a signed URL's signature and expiry"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time() or not signature:
+            return False
+        return hmac.compare_digest(self._signature(media_id, expires), signature)
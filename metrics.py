@@ -0,0 +1,380 @@
+import bisect
+import copy
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a cached database read up to a slow container
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def snapshot(self):
+        """Current values as JSON-friendly [label values, value] pairs"""
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._values.items()]
+
+    def merge(self, pairs):
+        """Add another process's snapshot to these values"""
+        with self._lock:
+            for key, value in pairs:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + value
+
+    def empty_copy(self):
+        metric = copy.copy(self)
+        metric._lock = threading.Lock()
+        metric._values = {}
+        return metric
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge set directly, moved with inc/dec, or read from a function at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                print(f"Metric {self.name} error: {e}")
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (plus +Inf), sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def merge(self, pairs):
+        with self._lock:
+            for key, (counts, total) in pairs:
+                entry = self._values.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+
+    def totals(self):
+        """(count, sum) of observations per label values, e.g. for reports"""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def render(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Recording is a dict update under a lock, cheap enough to leave on in
+    production; text is only built when /metrics is scraped.
+
+    Processes that serve one port (gunicorn workers) each hold their own
+    values, so a scrape would see a random one of them. With a snapshot
+    directory each process writes its values there periodically and the
+    scraped process renders the sum of all of them: counters and
+    histograms include processes that have exited, gauges only those that
+    wrote recently.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._stop_snapshots = threading.Event()
+        self._snapshot_thread = None
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_snapshot(self, directory):
+        """Write this process's values to <directory>/<pid>.json"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {metric.name: metric.snapshot() for metric in metrics}
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def render_snapshots(self, directory, stale_after):
+        """Render the sum of every process's snapshot in directory"""
+        self.write_snapshot(directory)
+        with self._lock:
+            merged = {name: metric.empty_copy() for name, metric in self._metrics.items()}
+        now = time.time()
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                fresh = now - os.path.getmtime(path) < stale_after
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Removed or replaced while reading
+                continue
+            for name, pairs in data.items():
+                metric = merged.get(name)
+                if metric is not None and (fresh or metric.kind != 'gauge'):
+                    metric.merge(pairs)
+        lines = []
+        for metric in merged.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def start_snapshots(self, directory, interval):
+        """Write snapshots every interval seconds from a daemon thread"""
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            while not self._stop_snapshots.wait(interval):
+                try:
+                    self.write_snapshot(directory)
+                except Exception as e:
+                    print(f"Metrics snapshot error: {e}")
+
+        self._stop_snapshots.clear()
+        self._snapshot_thread = threading.Thread(target=run, name='metrics-snapshots', daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self, directory):
+        """Stop the snapshot thread and record the final values"""
+        self._stop_snapshots.set()
+        self._snapshot_thread = None
+        self.write_snapshot(directory)
+
+    def serve(self, port, host='0.0.0.0'):
+        """Serve /metrics from a daemon thread (for processes without a web app)"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', registry.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'instaposter_stage_seconds',
+    'Duration of each step of a post',
+    ('stage',)
+)
+DB_CALL_SECONDS = registry.histogram(
+    'instaposter_db_call_seconds',
+    'Duration of Database calls',
+    ('call',)
+)
+HTTP_CALL_SECONDS = registry.histogram(
+    'instaposter_http_call_seconds',
+    'Duration of outgoing HTTP calls by call name and result (ok or error)',
+    ('call', 'result')
+)
+GRAPH_CALLS = registry.counter(
+    'instaposter_graph_calls_total',
+    'Graph API calls by result (ok or error class)',
+    ('call', 'result')
+)
+DB_CALL_ERRORS = registry.counter(
+    'instaposter_db_call_errors_total',
+    'Failed Database calls by error class',
+    ('call', 'error_class')
+)
+PUBLISH_RESULTS = registry.counter(
+    'instaposter_publish_jobs_total',
+    'Finished publish jobs by result and error class',
+    ('result', 'error_class')
+)
+UPLOAD_ERRORS = registry.counter(
+    'instaposter_upload_errors_total',
+    'Posts rejected before reaching the queue, by error class',
+    ('error_class',)
+)
+USER_CACHE_EVENTS = registry.counter(
+    'instaposter_user_cache_total',
+    'User cache hits, misses and evictions',
+    ('event',)
+)
+JOBS_IN_FLIGHT = registry.gauge(
+    'instaposter_jobs_in_flight',
+    'Publish jobs being worked on by this process'
+)
+QUEUE_DEPTH = registry.gauge(
+    'instaposter_queue_depth',
+    'Publish jobs not yet published or failed'
+)
+
+STARTUP_SECONDS = registry.gauge(
+    'instaposter_startup_seconds',
+    'Time spent on each startup phase or component construction',
+    ('phase',)
+)
+
+
+def timed_db_call(func):
+    """Record a Database method's latency (and errors) under its name"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            DB_CALL_ERRORS.inc(call=func.__name__, error_class=type(e).__name__)
+            raise
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - started, call=func.__name__)
+    return wrapper
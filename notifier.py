@@ -0,0 +1,50 @@
+class PublishNotifier:
+    """Records a finished publish job and tells the user how it went.
+
+    Used as Publisher.on_complete both inside the bot process and in
+    standalone publish workers, which only need a Bot to send messages.
+    """
+
+    def __init__(self, db, bot):
+        self.db = db
+        self.bot = bot
+
+    async def __call__(self, job):
+        result = job.result
+
+        if result['success']:
+            # Save to history
+            await self.db.add_post_history(
+                job.telegram_user_id,
+                result['media_id'],
+                job.caption,
+                success=True
+            )
+            text = (
+                f"🎉 Successfully posted your reel!\n\n"
+                f"📱 Check your Instagram: @{job.instagram_username}\n"
+                f"🆔 Media ID: {result['media_id'] or 'unknown'}"
+            )
+        else:
+            # Save error to history
+            await self.db.add_post_history(
+                job.telegram_user_id,
+                None,
+                job.caption,
+                success=False,
+                error_message=result['error']
+            )
+            text = (
+                f"❌ Failed to post reel to @{job.instagram_username}:\n{result['error']}\n\n"
+                f"Please try again later or contact support."
+            )
+
+        if job.chat_id and job.message_id:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=job.chat_id,
+                message_id=job.message_id
+            )
+        elif job.chat_id:
+            # Batch and scheduled jobs report each result in its own message
+            await self.bot.send_message(job.chat_id, text)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import Config
+
+
+class OAuthStateStore:
+    """OAuth state store with expiry, a local fast path and a sweeper.
+
+    States expire after OAUTH_STATE_TTL seconds. Consuming a state is a
+    single delete-returning round trip, which makes it single-use even
+    across processes. The local cache only short-cuts what this process has
+    seen itself: states it issued that have since expired, and states it
+    already consumed or found invalid (kept as markers until they would
+    have expired), so a replayed callback landing on the same process is
+    rejected without a database call. When the bot and the web tier are
+    separate processes, the first callback for a state always goes to the
+    database. A background sweeper purges expired rows in batches.
+    """
+
+    def __init__(self, db, ttl=None, cache_size=None, sweep_interval=None, sweep_batch=None):
+        self.db = db
+        self.ttl = ttl or Config.OAUTH_STATE_TTL
+        self.cache_size = cache_size or Config.OAUTH_STATE_CACHE_SIZE
+        self.sweep_interval = sweep_interval or Config.OAUTH_SWEEP_INTERVAL
+        self.sweep_batch = sweep_batch or Config.OAUTH_SWEEP_BATCH
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stopped = threading.Event()
+
+    def _remember(self, state, expires_at, telegram_user_id):
+        with self._lock:
+            self._local[state] = (expires_at, telegram_user_id)
+            self._local.move_to_end(state)
+            while len(self._local) > self.cache_size:
+                self._local.popitem(last=False)
+
+    def store(self, state, telegram_user_id):
+        """Persist a new state and remember it locally"""
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        self.db.store_oauth_state(state, telegram_user_id, expires_at=expires_at.isoformat())
+        self._remember(state, time.time() + self.ttl, telegram_user_id)
+
+    def consume(self, state):
+        """Atomically validate and delete a state; returns its row or None"""
+        with self._lock:
+            entry = self._local.get(state)
+        if entry is not None and (entry[0] < time.time() or entry[1] is None):
+            # Expired, or already used/rejected here: no need to ask the database
+            return None
+        row = self.db.consume_oauth_state(state)
+        # Whatever the outcome the state can't be used again; remember that
+        expires_at = entry[0] if entry is not None else time.time() + self.ttl
+        self._remember(state, expires_at, None)
+        return row
+
+    def sweep(self):
+        """Delete expired states in batches; returns the number removed"""
+        now = time.time()
+        with self._lock:
+            for state in [s for s, (expires, _) in self._local.items() if expires < now]:
+                del self._local[state]
+
+        removed = 0
+        while True:
+            count = self.db.delete_expired_oauth_states(self.sweep_batch)
+            removed += count
+            if count < self.sweep_batch:
+                return removed
+
+    def start_sweeper(self):
+        """Run sweep() every sweep interval in a daemon thread"""
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='oauth-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stopped.wait(self.sweep_interval):
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"Purged {removed} expired OAuth states")
+            except Exception as e:
+                print(f"OAuth state sweep error: {e}")
+
+    def stop(self):
+        self._stopped.set()
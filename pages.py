@@ -0,0 +1,236 @@
+import gzip
+import hashlib
+from flask import Response, request
+from config import Config
+
+try:
+    # Optional: brotli variants are only served when the package is installed
+    import brotli
+except ImportError:
+    brotli = None
+
+HOME_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Instagram Reels Bot</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <style>
+        body { 
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+            margin: 0; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh; color: #333;
+        }
+        .container { 
+            max-width: 600px; margin: 0 auto; background: white; 
+            padding: 40px; border-radius: 20px; box-shadow: 0 20px 40px rgba(0,0,0,0.1);
+        }
+        .header { text-align: center; margin-bottom: 30px; }
+        .status { 
+            padding: 15px 20px; border-radius: 10px; margin: 20px 0; 
+            border: none; font-weight: 500;
+        }
+        .success { background: #d4edda; color: #155724; }
+        .info { background: #e3f2fd; color: #0d47a1; }
+        .feature { 
+            background: #f8f9fa; padding: 15px; margin: 10px 0; 
+            border-radius: 8px; border-left: 4px solid #667eea;
+        }
+        .code { 
+            background: #f1f3f4; padding: 10px; border-radius: 6px; 
+            font-family: 'Courier New', monospace; margin: 10px 0;
+        }
+        h1 { color: #667eea; margin: 0; }
+        h2 { color: #555; border-bottom: 2px solid #eee; padding-bottom: 10px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎬 Instagram Reels Bot</h1>
+            <p>Post videos to Instagram Reels directly from Telegram</p>
+        </div>
+
+        <div class="status success">
+            ✅ Bot is running successfully!
+        </div>
+
+        <h2>📱 How to use:</h2>
+        <div class="feature">
+            <strong>1.</strong> Find the bot on Telegram and start a chat
+        </div>
+        <div class="feature">
+            <strong>2.</strong> Use <code>/connect</code> to link your Instagram account
+        </div>
+        <div class="feature">
+            <strong>3.</strong> Send a video file (3-90 seconds, MP4 format)
+        </div>
+        <div class="feature">
+            <strong>4.</strong> Use <code>/post</code> to publish as Instagram Reel
+        </div>
+
+        <h2>🤖 Bot Commands:</h2>
+        <div class="code">
+/start - Get started<br>
+/connect - Connect Instagram<br>
+/status - Check connection<br>
+/post - Post your video<br>
+/help - Get help
+        </div>
+
+        <div class="status info">
+            <strong>🌐 Callback URL:</strong> {{ callback_url }}<br>
+            <strong>⚡ Status:</strong> Online<br>
+            <strong>🏗️ Platform:</strong> Supabase<br>
+            <strong>📊 Storage:</strong> Supabase Storage
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+CONNECT_FAILED_TEMPLATE = """
+<html>
+<head><title>Connection Error</title></head>
+<body style="font-family: Arial; text-align: center; margin: 50px;">
+    <h1 style="color: #dc3545;">❌ Connection Failed</h1>
+    <p>Error: {{ error }}</p>
+    <p>Please try connecting again in the Telegram bot.</p>
+</body>
+</html>
+"""
+
+INVALID_REQUEST_PAGE = """
+<html>
+<head><title>Invalid Request</title></head>
+<body style="font-family: Arial; text-align: center; margin: 50px;">
+    <h1 style="color: #dc3545;">❌ Invalid Request</h1>
+    <p>Missing required parameters.</p>
+</body>
+</html>
+"""
+
+INVALID_STATE_PAGE = """
+<html>
+<head><title>Invalid State</title></head>
+<body style="font-family: Arial; text-align: center; margin: 50px;">
+    <h1 style="color: #dc3545;">❌ Invalid State</h1>
+    <p>This authorization link has expired or is invalid.</p>
+    <p>Please try connecting again in the Telegram bot.</p>
+</body>
+</html>
+"""
+
+CONNECTED_TEMPLATE = """
+<html>
+<head>
+    <title>Connected Successfully</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <style>
+        body { font-family: Arial, sans-serif; text-align: center; margin: 20px; background: #f0f2f5; }
+        .container { max-width: 400px; margin: 50px auto; background: white; padding: 30px; border-radius: 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+        .success { color: #28a745; margin-bottom: 20px; }
+        .username { background: #e3f2fd; padding: 10px; border-radius: 8px; margin: 15px 0; }
+        .instruction { background: #fff3cd; padding: 15px; border-radius: 8px; margin-top: 20px; color: #856404; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1 class="success">✅ Connected!</h1>
+        <p>Your Instagram account has been successfully connected.</p>
+
+        <div class="username">
+            <strong>@{{ username }}</strong>
+        </div>
+
+        <div class="instruction">
+            <strong>🔄 Next Steps:</strong><br>
+            Go back to the Telegram bot and send a video to start posting reels!
+        </div>
+
+        <p style="margin-top: 30px; color: #666; font-size: 14px;">
+            You can safely close this window.
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+CONNECTION_ERROR_TEMPLATE = """
+<html>
+<head><title>Connection Error</title></head>
+<body style="font-family: Arial; text-align: center; margin: 50px;">
+    <h1 style="color: #dc3545;">❌ Connection Error</h1>
+    <p>Failed to complete the connection process.</p>
+    <p>Please try again in the Telegram bot.</p>
+    <p style="color: #666; font-size: 12px;">Error: {{ error }}</p>
+</body>
+</html>
+"""
+
+
+class StaticPage:
+    """A page rendered once at startup and served from memory.
+
+    Identity, gzip and (if available) brotli bodies are built up front, each
+    with its own ETag, so a request only negotiates an encoding and compares
+    If-None-Match. Error pages (status other than 200) are never cached.
+    """
+
+    ENCODINGS = ('br', 'gzip')
+
+    def __init__(self, html, status=200, max_age=None):
+        self.status = status
+        self.max_age = Config.PAGE_MAX_AGE if max_age is None else max_age
+        body = html.encode('utf-8')
+        variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=11)
+        # Keep a compressed variant only if it is actually smaller
+        self.variants = {
+            encoding: (data, self._etag(data))
+            for encoding, data in variants.items()
+            if encoding == 'identity' or len(data) < len(body)
+        }
+
+    @staticmethod
+    def _etag(data):
+        return hashlib.sha256(data).hexdigest()[:32]
+
+    def _encoding(self):
+        for encoding in self.ENCODINGS:
+            if encoding in self.variants and request.accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    def response(self):
+        """Response for the current request, 304 if the client's copy is current"""
+        encoding = self._encoding()
+        body, etag = self.variants[encoding]
+        headers = {'Vary': 'Accept-Encoding'}
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        if self.status != 200:
+            headers['Cache-Control'] = 'no-store'
+            return Response(body, status=self.status, headers=headers, content_type='text/html; charset=utf-8')
+
+        headers['ETag'] = f'"{etag}"'
+        headers['Cache-Control'] = f"public, max-age={self.max_age}"
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+        return Response(body, headers=headers, content_type='text/html; charset=utf-8')
+
+
+class Pages:
+    """The web tier's pages: templates compiled once, static pages pre-rendered"""
+
+    def __init__(self, jinja_env, callback_url=None):
+        self.home = StaticPage(
+            jinja_env.from_string(HOME_TEMPLATE).render(callback_url=callback_url or Config.REDIRECT_URI)
+        )
+        self.invalid_request = StaticPage(INVALID_REQUEST_PAGE, status=400)
+        self.invalid_state = StaticPage(INVALID_STATE_PAGE, status=400)
+        self.connect_failed = jinja_env.from_string(CONNECT_FAILED_TEMPLATE)
+        self.connected = jinja_env.from_string(CONNECTED_TEMPLATE)
+        self.connection_error = jinja_env.from_string(CONNECTION_ERROR_TEMPLATE)
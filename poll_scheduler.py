@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from config import Config
+from errors import RateLimitedError, classify_exception
+from metrics import STAGE_SECONDS
+
+TERMINAL_STATUSES = ('FINISHED', 'PUBLISHED', 'ERROR', 'EXPIRED')
+FINISH_BUCKETS = (5, 10, 20, 30, 60, 120, 300, float('inf'))
+
+
+class _PendingPoll:
+    def __init__(self, access_token, container_id, interval, future):
+        self.access_token = access_token
+        self.container_id = container_id
+        self.interval = interval
+        self.future = future
+        self.started = time.monotonic()
+        self.polls = 0
+
+
+class PollScheduler:
+    """Shared scheduler for container status polls.
+
+    Instead of one sleeping loop per reel, every pending container sits in a
+    single timer heap driven by one task; polls that fall due together are
+    issued together. The first poll is placed according to the video's
+    duration and size, later ones back off exponentially with jitter. Time
+    to FINISHED is recorded so the schedule can be tuned.
+    """
+
+    def __init__(self, instagram_client, min_interval=None, max_interval=None,
+                 backoff=None, jitter=None, max_wait=None):
+        self.instagram_client = instagram_client
+        self.min_interval = min_interval or Config.POLL_MIN_INTERVAL
+        self.max_interval = max_interval or Config.POLL_MAX_INTERVAL
+        self.backoff = backoff or Config.POLL_BACKOFF
+        self.jitter = Config.POLL_JITTER if jitter is None else jitter
+        self.max_wait = max_wait or Config.PUBLISH_MAX_WAIT
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._driver = None
+        # Strong references, so in-flight polls aren't garbage collected
+        self._polls = set()
+        self.samples = deque(maxlen=1000)
+        self.finish_histogram = [0] * len(FINISH_BUCKETS)
+        self.total_polls = 0
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    def initial_delay(self, duration=None, size=None):
+        """Estimate when a container is first worth polling"""
+        delay = self.min_interval
+        if duration:
+            delay += duration * 0.1
+        if size:
+            delay += size / (1024 * 1024) * 0.05
+        return min(delay, self.max_interval)
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, entry, delay):
+        due = time.monotonic() + self._jittered(delay)
+        heapq.heappush(self._heap, (due, next(self._sequence), entry))
+        self._wakeup.set()
+
+    async def wait(self, access_token, container_id, duration=None, size=None):
+        """Wait until a container reaches a terminal status; None on timeout"""
+        loop = asyncio.get_running_loop()
+        if self._driver is None or self._driver.done():
+            self._wakeup = asyncio.Event()
+            self._driver = loop.create_task(self._drive())
+
+        entry = _PendingPoll(
+            access_token,
+            container_id,
+            self.initial_delay(duration, size),
+            loop.create_future()
+        )
+        self._schedule(entry, entry.interval)
+        return await entry.future
+
+    async def _drive(self):
+        """Fire due polls; sleep until the next one is due"""
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    # Woken early if an earlier poll gets scheduled
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, entry = heapq.heappop(self._heap)
+                if not entry.future.done():
+                    task = asyncio.get_running_loop().create_task(self._poll(entry))
+                    self._polls.add(task)
+                    task.add_done_callback(self._polls.discard)
+
+    async def _poll(self, entry):
+        retry_after = None
+        started = time.perf_counter()
+        try:
+            status = await self.instagram_client.get_media_status(
+                entry.access_token,
+                entry.container_id
+            )
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='status_poll')
+        except Exception as e:
+            error = classify_exception(e)
+            if not error.retryable:
+                if not entry.future.done():
+                    entry.future.set_exception(error)
+                return
+            print(f"Media status poll error: {error}")
+            status = None
+            if isinstance(error, RateLimitedError):
+                retry_after = error.retry_after
+        entry.polls += 1
+        self.total_polls += 1
+
+        if entry.future.done():
+            return
+        elapsed = time.monotonic() - entry.started
+        if status in TERMINAL_STATUSES:
+            if status == 'FINISHED':
+                self._record_finish(elapsed)
+            entry.future.set_result(status)
+        elif elapsed >= self.max_wait:
+            entry.future.set_result(None)
+        else:
+            entry.interval = min(entry.interval * self.backoff, self.max_interval)
+            self._schedule(entry, max(entry.interval, retry_after or 0))
+
+    def _record_finish(self, seconds):
+        STAGE_SECONDS.observe(seconds, stage='time_to_finished')
+        self.samples.append(seconds)
+        for index, bound in enumerate(FINISH_BUCKETS):
+            if seconds <= bound:
+                self.finish_histogram[index] += 1
+                break
+
+    def stats(self):
+        """Time-to-FINISHED distribution and poll counters"""
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            'pending': self.pending,
+            'total_polls': self.total_polls,
+            'finished': sum(self.finish_histogram),
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+            'histogram': dict(zip(FINISH_BUCKETS, self.finish_histogram))
+        }
+
+    async def close(self):
+        if self._driver is not None:
+            self._driver.cancel()
+            try:
+                await self._driver
+            except asyncio.CancelledError:
+                pass
+            self._driver = None
+        for _, _, entry in self._heap:
+            if not entry.future.done():
+                entry.future.cancel()
+        self._heap = []
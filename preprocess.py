@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+# Instagram Reels publishing spec
+REELS_WIDTH = 1080
+REELS_HEIGHT = 1920
+REELS_ASPECT = REELS_WIDTH / REELS_HEIGHT
+MIN_DURATION = 3
+MAX_DURATION = 90
+VIDEO_CODECS = ('h264',)
+AUDIO_CODECS = ('aac',)
+CONTAINERS = ('mov', 'mp4', 'm4a', '3gp', '3g2', 'mj2')
+
+
+def _ffmpeg():
+    """Locate ffmpeg (moviepy ships one through imageio-ffmpeg)"""
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def probe_video(path):
+    """Read container, codecs, resolution, duration and bitrate of a video"""
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        output = subprocess.run(
+            [ffprobe, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+            capture_output=True, check=True, timeout=30
+        ).stdout
+        data = json.loads(output)
+        video = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in data.get('streams', []) if s.get('codec_type') == 'audio'), None)
+        fmt = data.get('format', {})
+        return {
+            'container': fmt.get('format_name', ''),
+            'duration': float(fmt.get('duration') or 0),
+            'bitrate': int(fmt.get('bit_rate') or 0),
+            'video_codec': video.get('codec_name') if video else None,
+            'width': int(video.get('width') or 0) if video else 0,
+            'height': int(video.get('height') or 0) if video else 0,
+            'audio_codec': audio.get('codec_name') if audio else None
+        }
+
+    # No ffprobe: fall back to moviepy's ffmpeg output parser
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    infos = ffmpeg_parse_infos(path)
+    width, height = infos.get('video_size') or (0, 0)
+    return {
+        'container': os.path.splitext(path)[1].lstrip('.'),
+        'duration': float(infos.get('duration') or 0),
+        'bitrate': int(infos.get('bitrate') or 0) * 1000,
+        'video_codec': infos.get('video_codec_name') or ('unknown' if infos.get('video_found', True) else None),
+        'width': width,
+        'height': height,
+        'audio_codec': infos.get('audio_codec_name') if infos.get('audio_found') else None
+    }
+
+
+def check_compliance(info):
+    """Split problems into fatal ones and ones a transcode fixes"""
+    fatal, fixable = [], []
+
+    if not info['video_codec'] or not info['width'] or not info['height']:
+        fatal.append("no readable video stream")
+        return fatal, fixable
+    if info['duration'] < MIN_DURATION or info['duration'] > MAX_DURATION:
+        fatal.append(f"duration {info['duration']:.1f}s is outside {MIN_DURATION}-{MAX_DURATION}s")
+
+    if not any(name in info['container'].split(',') for name in CONTAINERS):
+        fixable.append(f"container {info['container']}")
+    if info['video_codec'] not in VIDEO_CODECS:
+        fixable.append(f"video codec {info['video_codec']}")
+    if info['audio_codec'] and info['audio_codec'] not in AUDIO_CODECS:
+        fixable.append(f"audio codec {info['audio_codec']}")
+    if abs(info['width'] / info['height'] - REELS_ASPECT) > 0.01:
+        fixable.append(f"aspect ratio {info['width']}x{info['height']}")
+    if info['height'] > REELS_HEIGHT:
+        fixable.append(f"resolution {info['width']}x{info['height']}")
+    if info['bitrate'] > Config.PREPROCESS_MAX_BITRATE:
+        fixable.append(f"bitrate {info['bitrate'] // 1000} kbps")
+    return fatal, fixable
+
+
+def transcode_video(src, dst):
+    """Re-encode to H.264/AAC 1080x1920 (letterboxed) at the target bitrate"""
+    bitrate = Config.PREPROCESS_TARGET_BITRATE
+    video_filter = (
+        f"scale={REELS_WIDTH}:{REELS_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={REELS_WIDTH}:{REELS_HEIGHT}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+    subprocess.run(
+        [
+            _ffmpeg(), '-y', '-v', 'error', '-i', src,
+            '-vf', video_filter, '-r', '30',
+            '-c:v', 'libx264', '-profile:v', 'high', '-pix_fmt', 'yuv420p', '-preset', 'veryfast',
+            '-b:v', str(bitrate), '-maxrate', str(bitrate), '-bufsize', str(bitrate * 2),
+            '-c:a', 'aac', '-b:a', '128k', '-ar', '48000', '-ac', '2',
+            '-movflags', '+faststart', dst
+        ],
+        check=True, capture_output=True, timeout=Config.PREPROCESS_TIMEOUT
+    )
+
+
+def generate_cover(src, dst, at=1.0):
+    """Grab a frame as a 9:16 JPEG cover image"""
+    # Unique temp names: jobs sharing a media id may render its cover at once
+    tmp_path = f"{dst}.{uuid.uuid4().hex[:8]}"
+    frame_path = f"{tmp_path}.png"
+    subprocess.run(
+        [_ffmpeg(), '-y', '-v', 'error', '-ss', str(at), '-i', src, '-frames:v', '1', frame_path],
+        check=True, capture_output=True, timeout=60
+    )
+    try:
+        from PIL import Image, ImageOps
+        with Image.open(frame_path) as frame:
+            cover = ImageOps.fit(frame.convert('RGB'), (REELS_WIDTH, REELS_HEIGHT))
+            cover.save(tmp_path, 'JPEG', quality=85, optimize=True)
+        os.replace(tmp_path, dst)
+    finally:
+        for path in (frame_path, tmp_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def preprocess_video(path, cover_path, transcode_path=None, transcode_cover_path=None):
+    """Probe, validate and if needed transcode a video.
+
+    Runs in a worker process. A transcode is written to transcode_path (its
+    cover to transcode_cover_path) and hashed, so the original file and its
+    media cache entry stay valid; without a transcode_path it replaces the
+    original through a unique temp file. Returns a dict with 'ok', 'errors',
+    'transcoded', 'path', 'sha256' (of a transcode), 'size' and 'duration'.
+    """
+    try:
+        info = probe_video(path)
+    except Exception as e:
+        return {'ok': False, 'errors': [f"could not read video ({e})"]}
+
+    fatal, fixable = check_compliance(info)
+    if fatal:
+        return {'ok': False, 'errors': fatal}
+    if fixable and not Config.PREPROCESS_TRANSCODE:
+        return {'ok': False, 'errors': fixable}
+
+    transcoded = False
+    sha256 = None
+    if fixable:
+        tmp_path = transcode_path or f"{path}.{uuid.uuid4().hex[:8]}.transcode.mp4"
+        try:
+            transcode_video(path, tmp_path)
+            if transcode_path:
+                path, cover_path = transcode_path, transcode_cover_path or cover_path
+                sha256 = file_sha256(path)
+            else:
+                os.replace(tmp_path, path)
+            transcoded = True
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return {'ok': False, 'errors': [f"transcoding failed ({e})"] + fixable}
+
+    cover = None
+    try:
+        generate_cover(path, cover_path, at=min(1.0, info['duration'] / 2))
+        cover = cover_path
+    except Exception as e:
+        print(f"Cover generation error: {e}")
+
+    return {
+        'ok': True,
+        'errors': [],
+        'transcoded': transcoded,
+        'fixed': fixable,
+        'path': path,
+        'sha256': sha256,
+        'size': os.path.getsize(path),
+        'duration': info['duration'],
+        'cover_path': cover
+    }
+
+
+class Preprocessor:
+    """Runs preprocess_video in a process pool off the event loop"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or Config.PREPROCESS_WORKERS
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Not fork: this process runs threads (health monitor, executors,
+            # the event loop) and a forked child can inherit a held lock
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('forkserver')
+            )
+        return self._pool
+
+    async def process(self, path, cover_path, transcode_path=None, transcode_cover_path=None):
+        if not Config.PREPROCESS_ENABLED:
+            # Leave validation to Instagram
+            return {'ok': True, 'errors': [], 'transcoded': False, 'fixed': [], 'path': path,
+                    'sha256': None, 'size': os.path.getsize(path), 'duration': None, 'cover_path': None}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(), preprocess_video, path, cover_path, transcode_path, transcode_cover_path
+        )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
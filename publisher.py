@@ -0,0 +1,313 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from config import Config
+from components import components
+from job_queue import QUEUED, CONTAINER_CREATED, PROCESSING, LeaseLostError
+from poll_scheduler import PollScheduler
+from retry_policy import RetryPolicy
+from errors import GraphAPIError, AuthExpiredError
+from metrics import JOBS_IN_FLIGHT, PUBLISH_RESULTS, STAGE_SECONDS
+
+# Allowed difference between our clock and Instagram's post timestamps
+CLOCK_SKEW = 60
+
+
+def _epoch(value):
+    """Epoch seconds from a float or an ISO 8601 timestamp; None if unparseable"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    for parse in (datetime.fromisoformat, lambda text: datetime.strptime(text, '%Y-%m-%dT%H:%M:%S%z')):
+        try:
+            return parse(value).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class Publisher:
+    """Worker pool that publishes reels from the persistent job queue.
+
+    Each worker claims a job under a lease, renews it with heartbeats while
+    the container is processing, and records every state transition in the
+    queue. Jobs left behind by a crashed process are picked up again once
+    their lease expires and resume from the recorded state; a worker that
+    finds its lease gone stops working on the job.
+    """
+
+    def __init__(self, async_instagram_client, queue=None, on_complete=None, workers=None,
+                 media_cache=None, poll_scheduler=None, retry_policy=None):
+        self.instagram_client = async_instagram_client
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.poll_scheduler = poll_scheduler or PollScheduler(async_instagram_client)
+        self.queue = queue or components.job_queue
+        self.media_cache = media_cache
+        self.on_complete = on_complete
+        self.workers = workers or Config.PUBLISH_CONCURRENCY
+        self.process_id = uuid.uuid4().hex[:8]
+        self._wakeup = None
+        self._worker_tasks = []
+        self._active = 0
+        self._stopping = False
+
+    @property
+    def in_flight(self):
+        """Number of jobs currently being worked on by this process"""
+        return self._active
+
+    async def _queue(self, method, *args):
+        """Run a queue call off the event loop (the backend may be remote)"""
+        return await asyncio.to_thread(getattr(self.queue, method), *args)
+
+    async def start(self):
+        """Spawn the worker tasks on the running event loop"""
+        if self._worker_tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            worker_id = f"{self.process_id}-{index}"
+            self._worker_tasks.append(loop.create_task(self._worker(worker_id)))
+        pending = await self._queue('depth')
+        print(f"Publisher started with {self.workers} workers ({pending} jobs pending)")
+
+    async def enqueue(self, job):
+        """Persist a job and wake a local worker"""
+        job_id = await self._queue('enqueue', job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def _worker(self, worker_id):
+        """Claim and run jobs until stopped.
+
+        Queue errors (a Supabase hiccup, a locked SQLite file) never end the
+        worker: they're logged and the claim is retried after a backoff. A
+        job whose outcome couldn't be recorded keeps its lease until it
+        expires and is then resumed from its recorded state.
+        """
+        failures = 0
+        while not self._stopping:
+            try:
+                job = await self._queue('claim', worker_id)
+            except Exception as e:
+                failures += 1
+                delay = min(Config.JOB_POLL_INTERVAL * 2 ** (failures - 1), Config.RETRY_MAX_DELAY)
+                print(f"Publish worker {worker_id} queue error: {e}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # Jobs enqueued by other processes are found on the next poll
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=Config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._active += 1
+            JOBS_IN_FLIGHT.inc()
+            loop = asyncio.get_running_loop()
+            task = loop.create_task(self._process(job))
+            heartbeat = loop.create_task(self._heartbeat(job, worker_id, task))
+            try:
+                await task
+            except asyncio.CancelledError:
+                # The heartbeat only finishes after cancelling a job whose
+                # lease was lost; anything else is this worker being stopped
+                if self._stopping or not heartbeat.done():
+                    raise
+            except Exception as e:
+                print(f"Publish job {job.id} could not be recorded: {e}")
+            finally:
+                heartbeat.cancel()
+                self._active -= 1
+                JOBS_IN_FLIGHT.dec()
+
+    async def _process(self, job):
+        """Run a claimed job, recording failures"""
+        try:
+            await self._run(job)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job in its current state for resume
+            raise
+        except LeaseLostError as e:
+            # Another worker has the job now and carries on from its state
+            print(f"Publish job {job.id} abandoned: {e}")
+        except AuthExpiredError as e:
+            print(f"Publish job {job.id} auth error: {e}")
+            await self._fail(job, 'Instagram session expired. Please /connect again.',
+                             type(e).__name__)
+        except GraphAPIError as e:
+            print(f"Publish job {job.id} error: {e}")
+            await self._fail(job, str(e), type(e).__name__)
+        except Exception as e:
+            print(f"Publish job error: {e}")
+            await self._fail(job, str(e), type(e).__name__)
+
+    async def _heartbeat(self, job, worker_id, task):
+        """Renew the job lease while task works on it; cancel task if the lease is lost"""
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self._queue('heartbeat', job.id, worker_id):
+                    print(f"Lost lease on publish job {job.id}; abandoning it")
+                    task.cancel()
+                    return
+            except Exception as e:
+                # Try again on the next beat; the lease outlives two misses
+                print(f"Heartbeat error on publish job {job.id}: {e}")
+
+    async def _run(self, job):
+        """Advance a job from its recorded state to published or failed"""
+        if job.status == QUEUED:
+            if await self._over_budget(job):
+                until = time.time() + Config.PUBLISH_BUDGET_DEFER
+                print(f"Publish job {job.id} deferred: @{job.instagram_username} "
+                      f"reached {Config.PUBLISH_LIMIT_PER_DAY} posts in 24h")
+                return await self._queue('defer', job.id, until, job.lease_owner)
+            # Not idempotent: only retried when Instagram never saw the request
+            with STAGE_SECONDS.time(stage='create_container'):
+                container_result = await self.retry_policy.run(
+                    self.instagram_client.create_media_container,
+                    job.access_token,
+                    job.video_url,
+                    job.caption,
+                    cover_url=job.cover_url,
+                    idempotent=False
+                )
+            if not container_result or 'id' not in container_result:
+                return await self._fail(job, 'Failed to create media container', 'ContainerError')
+            job.container_id = container_result['id']
+            job.status = CONTAINER_CREATED
+            await self._queue('mark_container_created', job.id, job.container_id, job.lease_owner)
+
+        if job.status in (CONTAINER_CREATED, PROCESSING):
+            job.status = PROCESSING
+            await self._queue('mark_processing', job.id, job.lease_owner)
+            status = await self.poll_scheduler.wait(
+                job.access_token,
+                job.container_id,
+                duration=job.duration,
+                size=job.size
+            )
+            if status is None:
+                return await self._fail(job, 'Media processing timeout', 'ProcessingTimeout')
+            if status == 'PUBLISHED':
+                # Published before a crash or lost response; don't publish twice
+                publish_result = await self._find_published(job)
+            elif status != 'FINISHED':
+                return await self._fail(job, f'Media processing failed ({status})', 'ProcessingFailed')
+            else:
+                started = time.perf_counter()
+                publish_result = await self._publish(job)
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='publish')
+            if not publish_result or 'id' not in publish_result:
+                return await self._fail(job, 'Failed to publish media', 'PublishError')
+
+            job.media_id = publish_result['id']
+            await self._queue('mark_published', job.id, job.media_id, job.lease_owner)
+            job.result = {
+                'success': True,
+                'media_id': job.media_id,
+                'message': 'Reel posted successfully!'
+            }
+            await self._finish(job)
+
+    async def _over_budget(self, job):
+        """Whether the job's account used its daily publish budget, across all workers"""
+        # Checked before the container is created, since containers expire if
+        # left waiting. Workers racing for the last slot may overshoot by one
+        if not job.instagram_username:
+            return False
+        published = await self._queue('published_since', job.instagram_username, time.time() - 86400)
+        return published >= Config.PUBLISH_LIMIT_PER_DAY
+
+    async def _publish(self, job):
+        """Publish a finished container without ever publishing it twice"""
+        attempts = self.retry_policy.max_attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                return await self.retry_policy.run(
+                    self.instagram_client.publish_media,
+                    job.access_token,
+                    job.container_id,
+                    idempotent=False
+                )
+            except GraphAPIError as e:
+                if not e.retryable or e.safe_to_retry or attempt == attempts:
+                    raise
+                error = e
+            # The response was lost; only publish again if it didn't go through
+            status = await self.retry_policy.run(
+                self.instagram_client.get_media_status,
+                job.access_token,
+                job.container_id
+            )
+            if status == 'PUBLISHED':
+                return await self._find_published(job)
+            await asyncio.sleep(self.retry_policy.delay(error, attempt))
+
+    async def _find_published(self, job):
+        """Identify the media a container became after its publish response was lost.
+
+        The Graph API doesn't link a container to its media, so recent media
+        of the account is matched on caption and on being posted after the
+        job was created. Only a single match is trusted (a batch posts several
+        reels with one caption); otherwise the media id is recorded as unknown.
+        """
+        media = await self.retry_policy.run(self.instagram_client.get_recent_media, job.access_token)
+        created = _epoch(job.created_at)
+        matches = [
+            item for item in media
+            if (item.get('caption') or '') == (job.caption or '')
+            and (created is None or (_epoch(item.get('timestamp')) or 0) >= created - CLOCK_SKEW)
+        ]
+        if len(matches) == 1:
+            return {'id': matches[0]['id']}
+        print(f"Publish job {job.id} was published but its media id is unknown "
+              f"({len(matches)} candidate posts)")
+        return {'id': None}
+
+    async def _fail(self, job, error, error_class='PublishError'):
+        await self._queue('mark_failed', job.id, error, job.lease_owner)
+        job.result = {'success': False, 'error': error, 'error_class': error_class}
+        await self._finish(job)
+
+    async def _finish(self, job):
+        """Release the local video and report the result"""
+        if job.result['success']:
+            PUBLISH_RESULTS.inc(result='success', error_class='')
+        else:
+            PUBLISH_RESULTS.inc(result='failure', error_class=job.result.get('error_class', ''))
+        if self.media_cache is not None:
+            # The file stays cached so a resend skips the download. If the
+            # job ran on another host this is a no-op and the owning host's
+            # reaper releases the reference instead
+            await asyncio.to_thread(self.media_cache.release_job, job.id)
+        elif job.video_path and os.path.exists(job.video_path):
+            await asyncio.to_thread(os.unlink, job.video_path)
+
+        if self.on_complete:
+            try:
+                await self.on_complete(job)
+            except Exception as e:
+                print(f"Publish completion error: {e}")
+
+    async def shutdown(self):
+        """Stop workers, hand their leases back and release the HTTP client"""
+        self._stopping = True
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        await self._queue('release_owned_by', self.process_id)
+        await self.poll_scheduler.close()
+        await self.instagram_client.close()
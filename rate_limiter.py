@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from config import Config
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate * self.scale)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Seconds until a token can be taken"""
+        now = now or time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / (self.rate * self.scale)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds):
+        """Refuse tokens for the next seconds"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Token-bucket limiter for Graph API calls.
+
+    Each access token has its own call bucket (plus a daily publish bucket),
+    and every call also draws from one app-wide bucket. Callers wait for
+    capacity instead of failing. Requests from one user queue behind each
+    other before reaching the global bucket, which serves waiters in FIFO
+    order, so a busy account can't starve the rest. Usage headers from
+    responses slow the global rate as the app nears its limit, and 429s or
+    a regain-access estimate block the affected token until it recovers.
+
+    Buckets live in this process only. The publish bucket just spreads one
+    process's publishes out; the daily budget per account is enforced by
+    the publisher from the shared job queue.
+    """
+
+    def __init__(self, global_rate=None, global_burst=None, token_rate=None,
+                 token_burst=None, publish_per_day=None, max_tokens=10000):
+        self.token_rate = token_rate or Config.RATE_LIMIT_TOKEN_PER_SEC
+        self.token_burst = token_burst or Config.RATE_LIMIT_TOKEN_BURST
+        self.publish_per_day = publish_per_day or Config.PUBLISH_LIMIT_PER_DAY
+        self.max_tokens = max_tokens
+        self._global = TokenBucket(
+            global_rate or Config.RATE_LIMIT_GLOBAL_PER_SEC,
+            global_burst or Config.RATE_LIMIT_GLOBAL_BURST
+        )
+        self._global_lock = asyncio.Lock()
+        self._tokens = OrderedDict()
+
+    @staticmethod
+    def _key(access_token):
+        return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+    def _entry(self, access_token):
+        key = self._key(access_token)
+        entry = self._tokens.get(key)
+        if entry is None:
+            entry = {
+                'calls': TokenBucket(self.token_rate, self.token_burst),
+                'publishes': TokenBucket(self.publish_per_day / 86400, self.publish_per_day),
+                'lock': asyncio.Lock()
+            }
+            self._tokens[key] = entry
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        self._tokens.move_to_end(key)
+        return entry
+
+    @staticmethod
+    async def _take(bucket):
+        while True:
+            delay = bucket.delay()
+            if delay <= 0:
+                bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def acquire(self, access_token, publish=False):
+        """Wait until a call (or publish) for this token is allowed"""
+        entry = self._entry(access_token)
+        async with entry['lock']:
+            await self._take(entry['calls'])
+            if publish:
+                await self._take(entry['publishes'])
+            async with self._global_lock:
+                await self._take(self._global)
+
+    def observe(self, access_token, status_code, headers):
+        """Adapt limits from a Graph API response"""
+        app_usage = self._parse_json(headers.get('x-app-usage'))
+        if isinstance(app_usage, dict):
+            percent = max((v for v in app_usage.values() if isinstance(v, (int, float))), default=0)
+            # Full speed below 75% of the app quota, then taper off towards 100%
+            self._global.scale = 1.0 if percent < 75 else max(0.05, (100 - percent) / 25)
+            if percent >= 100:
+                self._global.block(60)
+
+        entry = self._entry(access_token)
+        business_usage = self._parse_json(headers.get('x-business-use-case-usage'))
+        if isinstance(business_usage, dict):
+            for usages in business_usage.values():
+                for usage in usages or []:
+                    regain = usage.get('estimated_time_to_regain_access') or 0
+                    if regain:
+                        entry['calls'].block(regain * 60)
+
+        if status_code == 429:
+            try:
+                retry_after = float(headers.get('retry-after', 60))
+            except ValueError:
+                retry_after = 60
+            entry['calls'].block(retry_after)
+
+    @staticmethod
+    def _parse_json(value):
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def stats(self):
+        return {
+            'tracked_tokens': len(self._tokens),
+            'global_tokens': round(self._global.tokens, 2),
+            'global_scale': self._global.scale
+        }
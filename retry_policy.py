@@ -0,0 +1,47 @@
+import asyncio
+import random
+from config import Config
+from errors import RateLimitedError, classify_exception
+
+
+class RetryPolicy:
+    """Retries publish steps on retryable GraphAPIErrors with backoff.
+
+    Non-idempotent steps (container creation) are only retried when the
+    error says the request was never acted on, so a lost response can't
+    leave a second container behind.
+    """
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        self.max_attempts = max_attempts or Config.RETRY_MAX_ATTEMPTS
+        self.base_delay = base_delay or Config.RETRY_BASE_DELAY
+        self.max_delay = max_delay or Config.RETRY_MAX_DELAY
+
+    def should_retry(self, error, attempt, idempotent=True):
+        if attempt >= self.max_attempts or not error.retryable:
+            return False
+        return idempotent or error.safe_to_retry
+
+    def delay(self, error, attempt):
+        if isinstance(error, RateLimitedError):
+            return min(error.retry_after, self.max_delay)
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(backoff / 2, backoff)
+
+    async def run(self, func, *args, idempotent=True, **kwargs):
+        """Call func until it succeeds or fails with a non-retryable error"""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                error = classify_exception(e)
+                if not self.should_retry(error, attempt, idempotent):
+                    if error is e:
+                        raise
+                    raise error from e
+                delay = self.delay(error, attempt)
+                print(f"{getattr(func, '__name__', 'call')} failed ({error}); "
+                      f"retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
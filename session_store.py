@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from user_cache import RedisCacheBackend
+
+
+class Session:
+    """Conversation state for one user's pending post.
+
+    Only what is needed to resume the flow is kept (no Telegram objects),
+    serialized with short keys to keep shared-store entries small. In batch
+    mode the first video uses the file fields and the rest are kept in
+    extra as [file_id, file_unique_id, duration, size] lists.
+    """
+
+    KEYS = {
+        'file_id': 'f',
+        'file_unique_id': 'u',
+        'duration': 'd',
+        'size': 's',
+        'caption': 'c',
+        'waiting_for_caption': 'w',
+        'batch': 'b',
+        'extra': 'x',
+        'scheduled_at': 't'
+    }
+
+    def __init__(self, file_id=None, file_unique_id=None, duration=None, size=None,
+                 caption=None, waiting_for_caption=False, batch=False, extra=None,
+                 scheduled_at=None):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.duration = duration
+        self.size = size
+        self.caption = caption
+        self.waiting_for_caption = waiting_for_caption
+        self.batch = batch
+        self.extra = extra or []
+        self.scheduled_at = scheduled_at
+
+    @classmethod
+    def from_video(cls, video):
+        return cls(
+            video.file_id,
+            file_unique_id=getattr(video, 'file_unique_id', None),
+            duration=getattr(video, 'duration', None),
+            size=getattr(video, 'file_size', None)
+        )
+
+    def add_video(self, video):
+        """Add a video to a batch session"""
+        if self.file_id is None:
+            added = Session.from_video(video)
+            self.file_id = added.file_id
+            self.file_unique_id = added.file_unique_id
+            self.duration = added.duration
+            self.size = added.size
+        else:
+            self.extra.append([
+                video.file_id,
+                getattr(video, 'file_unique_id', None),
+                getattr(video, 'duration', None),
+                getattr(video, 'file_size', None)
+            ])
+
+    def videos(self):
+        """One single-video Session per video in this session"""
+        if self.file_id is None:
+            return []
+        first = Session(self.file_id, self.file_unique_id, self.duration, self.size)
+        return [first] + [Session(*entry) for entry in self.extra]
+
+    def to_dict(self):
+        return {
+            short: getattr(self, name)
+            for name, short in self.KEYS.items()
+            if getattr(self, name) not in (None, False, [])
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[short] for name, short in cls.KEYS.items() if short in data})
+
+
+class MemorySessionStore:
+    """Process-local session store bounded by size (LRU) and TTL"""
+
+    # Calls are in-memory and safe to make on the event loop
+    remote = False
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or Config.SESSION_MAX_SIZE
+        self.ttl = ttl or Config.SESSION_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Get a user's session, or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return Session.from_dict(json.loads(raw))
+
+    def set(self, user_id, session):
+        """Store a session and restart its TTL"""
+        raw = json.dumps(session.to_dict(), separators=(',', ':'))
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, raw)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def take(self, user_id):
+        """Remove and return a user's session in one step, or None"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return Session.from_dict(json.loads(entry[1]))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisSessionStore:
+    """Session store shared between bot processes through Redis"""
+
+    # Every call is a network round trip; callers on an event loop offload it
+    remote = True
+
+    def __init__(self, client, ttl=None):
+        self.ttl = ttl or Config.SESSION_TTL
+        self.backend = RedisCacheBackend(client, prefix='instaposter:session:')
+
+    def get(self, user_id):
+        data = self.backend.get(user_id)
+        return Session.from_dict(data) if data is not None else None
+
+    def set(self, user_id, session):
+        self.backend.set(user_id, session.to_dict(), self.ttl)
+
+    def delete(self, user_id):
+        self.backend.delete(user_id)
+
+    def take(self, user_id):
+        data = self.backend.take(user_id)
+        return Session.from_dict(data) if data is not None else None
+
+
+def create_session_store(redis_client=None):
+    """Build the session store selected by SESSION_STORE"""
+    if Config.SESSION_STORE != 'redis':
+        return MemorySessionStore()
+    if redis_client is None:
+        # Optional dependency, only needed for shared sessions
+        import redis
+        redis_client = redis.Redis.from_url(Config.REDIS_URL)
+    return RedisSessionStore(redis_client)
@@ -1,27 +1,78 @@
+import asyncio
 import os
+import re
 import secrets
-import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from config import Config
-from database import Database
-from instagram_client import InstagramClient
+from components import components
+from async_database import AsyncDatabase
+from instagram_client import AsyncInstagramClient
+from job_queue import PublishJob
+from media_store import MediaStore
+from ingest import VideoIngest
+from media_cache import MediaCache
+from metrics import STAGE_SECONDS, UPLOAD_ERRORS
+from oauth_states import OAuthStateStore
+from notifier import PublishNotifier
+from preprocess import Preprocessor
+from publisher import Publisher
+from session_store import Session, create_session_store
+from token_manager import TokenManager
+
+
+def parse_schedule_time(text, now=None):
+    """Parse '+30m', '+2h', '+1d' or 'YYYY-MM-DD HH:MM' (UTC) into epoch seconds"""
+    now = now or time.time()
+    text = text.strip()
+    match = re.fullmatch(r'\+(\d+)\s*([mhd])', text)
+    if match:
+        return now + int(match.group(1)) * {'m': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M'):
+        try:
+            return datetime.strptime(text, fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return None
+
+
+def format_schedule_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+
 
 class TelegramBot:
-    def __init__(self, db, instagram_client):
-        self.db = db
+    def __init__(self, db, instagram_client, publisher=None, media_store=None, oauth_states=None,
+                 run_workers=True, sessions=None, token_manager=None):
+        self.db = db if isinstance(db, AsyncDatabase) else AsyncDatabase(db)
+        self.oauth_states = oauth_states or OAuthStateStore(self.db.db)
         self.instagram_client = instagram_client
-        self.user_videos = {}  # Store videos temporarily
-        self.user_captions = {}  # Store captions temporarily
+        self.token_manager = token_manager or TokenManager(self.db.db, instagram_client)
+        self.media_store = media_store or MediaStore()
+        self.media_cache = MediaCache(self.media_store)
+        self.ingest = VideoIngest(self.media_store, self.media_cache)
+        self.preprocessor = Preprocessor()
+        self.publisher = publisher or Publisher(
+            AsyncInstagramClient(),
+            queue=components.job_queue,
+            media_cache=self.media_cache
+        )
+        # When False, jobs are only enqueued here and run by worker.py processes
+        self.run_workers = run_workers
+        self.application = None
+        self._reaper = None
+        # Pending video/caption per user; shared between processes when
+        # SESSION_STORE=redis
+        self.sessions = sessions or create_session_store()
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
         
-        # Create user if not exists
-        db_user = self.db.get_user(user.id)
-        if not db_user:
-            self.db.create_user(user.id, user.username)
+        # Create user if not exists (idempotent, safe on repeated /start)
+        await self.db.upsert_user(user.id, user.username)
         
         welcome_message = f"""
 🎬 Welcome to Instagram Reels Bot!
@@ -30,8 +81,12 @@ Hi {user.first_name}! I can help you post videos as Instagram Reels.
 
 📋 Available Commands:
 /connect - Connect your Instagram account
+/addaccount - Link another Instagram account
+/accounts - List linked accounts
 /status - Check connection status
 /disconnect - Disconnect Instagram account
+/batch - Post several videos at once
+/schedule - Publish later
 /help - Show this help message
 
 🎥 To post a reel:
@@ -48,18 +103,38 @@ Let's get started! Use /connect to link your Instagram account.
         """Handle /connect command"""
         user_id = update.effective_user.id
         
-        # Check if already connected
-        db_user = self.db.get_user(user_id)
-        if db_user and db_user.is_connected:
+        # Check if already connected; oauth_states references users, so make
+        # sure the row exists for users who never sent /start
+        db_user = await self.db.get_user(user_id)
+        if not db_user:
+            db_user = await self.db.upsert_user(user_id, update.effective_user.username)
+        expired = bool(db_user) and self.token_manager.is_expired(
+            {'token_expires_at': db_user.get('instagram_token_expires_at')}
+        )
+        if db_user and db_user.get('is_connected') and not expired:
             await update.message.reply_text(
-                f"✅ You're already connected to Instagram as @{db_user.instagram_username}\n"
-                "Use /disconnect if you want to connect a different account."
+                f"✅ You're already connected to Instagram as @{db_user['instagram_username']}\n"
+                "Use /addaccount to link another account, or /disconnect to start over."
             )
             return
         
+        await self._send_connect_link(update, user_id)
+    
+    async def add_account(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /addaccount command"""
+        user_id = update.effective_user.id
+        
+        db_user = await self.db.get_user(user_id)
+        if not db_user:
+            await self.db.upsert_user(user_id, update.effective_user.username)
+        
+        await self._send_connect_link(update, user_id)
+    
+    async def _send_connect_link(self, update, user_id):
+        """Send an Instagram OAuth link bound to a fresh state"""
         # Generate state for OAuth
         state = secrets.token_urlsafe(32)
-        self.db.store_oauth_state(state, user_id)
+        await self.db.run(self.oauth_states.store, state, user_id)
         
         # Generate Instagram OAuth URL
         auth_url = self.instagram_client.generate_auth_url(state)
@@ -74,20 +149,57 @@ Let's get started! Use /connect to link your Instagram account.
             reply_markup=reply_markup
         )
     
+    async def _accounts(self, user_id, db_user):
+        """Linked Instagram accounts, primary first"""
+        accounts = []
+        if db_user and db_user.get('is_connected'):
+            accounts.append({
+                'telegram_user_id': user_id,
+                'instagram_id': db_user['instagram_id'],
+                'instagram_username': db_user['instagram_username'],
+                'access_token': db_user['instagram_access_token'],
+                'token_expires_at': db_user.get('instagram_token_expires_at')
+            })
+        for account in await self.db.get_instagram_accounts(user_id):
+            if all(account['instagram_id'] != known['instagram_id'] for known in accounts):
+                accounts.append(account)
+        return accounts
+    
+    async def accounts(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /accounts command"""
+        user_id = update.effective_user.id
+        db_user = await self.db.get_user(user_id)
+        accounts = await self._accounts(user_id, db_user)
+        
+        if not accounts:
+            await update.message.reply_text(
+                "❌ No Instagram accounts linked.\n"
+                "Use /connect to link your Instagram account."
+            )
+            return
+        
+        lines = [f"{'⭐' if index == 0 else '•'} @{account['instagram_username']}"
+                 for index, account in enumerate(accounts)]
+        await update.message.reply_text(
+            f"📱 Linked Instagram accounts ({len(accounts)}):\n" + "\n".join(lines) + "\n\n"
+            "⭐ is used by 🚀 Post Now; 📣 posts to all of them.\n"
+            "Use /addaccount to link another account."
+        )
+    
     async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command"""
         user_id = update.effective_user.id
-        db_user = self.db.get_user(user_id)
+        db_user = await self.db.get_user(user_id)
         
         if not db_user:
             await update.message.reply_text("❌ You haven't started using the bot yet. Use /start first.")
             return
         
-        if db_user.is_connected:
+        if db_user.get('is_connected'):
             await update.message.reply_text(
                 f"✅ Connected to Instagram\n"
-                f"📱 Account: @{db_user.instagram_username}\n"
-                f"🔗 Connected on: {db_user.last_used.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+                f"📱 Account: @{db_user['instagram_username']}\n"
+                f"🔗 Connected on: {(db_user.get('last_used') or '')[:19].replace('T', ' ')}\n\n"
                 f"You can now send videos and use /post to share them as reels!"
             )
         else:
@@ -99,9 +211,9 @@ Let's get started! Use /connect to link your Instagram account.
     async def disconnect(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /disconnect command"""
         user_id = update.effective_user.id
-        db_user = self.db.get_user(user_id)
+        db_user = await self.db.get_user(user_id)
         
-        if not db_user or not db_user.is_connected:
+        if not db_user or not db_user.get('is_connected'):
             await update.message.reply_text("❌ You're not connected to any Instagram account.")
             return
         
@@ -114,7 +226,7 @@ Let's get started! Use /connect to link your Instagram account.
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(
-            f"⚠️ Are you sure you want to disconnect from @{db_user.instagram_username}?",
+            f"⚠️ Are you sure you want to disconnect from @{db_user['instagram_username']}?",
             reply_markup=reply_markup
         )
     
@@ -123,8 +235,8 @@ Let's get started! Use /connect to link your Instagram account.
         user_id = update.effective_user.id
         
         # Check if user is connected
-        db_user = self.db.get_user(user_id)
-        if not db_user or not db_user.is_connected:
+        db_user = await self.db.get_user(user_id)
+        if not db_user or not db_user.get('is_connected'):
             await update.message.reply_text(
                 "❌ Please connect your Instagram account first using /connect"
             )
@@ -145,27 +257,145 @@ Let's get started! Use /connect to link your Instagram account.
                 )
                 return
         
-        # Store video temporarily
-        self.user_videos[user_id] = video
+        # Don't download anything for an account that can't post anymore
+        if self.token_manager.is_expired({'token_expires_at': db_user.get('instagram_token_expires_at')}):
+            await update.message.reply_text(
+                "⚠️ Your Instagram session has expired. Please /connect again."
+            )
+            return
+        
+        session = await self._session('get', user_id)
+        if session is not None and session.batch and not session.waiting_for_caption:
+            await self._add_batch_video(update, context, user_id, session, video)
+            return
+        
+        # Store video temporarily and start downloading it while the user
+        # writes a caption
+        if session is not None:
+            self._discard_session(user_id, session)
+        session = Session.from_video(video)
+        await self._session('set', user_id, session)
+        self.ingest.prefetch(user_id, context.bot, session)
         
         await update.message.reply_text(
             "📹 Video received! Now use /post to start posting process."
         )
     
+    async def _add_batch_video(self, update, context, user_id, session, video):
+        """Add a video to the user's batch and start downloading it"""
+        videos = session.videos()
+        if len(videos) >= Config.BATCH_MAX_VIDEOS:
+            await update.message.reply_text(
+                f"❌ A batch can hold up to {Config.BATCH_MAX_VIDEOS} videos. Use /post to continue."
+            )
+            return
+        unique_id = getattr(video, 'file_unique_id', None)
+        if unique_id and any(entry.file_unique_id == unique_id for entry in videos):
+            await update.message.reply_text("ℹ️ This video is already in the batch.")
+            return
+        
+        session.add_video(video)
+        await self._session('set', user_id, session)
+        index = len(videos)
+        self.ingest.prefetch(self._ingest_key(user_id, index), context.bot, session.videos()[index])
+        
+        await update.message.reply_text(
+            f"📹 Video {index + 1} added to the batch. Send more, or use /post when you're done."
+        )
+    
+    async def _session(self, method, *args):
+        """Session store call, run in the database pool if the store is remote"""
+        func = getattr(self.sessions, method)
+        if self.sessions.remote:
+            return await self.db.run(func, *args)
+        return func(*args)
+
+    @staticmethod
+    def _ingest_key(user_id, index):
+        """Prefetch key of a session's video (the first one is keyed by user id)"""
+        return user_id if index == 0 else (user_id, index)
+    
+    def _discard_session(self, user_id, session):
+        """Cancel and drop prefetched downloads of a session's videos"""
+        for index in range(max(len(session.videos()), 1)):
+            self.ingest.discard(self._ingest_key(user_id, index))
+    
+    async def batch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /batch command"""
+        user_id = update.effective_user.id
+        
+        # Check if user is connected
+        db_user = await self.db.get_user(user_id)
+        if not db_user or not db_user.get('is_connected'):
+            await update.message.reply_text(
+                "❌ Please connect your Instagram account first using /connect"
+            )
+            return
+        
+        session = await self._session('get', user_id)
+        if session is not None:
+            self._discard_session(user_id, session)
+        await self._session('set', user_id, Session(batch=True))
+        
+        await update.message.reply_text(
+            f"📦 Batch mode: send up to {Config.BATCH_MAX_VIDEOS} videos, then use /post.\n"
+            "They'll share one caption and can go to all your linked accounts at once."
+        )
+    
+    async def schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /schedule command"""
+        user_id = update.effective_user.id
+        
+        session = await self._session('get', user_id)
+        if session is None or not session.videos():
+            await update.message.reply_text(
+                "❌ Please send a video file first, then use /schedule"
+            )
+            return
+        
+        text = ' '.join(context.args or [])
+        if text.lower() in ('off', 'now', 'cancel'):
+            session.scheduled_at = None
+            await self._session('set', user_id, session)
+            await update.message.reply_text("🕒 Schedule cleared, the post will go out right away.")
+            return
+        
+        scheduled_at = parse_schedule_time(text) if text else None
+        if scheduled_at is None:
+            await update.message.reply_text(
+                "🕒 Usage: /schedule YYYY-MM-DD HH:MM (UTC) or /schedule +30m, +2h, +1d\n"
+                "Use /schedule off to post right away."
+            )
+            return
+        if scheduled_at <= time.time() or scheduled_at > time.time() + Config.SCHEDULE_MAX_DAYS * 86400:
+            await update.message.reply_text(
+                f"❌ Pick a time in the future, at most {Config.SCHEDULE_MAX_DAYS} days ahead."
+            )
+            return
+        
+        session.scheduled_at = scheduled_at
+        await self._session('set', user_id, session)
+        
+        await update.message.reply_text(
+            f"⏰ Will publish at {format_schedule_time(scheduled_at)}.\n"
+            "Use /post to write the caption (or confirm it if you already did)."
+        )
+    
     async def post(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /post command"""
         user_id = update.effective_user.id
         
         # Check if user is connected
-        db_user = self.db.get_user(user_id)
-        if not db_user or not db_user.is_connected:
+        db_user = await self.db.get_user(user_id)
+        if not db_user or not db_user.get('is_connected'):
             await update.message.reply_text(
                 "❌ Please connect your Instagram account first using /connect"
             )
             return
         
         # Check if user has uploaded a video
-        if user_id not in self.user_videos:
+        session = await self._session('get', user_id)
+        if session is None or not session.videos():
             await update.message.reply_text(
                 "❌ Please send a video file first, then use /post"
             )
@@ -180,31 +410,46 @@ Let's get started! Use /connect to link your Instagram account.
         )
         
         # Set user in caption waiting state
-        context.user_data['waiting_for_caption'] = True
+        session.waiting_for_caption = True
+        await self._session('set', user_id, session)
     
     async def handle_caption(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle caption input"""
         user_id = update.effective_user.id
         
-        if not context.user_data.get('waiting_for_caption'):
+        session = await self._session('get', user_id)
+        if session is None or not session.waiting_for_caption:
             return  # Not waiting for caption
         
         caption = update.message.text
-        self.user_captions[user_id] = caption
+        session.caption = caption
         
         # Clear waiting state
-        context.user_data['waiting_for_caption'] = False
+        session.waiting_for_caption = False
+        await self._session('set', user_id, session)
         
         # Show confirmation
+        db_user = await self.db.get_user(user_id)
+        accounts = await self._accounts(user_id, db_user)
+        post_label = "⏰ Schedule" if session.scheduled_at else "🚀 Post Now"
         keyboard = [
             [
-                InlineKeyboardButton("🚀 Post Now", callback_data="post_confirm"),
+                InlineKeyboardButton(post_label, callback_data="post_confirm"),
                 InlineKeyboardButton("❌ Cancel", callback_data="post_cancel")
             ]
         ]
+        if len(accounts) > 1:
+            keyboard.insert(1, [
+                InlineKeyboardButton(f"📣 All {len(accounts)} accounts", callback_data="post_all")
+            ])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         preview_text = f"📋 Ready to post!\n\n📝 Caption:\n{caption[:200]}{'...' if len(caption) > 200 else ''}"
+        count = len(session.videos())
+        if count > 1:
+            preview_text += f"\n\n📦 Videos: {count}"
+        if session.scheduled_at:
+            preview_text += f"\n\n⏰ Publishes at {format_schedule_time(session.scheduled_at)}"
         
         await update.message.reply_text(
             preview_text,
@@ -221,99 +466,224 @@ Let's get started! Use /connect to link your Instagram account.
         
         if data == "disconnect_yes":
             # Disconnect user
-            db_user = self.db.get_user(user_id)
+            db_user = await self.db.get_user(user_id)
             if db_user:
-                self.db.update_user_instagram(user_id, None, None, None)
+                await self.db.update_user_instagram(user_id, None, None, None)
+                await self.db.delete_instagram_accounts(user_id)
             
             await query.edit_message_text("✅ Successfully disconnected from Instagram.")
         
         elif data == "disconnect_no":
             await query.edit_message_text("❌ Disconnection cancelled.")
         
-        elif data == "post_confirm":
-            await self.process_reel_upload(query, user_id)
+        elif data in ("post_confirm", "post_all"):
+            # Take the session before anything else awaits, so a second tap
+            # on the button finds nothing instead of posting again
+            session = await self._session('take', user_id)
+            if session is None:
+                await query.edit_message_text("❌ Missing required data. Please try again.")
+                return
+            # Downloading and transcoding can take minutes; updates are handled
+            # one at a time, so do it in a task and keep serving other users
+            context.application.create_task(
+                self.process_reel_upload(
+                    query, user_id, context.bot, session, all_accounts=data == "post_all"
+                ),
+                update=update
+            )
         
         elif data == "post_cancel":
             # Clean up
-            self.user_videos.pop(user_id, None)
-            self.user_captions.pop(user_id, None)
+            session = await self._session('get', user_id)
+            await self._session('delete', user_id)
+            if session is not None:
+                self._discard_session(user_id, session)
+            else:
+                self.ingest.discard(user_id)
             
             await query.edit_message_text("❌ Post cancelled.")
     
-    async def process_reel_upload(self, query, user_id):
-        """Process the actual reel upload to Instagram"""
+    async def process_reel_upload(self, query, user_id, bot, session, all_accounts=False):
+        """Download the videos and hand one job per video and account to the background publisher.
+
+        The session has already been taken out of the store; it is put back
+        if nothing gets enqueued, so the user can confirm again.
+        """
         await query.edit_message_text("🔄 Uploading your reel to Instagram...")
         
+        enqueued = False
         try:
             # Get user data
-            db_user = self.db.get_user(user_id)
-            video = self.user_videos.get(user_id)
-            caption = self.user_captions.get(user_id)
+            db_user = await self.db.get_user(user_id)
+            caption = session.caption
             
-            if not all([db_user, video, caption]):
+            if not all([db_user, caption]):
+                await self._session('set', user_id, session)
                 await query.edit_message_text("❌ Missing required data. Please try again.")
                 return
             
-            # Download video file
-            video_file = await video.get_file()
+            accounts = await self._accounts(user_id, db_user)
+            if not all_accounts:
+                accounts = accounts[:1]
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-                await video_file.download_to_drive(temp_file.name)
-                video_path = temp_file.name
-            
-            # For Instagram API, we need to upload video to a publicly accessible URL
-            # This is a simplified version - in production, you'd upload to cloud storage
-            # For now, we'll use a placeholder
-            public_video_url = f"{Config.REDIRECT_URI.replace('/oauth/callback', '')}/video/{user_id}"
+            # Pre-flight: refresh tokens that expire before the post goes out,
+            # and skip accounts whose session is gone before downloading anything
+            valid = await asyncio.gather(*(
+                self.db.run(self.token_manager.check, account, session.scheduled_at)
+                for account in accounts
+            ))
+            expired = [account for account, ok in zip(accounts, valid) if not ok]
+            accounts = [account for account, ok in zip(accounts, valid) if ok]
+            if expired:
+                UPLOAD_ERRORS.inc(len(expired), error_class='TokenExpired')
+            if not accounts:
+                self._discard_session(user_id, session)
+                await query.edit_message_text(
+                    "⚠️ Your Instagram session has expired. Please /connect again."
+                    if expired else
+                    "❌ Please connect your Instagram account first using /connect"
+                )
+                return
             
-            # Post to Instagram
-            result = self.instagram_client.post_reel(
-                db_user.instagram_access_token,
-                public_video_url,
-                caption
+            # Videos are streamed into the media store (usually already
+            # prefetched) and validated concurrently
+            videos = session.videos()
+            results = await asyncio.gather(
+                *(self._prepare_video(user_id, index, bot, video) for index, video in enumerate(videos)),
+                return_exceptions=True
             )
             
-            # Clean up
-            os.unlink(video_path)
-            self.user_videos.pop(user_id, None)
-            self.user_captions.pop(user_id, None)
+            ready, errors = [], []
+            for index, result in enumerate(results, 1):
+                label = f"Video {index}: " if len(videos) > 1 else ""
+                if isinstance(result, Exception):
+                    print(f"Upload error: {result}")
+                    UPLOAD_ERRORS.inc(error_class=type(result).__name__)
+                    errors.append(f"{label}could not be downloaded")
+                elif not result[1]['ok']:
+                    UPLOAD_ERRORS.inc(error_class='InvalidVideo')
+                    errors.extend(f"{label}{error}" for error in result[1]['errors'])
+                else:
+                    ready.append((videos[index - 1], *result))
             
-            if result['success']:
-                # Save to history
-                self.db.add_post_history(
-                    user_id, 
-                    result['media_id'], 
-                    caption,
-                    success=True
+            if not ready:
+                if any(isinstance(result, Exception) for result in results):
+                    # A failed download may succeed on the next try
+                    await self._session('set', user_id, session)
+                await query.edit_message_text(
+                    "❌ This video can't be posted as a reel:\n- "
+                    + "\n- ".join(errors)
+                    + "\n\nPlease send an MP4 video (H.264/AAC, 3-90 seconds)."
                 )
+                return
+            
+            # A single reel reports back by editing this message; batches get
+            # one message per published reel
+            single = len(ready) * len(accounts) == 1
+            scheduled_at = session.scheduled_at
+            jobs = []
+            for video, media, checked in ready:
+                public_video_url = self.media_store.signed_url(media.media_id, not_before=scheduled_at)
+                cover_url = None
+                if checked.get('cover_path'):
+                    cover_url = self.media_store.signed_url(
+                        media.media_id, kind='cover', not_before=scheduled_at
+                    )
                 
-                await query.edit_message_text(
-                    f"🎉 Successfully posted your reel!\n\n"
-                    f"📱 Check your Instagram: @{db_user.instagram_username}\n"
-                    f"🆔 Media ID: {result['media_id']}"
+                media_jobs = []
+                for account in accounts:
+                    media_jobs.append(PublishJob(
+                        user_id,
+                        account['access_token'],
+                        public_video_url,
+                        caption,
+                        video_path=media.path,
+                        chat_id=query.message.chat_id,
+                        message_id=query.message.message_id if single else None,
+                        instagram_username=account['instagram_username'],
+                        duration=checked.get('duration') or video.duration,
+                        size=checked.get('size') or media.size,
+                        cover_url=cover_url,
+                        scheduled_at=scheduled_at,
+                        id=uuid.uuid4().hex
+                    ))
+                # The download's reference becomes one reference per job, held
+                # here on the host that owns the file until the job ends
+                await asyncio.to_thread(
+                    self.media_cache.hold, media.media_id, [job.id for job in media_jobs]
                 )
-            else:
-                # Save error to history
-                self.db.add_post_history(
-                    user_id, 
-                    None, 
-                    caption,
-                    success=False,
-                    error_message=result['error']
+                await asyncio.to_thread(self.ingest.release, media)
+                jobs.extend(media_jobs)
+            
+            # Jobs are interleaved across accounts, so workers fan out over
+            # them while each account's rate limits are enforced per token
+            enqueued = True
+            await asyncio.gather(*(self.publisher.enqueue(job) for job in jobs))
+            
+            usernames = ', '.join(f"@{account['instagram_username']}" for account in accounts)
+            if scheduled_at:
+                text = (
+                    f"⏰ Scheduled {len(ready)} reel(s) for {format_schedule_time(scheduled_at)} "
+                    f"on {usernames}."
                 )
-                
-                await query.edit_message_text(
-                    f"❌ Failed to post reel:\n{result['error']}\n\n"
-                    f"Please try again later or contact support."
+            elif single:
+                text = (
+                    "⏳ Your reel is being processed by Instagram.\n"
+                    "I'll update this message as soon as it's published."
                 )
+            else:
+                text = (
+                    f"⏳ Publishing {len(ready)} reel(s) to {usernames}.\n"
+                    "I'll send a message as each one is published."
+                )
+            errors.extend(
+                f"@{account['instagram_username']}: session expired, use /addaccount to reconnect"
+                for account in expired
+            )
+            if errors:
+                text += "\n\n⚠️ Skipped:\n- " + "\n- ".join(errors)
+            await query.edit_message_text(text)
         
         except Exception as e:
             print(f"Upload error: {e}")
+            UPLOAD_ERRORS.inc(error_class=type(e).__name__)
+            if not enqueued:
+                await self._session('set', user_id, session)
             await query.edit_message_text(
                 "❌ An error occurred while uploading. Please try again later."
             )
     
+    async def _prepare_video(self, user_id, index, bot, video):
+        """Fetch and validate (transcoding if needed) one video; returns (media, checked)"""
+        media = await self.ingest.fetch(self._ingest_key(user_id, index), bot, video)
+        
+        # Validate (and transcode if needed) locally before Instagram sees it.
+        # A transcode is written under a new media id; rewriting the original
+        # would leave its cache entry's hash and size stale
+        transcode_id = uuid.uuid4().hex
+        try:
+            with STAGE_SECONDS.time(stage='preprocess'):
+                checked = await self.preprocessor.process(
+                    media.path,
+                    self.media_store.cover_path_for(media.media_id),
+                    self.media_store.path_for(transcode_id),
+                    self.media_store.cover_path_for(transcode_id)
+                )
+        except Exception:
+            await asyncio.to_thread(self.ingest.release, media)
+            raise
+        if not checked['ok']:
+            await asyncio.to_thread(self.ingest.release, media)
+        elif checked['transcoded']:
+            media = await asyncio.to_thread(
+                self.ingest.replace, media, transcode_id, checked['sha256'], checked['size']
+            )
+            if media.media_id != transcode_id:
+                # Identical to an earlier transcode, whose cover is reused
+                cover_path = self.media_store.cover_path_for(media.media_id)
+                checked['cover_path'] = cover_path if await asyncio.to_thread(os.path.exists, cover_path) else None
+        return media, checked
+    
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
         help_text = """
@@ -325,6 +695,10 @@ Let's get started! Use /connect to link your Instagram account.
 /status - Check connection status  
 /disconnect - Disconnect Instagram account
 /post - Start posting process (after sending video)
+/addaccount - Link another Instagram account
+/accounts - List linked accounts
+/batch - Post several videos with one caption
+/schedule - Publish at a set time (e.g. /schedule +2h)
 /help - Show this help message
 
 📱 How to post a reel:
@@ -334,6 +708,11 @@ Let's get started! Use /connect to link your Instagram account.
 4️⃣ Enter your caption
 5️⃣ Confirm and post!
 
+📦 Batch and scheduled posts:
+- /batch, then send several videos and use /post
+- /schedule 2025-01-31 18:00 (UTC) before confirming
+- 📣 posts to every linked account at once
+
 ⚠️ Requirements:
 - Video must be 3-90 seconds long
 - MP4 format recommended
@@ -344,9 +723,46 @@ Let's get started! Use /connect to link your Instagram account.
         
         await update.message.reply_text(help_text)
 
+    async def startup(self, application):
+        """Start publish workers and the media reaper; jobs interrupted by a restart resume here"""
+        if self.run_workers:
+            self.publisher.on_complete = PublishNotifier(self.db, application.bot)
+            await self.publisher.start()
+        self._reaper = asyncio.get_running_loop().create_task(self._reap_media())
+
+    async def _reap_media(self):
+        """Release media of finished jobs (wherever they ran) and of abandoned prefetches"""
+        while True:
+            await asyncio.sleep(Config.MEDIA_REAP_INTERVAL)
+            try:
+                self.ingest.discard_stale(Config.SESSION_TTL)
+                released = await asyncio.to_thread(self.media_cache.reap, self.publisher.queue)
+                if released:
+                    print(f"Released media of {released} finished publish jobs")
+            except Exception as e:
+                print(f"Media reaper error: {e}")
+
+    async def shutdown(self, application):
+        """Let in-flight publish jobs finish before the application stops"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await self.publisher.shutdown()
+        await self.ingest.close()
+        self.preprocessor.shutdown()
+        self.db.shutdown()
+
     def create_application(self):
         """Create and configure the Telegram application"""
-        application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(Config.TELEGRAM_BOT_TOKEN)
+            .base_url(Config.TELEGRAM_API_URL)
+            .base_file_url(Config.TELEGRAM_FILE_URL)
+            .post_init(self.startup)
+            .post_shutdown(self.shutdown)
+            .build()
+        )
+        self.application = application
         
         # Add handlers
         application.add_handler(CommandHandler("start", self.start))
@@ -354,6 +770,10 @@ Let's get started! Use /connect to link your Instagram account.
         application.add_handler(CommandHandler("status", self.status))
         application.add_handler(CommandHandler("disconnect", self.disconnect))
         application.add_handler(CommandHandler("post", self.post))
+        application.add_handler(CommandHandler("addaccount", self.add_account))
+        application.add_handler(CommandHandler("accounts", self.accounts))
+        application.add_handler(CommandHandler("batch", self.batch))
+        application.add_handler(CommandHandler("schedule", self.schedule))
         application.add_handler(CommandHandler("help", self.help_command))
         
         # Handle videos
@@ -372,29 +792,26 @@ Let's get started! Use /connect to link your Instagram account.
         application.add_handler(CallbackQueryHandler(self.handle_callback))
         
         return application
-# ... rest of the file remains same until the main section ...
-# Define InstagramClient class (outside main block)
-class InstagramClient:
-    def __init__(self, app_id, app_secret, redirect_uri):
-        self.app_id = app_id
-        self.app_secret = app_secret
-        self.redirect_uri = redirect_uri
 
 
 if __name__ == "__main__":
-    # Initialize database with Supabase
-    db = Database(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+    # Telegram ingress; with ROLE=ingress publishing is left to worker.py
+    if Config.TELEGRAM_MODE == 'webhook':
+        raise SystemExit("TELEGRAM_MODE=webhook: updates are received by the web app (app.py)")
     
-    # Initialize InstagramClient
-    instagram_client = InstagramClient(
-        Config.INSTAGRAM_APP_ID,
-        Config.INSTAGRAM_APP_SECRET,
-        Config.REDIRECT_URI
+    # Initialize Telegram bot with the shared clients
+    bot = TelegramBot(
+        components.database,
+        components.instagram_client,
+        media_store=components.media_store,
+        oauth_states=components.oauth_states,
+        sessions=components.sessions,
+        token_manager=components.token_manager,
+        run_workers=Config.ROLE != 'ingress'
     )
-    
-    # Initialize Telegram bot
-    bot = TelegramBot(db, instagram_client)
     application = bot.create_application()
+    if Config.STARTUP_PROFILE:
+        print(components.profile())
     
     # Start the bot
     application.run_polling()
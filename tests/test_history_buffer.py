@@ -0,0 +1,85 @@
+import glob
+import json
+import os
+from config import Config
+from history_buffer import HistoryBuffer
+
+
+class FakeDatabase:
+    """Rejects batches containing a row marked bad"""
+
+    def __init__(self):
+        self.inserted = []
+        self.down = False
+
+    def add_post_history_batch(self, rows):
+        if self.down or any(row.get('bad') for row in rows):
+            raise RuntimeError('insert failed')
+        self.inserted.extend(rows)
+
+
+def make_buffer(tmp_path, db):
+    return HistoryBuffer(db, batch_size=10, flush_interval=0.001, spool_dir=str(tmp_path / 'spool'))
+
+
+def spooled(tmp_path):
+    return sorted(glob.glob(str(tmp_path / 'spool' / '*.json')))
+
+
+def test_failed_batch_is_spooled_and_retried(tmp_path):
+    db = FakeDatabase()
+    buffer = make_buffer(tmp_path, db)
+    db.down = True
+    buffer._rows = [{'id': 1}]
+    buffer.flush()
+    assert len(spooled(tmp_path)) == 1
+
+    db.down = False
+    buffer.flush()
+    assert db.inserted == [{'id': 1}]
+    assert spooled(tmp_path) == []
+
+
+def test_bad_batch_does_not_block_later_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'HISTORY_SPOOL_MAX_ATTEMPTS', 3)
+    db = FakeDatabase()
+    buffer = make_buffer(tmp_path, db)
+    buffer._spool([{'id': 1, 'bad': True}], retry_at=1)
+    buffer._spool([{'id': 2}], retry_at=2)
+
+    buffer.flush()
+    assert db.inserted == [{'id': 2}]
+
+    for _ in range(3):
+        for path in spooled(tmp_path):
+            # Make the backed-off batch due again
+            os.rename(path, os.path.join(os.path.dirname(path), '0.000000-' + os.path.basename(path).split('-')[1]))
+        buffer.flush()
+    assert spooled(tmp_path) == []
+    failed = glob.glob(str(tmp_path / 'spool' / 'failed' / '*.json'))
+    assert len(failed) == 1
+    with open(failed[0]) as f:
+        assert json.load(f)['rows'] == [{'id': 1, 'bad': True}]
+
+
+def test_claimed_batch_is_skipped_by_other_processes(tmp_path):
+    db = FakeDatabase()
+    buffer = make_buffer(tmp_path, db)
+    buffer._spool([{'id': 1}], retry_at=1)
+    path = spooled(tmp_path)[0]
+
+    assert buffer._claim(path) is not None
+    assert buffer._claim(path) is None
+    buffer.flush()
+    assert db.inserted == []
+
+
+def test_legacy_spool_files_are_retried(tmp_path):
+    db = FakeDatabase()
+    buffer = make_buffer(tmp_path, db)
+    os.makedirs(tmp_path / 'spool')
+    with open(tmp_path / 'spool' / '1.000000-abcd1234.json', 'w') as f:
+        json.dump([{'id': 1}], f)
+
+    buffer.flush()
+    assert db.inserted == [{'id': 1}]
@@ -0,0 +1,21 @@
+from ingest import IngestedMedia, VideoIngest
+from media_cache import MediaCache
+from media_store import MediaStore
+
+
+def test_replace_registers_transcode_and_moves_the_reference(tmp_path):
+    store = MediaStore(root=str(tmp_path / 'media'), secret='secret')
+    cache = MediaCache(store, path=str(tmp_path / 'cache.db'), max_bytes=1000)
+    ingest = VideoIngest(store, cache)
+    for media_id, size in (('original', 10), ('transcode', 20)):
+        with open(store.path_for(media_id), 'wb') as f:
+            f.write(b'x' * size)
+    cache.add('original', 'hash-original', 10, file_unique_id='unique')
+
+    media = ingest.replace(IngestedMedia('original', store.path_for('original'), 'hash-original', 10),
+                           'transcode', 'hash-transcode', 20)
+
+    assert (media.media_id, media.sha256, media.size) == ('transcode', 'hash-transcode', 20)
+    rows = dict(cache._conn.execute("SELECT media_id, refcount FROM media_cache"))
+    assert rows == {'original': 0, 'transcode': 1}
+    assert cache.lookup('unique') == ('original', 'hash-original', 10)
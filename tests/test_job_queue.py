@@ -0,0 +1,128 @@
+import time
+import pytest
+from job_queue import JobQueue, LeaseLostError, PublishJob, QUEUED, CONTAINER_CREATED, PUBLISHED, FAILED
+
+
+def make_queue(tmp_path, lease_seconds=60):
+    return JobQueue(path=str(tmp_path / 'jobs.db'), lease_seconds=lease_seconds)
+
+
+def make_job(**fields):
+    return PublishJob(1, 'token', 'https://example.com/video.mp4', 'caption', **fields)
+
+
+def test_claim_leases_oldest_job(tmp_path):
+    queue = make_queue(tmp_path)
+    first = queue.enqueue(make_job())
+    time.sleep(0.01)
+    queue.enqueue(make_job())
+
+    job = queue.claim('worker-1')
+    assert job.id == first
+    assert job.lease_owner == 'worker-1'
+    assert job.attempts == 1
+    assert queue.get(first).lease_owner == 'worker-1'
+
+
+def test_leased_job_is_not_claimed_twice(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(make_job())
+
+    assert queue.claim('worker-1') is not None
+    assert queue.claim('worker-2') is None
+
+
+def test_expired_lease_is_reclaimed_in_recorded_state(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    job_id = queue.enqueue(make_job())
+    queue.claim('worker-1')
+    queue.mark_container_created(job_id, 'container-1')
+    time.sleep(0.1)
+
+    job = queue.claim('worker-2')
+    assert job.id == job_id
+    assert job.status == CONTAINER_CREATED
+    assert job.container_id == 'container-1'
+    assert job.attempts == 2
+    assert not queue.heartbeat(job_id, 'worker-1')
+    assert queue.heartbeat(job_id, 'worker-2')
+
+
+def test_worker_without_the_lease_cannot_record_progress(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    job_id = queue.enqueue(make_job())
+    queue.claim('worker-1')
+    time.sleep(0.1)
+    queue.claim('worker-2')
+
+    with pytest.raises(LeaseLostError):
+        queue.mark_published(job_id, 'media-1', 'worker-1')
+    queue.mark_container_created(job_id, 'container-2', 'worker-2')
+    job = queue.get(job_id)
+    assert (job.status, job.container_id) == (CONTAINER_CREATED, 'container-2')
+
+
+def test_scheduled_job_is_claimed_once_due(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue(make_job(scheduled_at=time.time() + 0.1))
+
+    assert queue.claim('worker-1') is None
+    time.sleep(0.15)
+    assert queue.claim('worker-1').id == job_id
+
+
+def test_finished_jobs_leave_the_queue(tmp_path):
+    queue = make_queue(tmp_path)
+    published = queue.enqueue(make_job())
+    failed = queue.enqueue(make_job())
+    queue.mark_published(published, 'media-1')
+    queue.mark_failed(failed, 'boom')
+
+    assert queue.depth() == 0
+    assert queue.claim('worker-1') is None
+    assert queue.get(published).status == PUBLISHED
+    assert queue.get(failed).status == FAILED
+
+
+def test_release_owned_by_hands_leases_back(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue(make_job())
+    queue.claim('proc1-0')
+    queue.release_owned_by('proc1')
+
+    job = queue.claim('proc2-0')
+    assert job.id == job_id
+    assert job.status == QUEUED
+
+
+def test_stalled_counts_due_jobs_nobody_touched(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(make_job())
+    queue.enqueue(make_job(scheduled_at=time.time() + 3600))
+    time.sleep(0.05)
+
+    assert queue.stalled(0.01) == 1
+    assert queue.stalled(60) == 0
+
+
+def test_published_since_counts_recent_posts_per_account(tmp_path):
+    queue = make_queue(tmp_path)
+    for username in ('alice', 'alice', 'bob'):
+        job_id = queue.enqueue(make_job(instagram_username=username))
+        queue.mark_published(job_id, 'media')
+    queue.enqueue(make_job(instagram_username='alice'))
+
+    assert queue.published_since('alice', time.time() - 60) == 2
+    assert queue.published_since('bob', time.time() - 60) == 1
+    assert queue.published_since('alice', time.time() + 60) == 0
+
+
+def test_deferred_job_is_not_claimed_until_due(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue(make_job())
+    queue.claim('worker-1')
+
+    queue.defer(job_id, time.time() + 60)
+    assert queue.claim('worker-2') is None
+    queue.defer(job_id, time.time() - 1)
+    assert queue.claim('worker-2').id == job_id
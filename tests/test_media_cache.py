@@ -0,0 +1,124 @@
+import os
+import pytest
+from media_cache import MediaCache
+from media_store import MediaStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(root=str(tmp_path / 'media'), secret='secret')
+
+
+def make_cache(tmp_path, store, max_bytes=100):
+    return MediaCache(store, path=str(tmp_path / 'cache.db'), max_bytes=max_bytes)
+
+
+def put(store, media_id, size):
+    with open(store.path_for(media_id), 'wb') as f:
+        f.write(b'x' * size)
+
+
+def refcount(cache, media_id):
+    row = cache._conn.execute("SELECT refcount FROM media_cache WHERE media_id = ?", (media_id,)).fetchone()
+    return row[0] if row else None
+
+
+def test_add_deduplicates_identical_content(tmp_path, store):
+    cache = make_cache(tmp_path, store)
+    put(store, 'a', 10)
+    put(store, 'b', 10)
+
+    assert cache.add('a', 'hash', 10) == 'a'
+    assert cache.add('b', 'hash', 10) == 'a'
+    assert not store.exists('b')
+    assert refcount(cache, 'a') == 2
+
+
+def test_lookup_by_file_unique_id_acquires(tmp_path, store):
+    cache = make_cache(tmp_path, store)
+    put(store, 'a', 10)
+    cache.add('a', 'hash', 10, file_unique_id='unique')
+
+    assert cache.lookup('unique') == ('a', 'hash', 10)
+    assert refcount(cache, 'a') == 2
+    assert cache.lookup('other') is None
+
+
+def test_lookup_forgets_files_removed_from_disk(tmp_path, store):
+    cache = make_cache(tmp_path, store)
+    put(store, 'a', 10)
+    cache.add('a', 'hash', 10, file_unique_id='unique')
+    os.unlink(store.path_for('a'))
+
+    assert cache.lookup('unique') is None
+    assert refcount(cache, 'a') is None
+
+
+def test_referenced_files_are_never_evicted(tmp_path, store):
+    cache = make_cache(tmp_path, store, max_bytes=15)
+    put(store, 'a', 10)
+    put(store, 'b', 10)
+    cache.add('a', 'hash-a', 10)
+    cache.add('b', 'hash-b', 10)
+
+    assert store.exists('a') and store.exists('b')
+    assert cache.total_bytes() == 20
+
+
+def test_unreferenced_files_are_evicted_oldest_first(tmp_path, store):
+    cache = make_cache(tmp_path, store, max_bytes=25)
+    for media_id in ('a', 'b', 'c'):
+        put(store, media_id, 10)
+    cache.add('a', 'hash-a', 10)
+    cache.add('b', 'hash-b', 10)
+    cache.add('c', 'hash-c', 10)
+
+    cache.release('b')
+    cache.release('a')
+
+    assert not store.exists('b')
+    assert store.exists('a') and store.exists('c')
+    assert cache.total_bytes() == 20
+
+
+class FakeQueue:
+    def __init__(self, active=()):
+        self.active_ids = set(active)
+
+    def active(self, job_ids):
+        return self.active_ids & set(job_ids)
+
+
+def held_file(tmp_path, store, job_ids):
+    cache = make_cache(tmp_path, store, max_bytes=5)
+    put(store, 'a', 10)
+    cache.add('a', 'hash-a', 10)
+    cache.hold('a', job_ids)
+    cache.release('a')
+    return cache
+
+
+def test_hold_keeps_shared_file_until_every_job_releases(tmp_path, store):
+    cache = held_file(tmp_path, store, ['job-1', 'job-2'])
+
+    assert cache.release_job('job-1')
+    assert not cache.release_job('job-1')
+    assert store.exists('a')
+    assert cache.release_job('job-2')
+    assert not store.exists('a')
+
+
+def test_reap_releases_jobs_that_are_no_longer_active(tmp_path, store):
+    cache = held_file(tmp_path, store, ['job-1', 'job-2'])
+
+    assert cache.reap(FakeQueue(active=['job-2']), grace=0) == 1
+    assert refcount(cache, 'a') == 1
+    assert cache.reap(FakeQueue(), grace=0) == 1
+    assert not store.exists('a')
+
+
+def test_reap_skips_references_within_grace(tmp_path, store):
+    cache = held_file(tmp_path, store, ['job-1'])
+
+    assert cache.reap(FakeQueue(), grace=60) == 0
+    assert store.exists('a')
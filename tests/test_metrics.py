@@ -0,0 +1,49 @@
+import json
+import os
+import urllib.request
+from metrics import MetricsRegistry
+
+
+def make_registry():
+    registry = MetricsRegistry()
+    return (
+        registry,
+        registry.counter('posts_total', 'Posts', ('result',)),
+        registry.gauge('in_flight', 'Jobs in flight'),
+        registry.histogram('stage_seconds', 'Stages', ('stage',), buckets=(1, 10))
+    )
+
+
+def test_snapshots_of_all_processes_are_summed(tmp_path):
+    registry, posts, in_flight, stages = make_registry()
+    posts.inc(result='ok')
+    in_flight.set(2)
+    stages.observe(0.5, stage='publish')
+
+    # Another process's snapshot, and a gauge left behind by an exited one
+    other = {'posts_total': [[['ok'], 3]], 'in_flight': [[[], 1]],
+             'stage_seconds': [[['publish'], [[0, 1, 0], 5.0]]]}
+    (tmp_path / '1.json').write_text(json.dumps(other))
+    exited = tmp_path / '2.json'
+    exited.write_text(json.dumps({'posts_total': [[['ok'], 1]], 'in_flight': [[[], 7]]}))
+    os.utime(exited, (0, 0))
+
+    text = registry.render_snapshots(str(tmp_path), stale_after=60)
+    assert 'posts_total{result="ok"} 5' in text
+    assert 'in_flight 3' in text
+    assert 'stage_seconds_count{stage="publish"} 2' in text
+    assert 'stage_seconds_sum{stage="publish"} 5.5' in text
+    # The live values are untouched
+    assert 'posts_total{result="ok"} 1' in registry.render()
+
+
+def test_serve_exposes_metrics():
+    registry, posts, _, _ = make_registry()
+    posts.inc(result='ok')
+    server = registry.serve(0, host='127.0.0.1')
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert 'posts_total{result="ok"} 1' in response.read().decode()
+    finally:
+        server.shutdown()
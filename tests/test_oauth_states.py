@@ -0,0 +1,44 @@
+from oauth_states import OAuthStateStore
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.states = {}
+        self.consume_calls = 0
+
+    def store_oauth_state(self, state, telegram_user_id, expires_at=None):
+        self.states[state] = {'state': state, 'telegram_user_id': telegram_user_id}
+
+    def consume_oauth_state(self, state):
+        self.consume_calls += 1
+        return self.states.pop(state, None)
+
+
+def test_state_is_single_use_and_replay_skips_the_database():
+    db = FakeDatabase()
+    states = OAuthStateStore(db)
+    states.store('abc', 42)
+
+    assert states.consume('abc')['telegram_user_id'] == 42
+    assert states.consume('abc') is None
+    assert db.consume_calls == 1
+
+
+def test_expired_local_state_is_rejected_without_the_database():
+    db = FakeDatabase()
+    states = OAuthStateStore(db, ttl=-1)
+    states.store('abc', 42)
+
+    assert states.consume('abc') is None
+    assert db.consume_calls == 0
+
+
+def test_state_issued_elsewhere_goes_to_the_database_once():
+    db = FakeDatabase()
+    db.store_oauth_state('abc', 42)
+    states = OAuthStateStore(db)
+
+    assert states.consume('abc')['telegram_user_id'] == 42
+    assert states.consume('unknown') is None
+    assert states.consume('unknown') is None
+    assert db.consume_calls == 2
@@ -0,0 +1,163 @@
+import asyncio
+from config import Config
+from job_queue import PublishJob
+from publisher import Publisher
+
+
+class FlakyQueue:
+    """Queue whose first claims fail, then hands out one job"""
+
+    lease_seconds = 60
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.claims = 0
+        self.job = PublishJob(1, 'token', 'https://example.com/video.mp4', 'caption', id='job-1')
+        self.failed = []
+
+    def claim(self, worker_id):
+        self.claims += 1
+        if self.claims <= self.failures:
+            raise RuntimeError('database is locked')
+        job, self.job = self.job, None
+        return job
+
+    def mark_failed(self, job_id, error, worker_id=None):
+        self.failed.append((job_id, error))
+
+    def depth(self):
+        return 0
+
+    def heartbeat(self, job_id, worker_id):
+        return True
+
+
+class BrokenClient:
+    async def create_media_container(self, *args, **kwargs):
+        raise RuntimeError('boom')
+
+    async def close(self):
+        pass
+
+
+def test_worker_survives_queue_errors(monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_POLL_INTERVAL', 0.01)
+    queue = FlakyQueue(failures=2)
+    publisher = Publisher(BrokenClient(), queue=queue, workers=1)
+
+    async def run():
+        await publisher.start()
+        for _ in range(100):
+            if queue.failed:
+                break
+            await asyncio.sleep(0.01)
+        assert publisher._worker_tasks[0].done() is False
+        publisher._stopping = True
+        for task in publisher._worker_tasks:
+            task.cancel()
+
+    asyncio.run(run())
+    assert queue.claims > 2
+    assert queue.failed == [('job-1', 'boom')]
+
+
+class LostLeaseQueue(FlakyQueue):
+    """Queue whose heartbeats report that the lease was taken over"""
+
+    lease_seconds = 0.03
+
+    def heartbeat(self, job_id, worker_id):
+        return False
+
+
+class SlowClient(BrokenClient):
+    def __init__(self):
+        self.cancelled = False
+
+    async def create_media_container(self, *args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def test_lost_lease_cancels_the_job(monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_POLL_INTERVAL', 0.01)
+    queue = LostLeaseQueue(failures=0)
+    client = SlowClient()
+    publisher = Publisher(client, queue=queue, workers=1)
+
+    async def run():
+        await publisher.start()
+        for _ in range(100):
+            if client.cancelled:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        assert publisher._worker_tasks[0].done() is False
+        assert publisher.in_flight == 0
+        publisher._stopping = True
+        for task in publisher._worker_tasks:
+            task.cancel()
+
+    asyncio.run(run())
+    assert client.cancelled
+    assert queue.failed == []
+
+
+class BudgetQueue(FlakyQueue):
+    """Queue whose account already used its daily publish budget"""
+
+    def __init__(self):
+        super().__init__(failures=0)
+        self.job.instagram_username = 'alice'
+        self.deferred = []
+
+    def published_since(self, instagram_username, since):
+        return Config.PUBLISH_LIMIT_PER_DAY
+
+    def defer(self, job_id, until, worker_id=None):
+        self.deferred.append(job_id)
+
+
+def test_job_over_daily_budget_is_deferred():
+    queue = BudgetQueue()
+    publisher = Publisher(BrokenClient(), queue=queue, workers=1)
+
+    asyncio.run(publisher._process(queue.claim('worker-1')))
+    assert queue.deferred == ['job-1']
+    assert queue.failed == []
+
+
+class RecentMediaClient(BrokenClient):
+    def __init__(self, media):
+        self.media = media
+
+    async def get_recent_media(self, access_token):
+        return self.media
+
+
+def find_published(media, caption='caption'):
+    job = PublishJob(1, 'token', 'https://example.com/video.mp4', caption,
+                     id='job-1', created_at=1704110400.0)
+    publisher = Publisher(RecentMediaClient(media), queue=FlakyQueue(failures=0), workers=1)
+    return asyncio.run(publisher._find_published(job))
+
+
+def test_find_published_matches_caption_after_job_creation():
+    media = [
+        {'id': 'other', 'caption': 'another reel', 'timestamp': '2024-01-01T12:05:00+0000'},
+        {'id': 'ours', 'caption': 'caption', 'timestamp': '2024-01-01T12:04:00+0000'},
+        {'id': 'old', 'caption': 'caption', 'timestamp': '2023-12-31T12:00:00+0000'},
+    ]
+    assert find_published(media) == {'id': 'ours'}
+
+
+def test_find_published_records_ambiguous_match_as_unknown():
+    media = [
+        {'id': 'first', 'caption': 'caption', 'timestamp': '2024-01-01T12:05:00+0000'},
+        {'id': 'second', 'caption': 'caption', 'timestamp': '2024-01-01T12:04:00+0000'},
+    ]
+    assert find_published(media) == {'id': None}
+    assert find_published([]) == {'id': None}
@@ -0,0 +1,47 @@
+from config import Config
+from session_store import MemorySessionStore, RedisSessionStore, Session, create_session_store
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def getdel(self, key):
+        return self.data.pop(key, None)
+
+
+def test_redis_sessions_are_shared_between_processes(monkeypatch):
+    monkeypatch.setattr(Config, 'SESSION_STORE', 'redis')
+    client = FakeRedis()
+    first, second = create_session_store(client), create_session_store(client)
+    assert isinstance(first, RedisSessionStore)
+
+    first.set(1, Session('file', caption='hello', waiting_for_caption=True))
+    session = second.get(1)
+    assert (session.file_id, session.caption, session.waiting_for_caption) == ('file', 'hello', True)
+
+    second.delete(1)
+    assert first.get(1) is None
+
+
+def test_take_hands_a_session_out_once(monkeypatch):
+    monkeypatch.setattr(Config, 'SESSION_STORE', 'redis')
+    for store in (create_session_store(FakeRedis()), MemorySessionStore()):
+        store.set(1, Session('file', caption='hello'))
+        assert store.take(1).caption == 'hello'
+        assert store.take(1) is None
+        assert store.get(1) is None
+
+
+def test_memory_store_is_the_default(monkeypatch):
+    monkeypatch.setattr(Config, 'SESSION_STORE', 'memory')
+    assert isinstance(create_session_store(FakeRedis()), MemorySessionStore)
@@ -0,0 +1,62 @@
+import time
+from token_manager import TokenManager, LONG_LIVED_TOKEN_TTL, format_expiry, parse_expiry
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.warned = set()
+        self.tokens = {}
+
+    def claim_token_warning(self, instagram_id):
+        if instagram_id in self.warned:
+            return False
+        self.warned.add(instagram_id)
+        return True
+
+    def clear_token_warning(self, instagram_id):
+        self.warned.discard(instagram_id)
+
+    def update_account_token(self, telegram_id, instagram_id, access_token, token_expires_at):
+        self.tokens[instagram_id] = (access_token, token_expires_at)
+
+
+class FakeInstagramClient:
+    def __init__(self, result=None):
+        self.result = result
+
+    def refresh_access_token(self, access_token):
+        return self.result
+
+
+def expiring_account():
+    return {'telegram_user_id': 1, 'instagram_id': 'ig1', 'instagram_username': 'alice',
+            'access_token': 'token', 'token_expires_at': format_expiry(time.time() + 60)}
+
+
+def test_expiry_warning_is_sent_once_across_processes():
+    db, sent = FakeDatabase(), []
+    managers = [
+        TokenManager(db, FakeInstagramClient(), notify=lambda chat_id, text: sent.append(chat_id))
+        for _ in range(2)
+    ]
+    for manager in managers:
+        assert manager._refresh_or_warn(expiring_account()) is False
+    assert sent == [1]
+
+
+def test_failed_warning_is_retried():
+    def broken_notify(chat_id, text):
+        raise ConnectionError('telegram down')
+
+    db = FakeDatabase()
+    TokenManager(db, FakeInstagramClient(), notify=broken_notify)._refresh_or_warn(expiring_account())
+    assert db.warned == set()
+
+
+def test_refresh_without_expires_in_assumes_long_lived_token():
+    db = FakeDatabase()
+    manager = TokenManager(db, FakeInstagramClient({'access_token': 'new'}))
+
+    assert manager.refresh(expiring_account()) == 'new'
+    token, expires_at = db.tokens['ig1']
+    assert parse_expiry(expires_at) > time.time() + LONG_LIVED_TOKEN_TTL - 60
@@ -0,0 +1,83 @@
+import time
+from user_cache import UserCache
+
+
+class DictBackend:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class BrokenBackend:
+    def get(self, key):
+        raise ConnectionError('redis down')
+
+    set = delete = get
+
+
+def test_other_process_invalidation_is_seen_after_local_ttl():
+    backend = DictBackend()
+    bot = UserCache(ttl=300, backend=backend, local_ttl=0.05)
+    web = UserCache(ttl=300, backend=backend, local_ttl=0.05)
+    bot.set(1, {'is_connected': False})
+
+    web.invalidate(1)
+    web.set(1, {'is_connected': True})
+    time.sleep(0.06)
+
+    assert bot.get(1) == {'is_connected': True}
+
+
+def test_local_ttl_never_exceeds_ttl():
+    assert UserCache(ttl=1, local_ttl=10).local_ttl == 1
+    assert UserCache(ttl=300).local_ttl == 300
+
+
+def test_backend_errors_are_misses():
+    cache = UserCache(backend=BrokenBackend())
+    cache.set(1, {'id': 1})
+    cache.invalidate(1)
+
+    assert cache.get(1) is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_local_lookup_then_shared_lookup_counts_one_miss():
+    backend = DictBackend()
+    cache = UserCache(backend=backend)
+
+    assert cache.get_local(1) is None
+    assert cache.get_shared(1) is None
+    assert cache.stats()['misses'] == 1
+
+    backend.data[1] = {'id': 1}
+    assert cache.get_shared(1) == {'id': 1}
+    assert cache.get_local(1) == {'id': 1}
+    assert cache.stats()['hits'] == 2
+
+
+def test_hits_misses_and_evictions_are_exported():
+    from metrics import USER_CACHE_EVENTS, registry
+
+    def counts():
+        return {key[0]: value for key, value in USER_CACHE_EVENTS._values.items()}
+
+    before = counts()
+    cache = UserCache(max_size=1, ttl=300)
+    cache.get(1)
+    cache.set(1, {'id': 1})
+    cache.get(1)
+    cache.set(2, {'id': 2})
+
+    after = counts()
+    for event in ('hit', 'miss', 'eviction'):
+        assert after[event] == before.get(event, 0) + 1
+    assert 'instaposter_user_cache_total{event="hit"}' in registry.render()
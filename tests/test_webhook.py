@@ -0,0 +1,37 @@
+import pytest
+from config import Config
+from webhook import TelegramWebhook
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+
+def test_redelivered_update_is_dropped_by_any_process():
+    redis = FakeRedis()
+    first = TelegramWebhook(lambda: None, secret='s', redis_client=redis)
+    second = TelegramWebhook(lambda: None, secret='s', redis_client=redis)
+
+    assert not first._is_duplicate(42)
+    assert second._is_duplicate(42)
+    assert not second._is_duplicate(43)
+
+
+def test_webhook_mode_requires_a_secret(monkeypatch):
+    for name in ('TELEGRAM_BOT_TOKEN', 'INSTAGRAM_APP_ID', 'INSTAGRAM_APP_SECRET',
+                 'SUPABASE_URL', 'SUPABASE_KEY', 'REDIRECT_URI'):
+        monkeypatch.setattr(Config, name, 'set')
+    monkeypatch.setattr(Config, 'TELEGRAM_MODE', 'webhook')
+    monkeypatch.setattr(Config, 'ROLE', 'web')
+    monkeypatch.setattr(Config, 'TELEGRAM_WEBHOOK_SECRET', None)
+
+    with pytest.raises(ValueError):
+        Config.validate()
+    assert not TelegramWebhook(lambda: None).verify('anything')
@@ -0,0 +1,183 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from config import Config
+from http_session import get_session
+
+# Instagram's own defaults when a token response has no expires_in
+SHORT_LIVED_TOKEN_TTL = 60 * 60
+LONG_LIVED_TOKEN_TTL = 60 * 24 * 60 * 60
+
+
+def parse_expiry(value):
+    """Epoch seconds of a stored token_expires_at, or None if unknown"""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_expiry(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class TokenManager:
+    """Keeps Instagram access tokens alive.
+
+    Tokens from the OAuth callback are exchanged for long-lived (60 day)
+    tokens and stored with their expiry. A background thread walks the
+    token_expires_at index in batches, refreshing tokens that expire within
+    TOKEN_REFRESH_BEFORE; users whose token can't be refreshed are warned on
+    Telegram once it's within TOKEN_WARN_BEFORE, before posts start failing.
+    Publishing runs check() first so an expired account is rejected before
+    its video is downloaded or a container is created.
+    """
+
+    def __init__(self, db, instagram_client, refresh_before=None, warn_before=None,
+                 interval=None, batch_size=None, concurrency=None, notify=None):
+        self.db = db
+        self.instagram_client = instagram_client
+        self.refresh_before = refresh_before or Config.TOKEN_REFRESH_BEFORE
+        self.warn_before = warn_before or Config.TOKEN_WARN_BEFORE
+        self.interval = interval or Config.TOKEN_REFRESH_INTERVAL
+        self.batch_size = batch_size or Config.TOKEN_REFRESH_BATCH
+        self.concurrency = concurrency or Config.TOKEN_REFRESH_CONCURRENCY
+        self.notify = notify or self.send_telegram_message
+        self._refresher = None
+        self._stopped = threading.Event()
+
+    def exchange(self, access_token):
+        """Swap an OAuth token for a long-lived one; returns (token, expires_at)"""
+        result = self.instagram_client.exchange_long_lived_token(access_token)
+        if result and result.get('access_token'):
+            access_token = result['access_token']
+            expires_in = result.get('expires_in')
+        else:
+            # Keep the short-lived token; the user is warned before it lapses
+            expires_in = SHORT_LIVED_TOKEN_TTL
+        return access_token, format_expiry(time.time() + int(expires_in or SHORT_LIVED_TOKEN_TTL))
+
+    def refresh(self, account):
+        """Refresh one account's token and store it; returns the new token or None"""
+        result = self.instagram_client.refresh_access_token(account['access_token'])
+        if not result or not result.get('access_token'):
+            return None
+        expires_at = format_expiry(time.time() + int(result.get('expires_in') or LONG_LIVED_TOKEN_TTL))
+        self.db.update_account_token(
+            account['telegram_user_id'],
+            account['instagram_id'],
+            result['access_token'],
+            expires_at
+        )
+        account['access_token'] = result['access_token']
+        account['token_expires_at'] = expires_at
+        return result['access_token']
+
+    def check(self, account, at=None):
+        """Pre-flight check that an account's token is valid at a time (default now).
+
+        Tokens close to expiry are refreshed on the spot. Tokens of unknown
+        expiry (linked before expiries were stored) are assumed valid.
+        """
+        expires_at = parse_expiry(account.get('token_expires_at'))
+        if expires_at is None:
+            return True
+        at = max(at or 0, time.time())
+        if expires_at > at + self.refresh_before:
+            return True
+        if self.refresh(account):
+            return True
+        return expires_at > at
+
+    @staticmethod
+    def is_expired(account, at=None):
+        """Whether a stored token has already expired (no network call)"""
+        expires_at = parse_expiry(account.get('token_expires_at'))
+        return expires_at is not None and expires_at <= (at or time.time())
+
+    def _refresh_or_warn(self, account):
+        if self.refresh(account):
+            return True
+        expires_at = parse_expiry(account['token_expires_at'])
+        if expires_at - time.time() < self.warn_before and not account.get('token_warned_at'):
+            self._warn(account, expires_at)
+        return False
+
+    def _warn(self, account, expires_at):
+        username = account.get('instagram_username')
+        if expires_at <= time.time():
+            text = (
+                f"⚠️ Your Instagram session for @{username} has expired.\n"
+                "Use /addaccount to reconnect it, otherwise posts to it will fail."
+            )
+        else:
+            text = (
+                f"⚠️ Your Instagram session for @{username} expires on "
+                f"{datetime.fromtimestamp(expires_at, timezone.utc).strftime('%Y-%m-%d %H:%M UTC')} "
+                "and could not be renewed.\n"
+                "Use /addaccount to reconnect it before then."
+            )
+        try:
+            if not self.db.claim_token_warning(account['instagram_id']):
+                # Another process is warning this account
+                return
+            try:
+                self.notify(account['telegram_user_id'], text)
+            except Exception:
+                self.db.clear_token_warning(account['instagram_id'])
+                raise
+        except Exception as e:
+            print(f"Token expiry warning error: {e}")
+
+    def refresh_due(self):
+        """Refresh every token expiring soon, a batch at a time; returns (refreshed, failed)"""
+        before = format_expiry(time.time() + self.refresh_before)
+        refreshed = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='token-refresh') as pool:
+            while True:
+                accounts = self.db.get_expiring_accounts(before, self.batch_size, after_id=last_id)
+                for ok in pool.map(self._refresh_or_warn, accounts):
+                    if ok:
+                        refreshed += 1
+                    else:
+                        failed += 1
+                if len(accounts) < self.batch_size:
+                    return refreshed, failed
+                last_id = accounts[-1]['id']
+
+    def start(self):
+        """Run refresh_due() every refresh interval in a daemon thread"""
+        if self._refresher is not None:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name='token-refresher', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                refreshed, failed = self.refresh_due()
+                if refreshed or failed:
+                    print(f"Refreshed {refreshed} Instagram tokens ({failed} failed)")
+            except Exception as e:
+                print(f"Token refresh error: {e}")
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+    @staticmethod
+    def send_telegram_message(chat_id, text):
+        """Send a message through the Bot API (the refresher runs outside the bot's loop)"""
+        response = get_session().post(
+            f"{Config.TELEGRAM_API_URL}{Config.TELEGRAM_BOT_TOKEN}/sendMessage",
+            name='telegram_send_message',
+            data={'chat_id': chat_id, 'text': text}
+        )
+        response.raise_for_status()
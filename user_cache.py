@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from metrics import USER_CACHE_EVENTS
+
+
+class RedisCacheBackend:
+    """Shared cache backend for multi-process deployments.
+
+    Wraps any redis-py compatible client (get/set/delete/getdel); values are
+    stored as JSON under a key prefix so several caches can share one server.
+    """
+
+    def __init__(self, client, prefix='instaposter:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(f"{self.prefix}{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(f"{self.prefix}{key}", json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+    def take(self, key):
+        """Get and delete a value in one atomic GETDEL"""
+        raw = self.client.getdel(f"{self.prefix}{key}")
+        return json.loads(raw) if raw is not None else None
+
+
+class UserCache:
+    """Bounded TTL + LRU cache of user rows.
+
+    The local dict is the fast path; an optional shared backend is consulted
+    on a local miss and written through on every set/invalidate. Another
+    process's invalidation only reaches the shared entry, so with a backend
+    local copies are kept for local_ttl (a few seconds) rather than the full
+    TTL. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, max_size=None, ttl=None, backend=None, local_ttl=None):
+        self.max_size = max_size or Config.USER_CACHE_SIZE
+        self.ttl = ttl or Config.USER_CACHE_TTL
+        self.local_ttl = min(local_ttl or self.ttl, self.ttl)
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get a cached row, or None on miss/expiry"""
+        value = self.get_local(key)
+        if value is None:
+            value = self.get_shared(key)
+        return value
+
+    def get_local(self, key):
+        """Get a row from this process's copy only (never blocks); misses aren't counted"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    USER_CACHE_EVENTS.inc(event='hit')
+                    return value
+                del self._entries[key]
+        return None
+
+    def get_shared(self, key):
+        """Look a row up in the shared backend after a local miss, counting the outcome"""
+        if self.backend is not None:
+            value = self._backend_call('get', key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                USER_CACHE_EVENTS.inc(event='hit')
+                return value
+
+        with self._lock:
+            self.misses += 1
+        USER_CACHE_EVENTS.inc(event='miss')
+        return None
+
+    def set(self, key, value):
+        """Cache a row locally and in the shared backend"""
+        self._store(key, value)
+        if self.backend is not None:
+            self._backend_call('set', key, value, self.ttl)
+
+    def _backend_call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            print(f"User cache backend error: {e}")
+            return None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                USER_CACHE_EVENTS.inc(event='eviction')
+
+    def invalidate(self, key):
+        """Drop a row so the next read goes to the database"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            self._backend_call('delete', key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def create_user_cache(redis_client=None):
+    """Build the user cache; USER_CACHE_BACKEND=redis shares it between processes"""
+    if Config.USER_CACHE_BACKEND != 'redis':
+        return UserCache()
+    if redis_client is None:
+        # Optional dependency, only needed for a shared cache
+        import redis
+        redis_client = redis.Redis.from_url(Config.REDIS_URL)
+    return UserCache(
+        backend=RedisCacheBackend(redis_client, prefix='instaposter:user:'),
+        local_ttl=Config.USER_CACHE_LOCAL_TTL
+    )
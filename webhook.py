@@ -0,0 +1,116 @@
+import asyncio
+import hmac
+import threading
+from collections import OrderedDict
+from telegram import Update
+from config import Config
+
+
+class TelegramWebhook:
+    """Feeds webhook updates from the WSGI app into a Telegram Application.
+
+    The Application runs on its own event loop in a background thread.
+    Requests are checked against the webhook secret token, de-duplicated by
+    update_id (Telegram redelivers on slow or failed responses) and handed
+    to the Application's update queue, so the HTTP response goes out
+    without waiting for the handler to run. A redelivery can reach another
+    web process, so with a Redis client the update ids are claimed there
+    (SET NX); the local LRU is the fallback when Redis is unavailable.
+    """
+
+    def __init__(self, application_factory, secret=None, url=None, dedup_size=None, redis_client=None):
+        self.application_factory = application_factory
+        self.secret = secret or Config.TELEGRAM_WEBHOOK_SECRET
+        self.url = url or Config.TELEGRAM_WEBHOOK_URL
+        self.dedup_size = dedup_size or Config.WEBHOOK_DEDUP_SIZE
+        self.redis = redis_client
+        self.application = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the Application in a background event loop"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='telegram-webhook', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=30)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self.application = self.application_factory()
+        self._loop.run_until_complete(self._startup())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _startup(self):
+        await self.application.initialize()
+        if self.application.post_init:
+            await self.application.post_init(self.application)
+        await self.application.start()
+        if self.url:
+            await self.application.bot.set_webhook(
+                self.url,
+                secret_token=self.secret,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+    def verify(self, token):
+        """Check the X-Telegram-Bot-Api-Secret-Token header (never passes without a secret)"""
+        return bool(self.secret) and bool(token) and hmac.compare_digest(token, self.secret)
+
+    def _is_duplicate(self, update_id):
+        if self.redis is not None:
+            try:
+                claimed = self.redis.set(
+                    f"instaposter:update:{update_id}", 1, nx=True, ex=Config.WEBHOOK_DEDUP_TTL
+                )
+                return not claimed
+            except Exception as e:
+                print(f"Webhook dedup error: {e}")
+        with self._lock:
+            if update_id in self._seen:
+                return True
+            self._seen[update_id] = None
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+        return False
+
+    def is_running(self):
+        """Whether the Application is started and its event loop thread alive"""
+        return self._ready.is_set() and self._thread is not None and self._thread.is_alive()
+
+    def submit(self, payload):
+        """Queue an update for processing; returns False for duplicates"""
+        # Checked first, so an update refused here isn't recorded as seen
+        if not self._ready.is_set():
+            raise RuntimeError("Telegram application is not running")
+        update_id = payload.get('update_id')
+        if update_id is not None and self._is_duplicate(update_id):
+            return False
+
+        update = Update.de_json(payload, self.application.bot)
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self._loop)
+        return True
+
+    def stop(self):
+        """Stop the Application (running post_shutdown) and its event loop; idempotent"""
+        if self._loop is None or not self._ready.is_set():
+            return
+        self._ready.clear()
+
+        async def shutdown():
+            await self.application.stop()
+            if self.application.post_shutdown:
+                await self.application.post_shutdown(self.application)
+            await self.application.shutdown()
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
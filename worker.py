@@ -0,0 +1,60 @@
+import asyncio
+import signal
+from telegram import Bot
+from config import Config
+from components import components
+from async_database import AsyncDatabase
+from instagram_client import AsyncInstagramClient
+from media_cache import MediaCache
+from metrics import QUEUE_DEPTH, registry as metrics_registry
+from notifier import PublishNotifier
+from publisher import Publisher
+
+
+async def run_worker():
+    """Run publish workers until SIGINT/SIGTERM"""
+    db = AsyncDatabase(components.database)
+    bot = Bot(Config.TELEGRAM_BOT_TOKEN, base_url=Config.TELEGRAM_API_URL, base_file_url=Config.TELEGRAM_FILE_URL)
+    publisher = Publisher(
+        AsyncInstagramClient(),
+        queue=components.job_queue,
+        on_complete=PublishNotifier(db, bot),
+        media_cache=MediaCache(components.media_store)
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Background maintenance runs in this role only rather than in every web
+    # process; expiry warnings are claimed in the database, so several worker
+    # instances still send each one once
+    oauth_states, token_manager = components.oauth_states, components.token_manager
+    oauth_states.start_sweeper()
+    token_manager.start()
+
+    # No web app in this process: serve /metrics on a port of its own
+    metrics_server = None
+    if Config.METRICS_PORT:
+        QUEUE_DEPTH.set_function(components.job_queue.depth)
+        metrics_server = metrics_registry.serve(Config.METRICS_PORT)
+
+    async with bot:
+        await publisher.start()
+        if Config.STARTUP_PROFILE:
+            print(components.profile())
+        await stop.wait()
+        print("Stopping publish workers...")
+        await publisher.shutdown()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    token_manager.stop()
+    oauth_states.stop()
+    db.shutdown()
+
+
+if __name__ == "__main__":
+    # Publish worker process: claims jobs from the shared queue
+    # (JOB_QUEUE_BACKEND=supabase when running on several hosts)
+    asyncio.run(run_worker())